@@ -0,0 +1,114 @@
+"""
+Dashboard analytics queries.
+
+``facet_pipeline`` computes every figure of ``/api/analytics`` (totals, status
+and category breakdowns, top issues, daily trend) in one aggregation over the
+filtered issues instead of a dozen sequential round trips.
+
+``rollup_pipeline`` derives the same counts from the pre-aggregated
+``issue_rollups`` buckets (see ``rollups.py``); only the top issues still come
+from the issues collection, via an indexed sort on ``priority_votes``.
+"""
+from typing import Dict, List
+
+STATUS_KEYS = {"Received": "received", "In Progress": "in_progress", "Resolved": "resolved"}
+
+
+def facet_pipeline(query: dict, trend_days: int = 14, top_n: int = 5) -> List[dict]:
+    trend = [
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "count": {"$sum": 1}}},
+        {"$match": {"_id": {"$ne": None}}},
+        {"$sort": {"_id": -1}},
+    ]
+    if trend_days and trend_days > 0:
+        trend.append({"$limit": trend_days})
+    return [
+        {"$match": query},
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "by_category": [{"$group": {"_id": "$category", "count": {"$sum": 1}}}],
+            "top": [
+                {"$sort": {"priority_votes": -1}},
+                {"$limit": top_n},
+                {"$project": {
+                    "category": 1,
+                    "priority_votes": 1,
+                    "description": {"$substrCP": [{"$ifNull": ["$description", ""]}, 0, 100]},
+                }},
+            ],
+            "trend": trend,
+        }},
+    ]
+
+
+def category_breakdown(counts: Dict[str, int], categories: List[dict]) -> List[dict]:
+    """Known categories first (in their configured order, zero-filled), then any others found."""
+    icons = {c["name"]: c["icon"] for c in categories}
+    out = [{"category": c["name"], "icon": c["icon"], "count": counts.get(c["name"], 0)} for c in categories]
+    for name in sorted(k for k in counts if k not in icons and k):
+        out.append({"category": name, "icon": "📌", "count": counts[name]})
+    return out
+
+
+def build_analytics(total_issues: int, status_counts: Dict[str, int], category_counts: Dict[str, int], top: List[dict], trend: List[dict], categories: List[dict]) -> dict:
+    """Shape raw counts into the ``/api/analytics`` response."""
+    breakdown = {key: status_counts.get(status, 0) for status, key in STATUS_KEYS.items()}
+    return {
+        "total_issues": total_issues,
+        "status_breakdown": breakdown,
+        "category_breakdown": category_breakdown(category_counts, categories),
+        "top_priority_issues": [
+            {
+                "id": str(doc["_id"]),
+                "category": doc.get("category"),
+                "description": doc.get("description", ""),
+                "votes": doc.get("priority_votes", 0),
+            }
+            for doc in top
+        ],
+        "resolution_rate": round((breakdown["resolved"] / total_issues * 100) if total_issues > 0 else 0, 2),
+        "trend": trend,
+    }
+
+
+def _counts(result: dict):
+    total_issues = sum(row["count"] for row in result.get("by_status", []))
+    status_counts = {row["_id"]: row["count"] for row in result.get("by_status", []) if row.get("_id")}
+    category_counts = {row["_id"]: row["count"] for row in result.get("by_category", []) if row.get("_id") and row["count"]}
+    return total_issues, status_counts, category_counts
+
+
+def shape_facet_result(result: dict, categories: List[dict]) -> dict:
+    """Turn the single document produced by ``facet_pipeline`` into the API response."""
+    total_issues, status_counts, category_counts = _counts(result)
+    # The facet returns the newest days first so $limit keeps the latest ones
+    trend = [{"date": row["_id"], "count": row["count"]} for row in reversed(result.get("trend", []))]
+    return build_analytics(total_issues, status_counts, category_counts, result.get("top", []), trend, categories)
+
+
+def rollup_pipeline(match: dict, trend_days: int = 14) -> List[dict]:
+    trend = [
+        {"$group": {"_id": "$day", "count": {"$sum": "$count"}}},
+        {"$match": {"_id": {"$ne": None}, "count": {"$gt": 0}}},
+        {"$sort": {"_id": -1}},
+    ]
+    if trend_days and trend_days > 0:
+        trend.append({"$limit": trend_days})
+    return [
+        {"$match": match},
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": "$count"}}}],
+            "by_category": [{"$group": {"_id": "$category", "count": {"$sum": "$count"}}}],
+            "trend": trend,
+        }},
+    ]
+
+
+def shape_rollup_result(result: dict, top: List[dict], categories: List[dict]) -> dict:
+    """Turn the output of ``rollup_pipeline`` plus the top issues into the API response."""
+    total_issues, status_counts, category_counts = _counts(result)
+    trend = [
+        {"date": row["_id"].strftime("%Y-%m-%d"), "count": row["count"]}
+        for row in reversed(result.get("trend", []))
+    ]
+    return build_analytics(total_issues, status_counts, category_counts, top, trend, categories)
@@ -0,0 +1,238 @@
+"""
+Hedged Whisper transcription over an async Groq client.
+
+The strategies used to run one after another, so a slow or hallucinated
+first answer cost a full extra round trip per fallback. ``HedgedTranscriber``
+starts the primary strategy at once and launches the next one when either
+
+- the running attempts have produced nothing after ``hedge_after`` seconds, or
+- an attempt came back empty / as a known Whisper hallucination, or failed.
+
+The first acceptable transcript wins and the other in-flight attempts are
+cancelled. Every attempt has its own deadline and the whole call is bounded
+by ``total_timeout``. Point GROQ_BASE_URL at a local fake server to test.
+
+Groq calls themselves are capped by ``max_concurrent_calls``, shared by every
+request and chunk going through the transcriber, so hedging can't multiply
+the load (and 429s) when the API is already slow. No slow-primary hedge is
+launched while the cap is saturated.
+
+Long recordings arrive pre-split on silence; ``transcribe_chunks`` runs the
+chunks concurrently under a cap and stitches text and timestamps in order.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+
+# Common hallucinated phrases that Whisper produces with unclear audio
+HALLUCINATION_PHRASES = {
+    "thank you", "thanks for watching", "thank you for watching",
+    "bye", "goodbye", "see you", "please subscribe",
+    "thanks", "thank you so much", "like and subscribe",
+    ".", "..", "...",  # Just punctuation
+}
+
+STRATEGIES = [
+    # Strategy 1: Turbo model, English, short prompt to anchor context
+    {
+        "model": "whisper-large-v3-turbo",
+        "temperature": 0.0,
+        "language": "en",
+        "prompt": "Report: ",
+    },
+    # Strategy 2: Standard model with higher temperature
+    {
+        "model": "whisper-large-v3",
+        "temperature": 0.4,
+        "language": "en",
+    },
+    # Strategy 3: Turbo model with no language constraint
+    {
+        "model": "whisper-large-v3-turbo",
+        "temperature": 0.0,
+    },
+]
+
+
+def strategies_fingerprint(strategies: List[dict]) -> str:
+    """Short hash of the models / prompts in use; part of the transcript cache key."""
+    return hashlib.sha256(json.dumps(strategies, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def is_hallucination(text: str) -> bool:
+    t = (text or "").strip()
+    # "Thank you." / "Bye!" are the same hallucinations as their bare forms
+    return len(t) <= 3 or t.lower().strip(" .!?,") in HALLUCINATION_PHRASES
+
+
+def transcription_result(response, strategy_index: int) -> dict:
+    text = getattr(response, "text", None)
+    text = (text if text is not None else str(response)).strip()
+    segments = []
+    for seg in getattr(response, "segments", None) or []:
+        get = seg.get if isinstance(seg, dict) else (lambda k, s=seg: getattr(s, k, None))
+        segments.append({"start": get("start"), "end": get("end"), "text": (get("text") or "").strip()})
+    return {
+        "text": text,
+        "language": getattr(response, "language", None),
+        "duration": getattr(response, "duration", None),
+        "segments": segments,
+        "strategy": strategy_index,
+    }
+
+
+class HedgedTranscriber:
+    def __init__(
+        self,
+        strategies: Optional[List[dict]] = None,
+        hedge_after: float = 2.5,
+        attempt_timeout: float = 20.0,
+        total_timeout: float = 45.0,
+        max_concurrent_calls: int = 8,
+    ):
+        self.strategies = strategies or STRATEGIES
+        self.fingerprint = strategies_fingerprint(self.strategies)
+        self.hedge_after = hedge_after
+        self.attempt_timeout = attempt_timeout
+        self.total_timeout = total_timeout
+        self.max_concurrent_calls = max(1, max_concurrent_calls)
+        self._calls = asyncio.Semaphore(self.max_concurrent_calls)
+        self.metrics = {
+            "requests": 0, "attempts": 0, "hedged": 0, "cancelled": 0, "timeouts": 0, "failures": 0, "queued": 0,
+        }
+
+    async def _attempt(self, client, idx: int, name: str, data: bytes, content_type: str) -> dict:
+        strategy = self.strategies[idx]
+        if self._calls.locked():
+            self.metrics["queued"] += 1
+        async with self._calls:
+            self.metrics["attempts"] += 1
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    client.audio.transcriptions.create(
+                        file=(name, data, content_type),
+                        response_format="verbose_json",
+                        **strategy,
+                    ),
+                    timeout=self.attempt_timeout,
+                )
+            except asyncio.TimeoutError:
+                self.metrics["timeouts"] += 1
+                raise
+        result = transcription_result(response, idx)
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000)
+        return result
+
+    async def transcribe(self, client, name: str, data: bytes, content_type: str) -> Optional[dict]:
+        """Best transcript across the strategies, or None if every attempt failed.
+
+        A hallucinated transcript is only returned when nothing better arrived;
+        it is marked with ``"suspect": True``.
+        """
+        self.metrics["requests"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.total_timeout
+        pending = {}
+        next_idx = 0
+        best = None
+
+        def launch():
+            nonlocal next_idx
+            if next_idx > 0:
+                self.metrics["hedged"] += 1
+            print(f"🔄 Attempt {next_idx + 1}: Using {self.strategies[next_idx].get('model', 'default')} model...")
+            task = asyncio.create_task(self._attempt(client, next_idx, name, data, content_type))
+            pending[task] = next_idx
+            next_idx += 1
+
+        launch()
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                wait_for = min(self.hedge_after, remaining) if next_idx < len(self.strategies) else remaining
+                done, _ = await asyncio.wait(set(pending), timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slow primary: hedge with the next strategy, unless the
+                    # call cap is saturated (more calls would only queue or 429)
+                    if next_idx < len(self.strategies) and not self._calls.locked():
+                        launch()
+                    continue
+                fallback_needed = False
+                for task in done:
+                    idx = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self.metrics["failures"] += 1
+                        print(f"   ❌ Attempt {idx + 1} failed: {str(e) or e.__class__.__name__}")
+                        fallback_needed = True
+                        continue
+                    print(f"   Result {idx + 1}: '{result['text']}'")
+                    if not is_hallucination(result["text"]):
+                        print(f"✅ Valid transcription found on attempt {idx + 1}")
+                        return result
+                    print("   ⚠️  Possible hallucination detected, trying next strategy...")
+                    if best is None or len(result["text"]) > len(best["text"]):
+                        best = {**result, "suspect": True}
+                    fallback_needed = True
+                if fallback_needed and next_idx < len(self.strategies):
+                    launch()
+            return best
+        finally:
+            for task in pending:
+                task.cancel()
+                self.metrics["cancelled"] += 1
+
+    async def transcribe_chunks(self, client, chunks: List[Tuple[float, bytes]], content_type: str = "audio/wav", concurrency: int = 4) -> Optional[dict]:
+        """Transcribe ``(offset seconds, audio)`` chunks concurrently and stitch them in order.
+
+        Segment timestamps are shifted by their chunk's offset. Chunks that
+        failed or only produced a hallucination (typically a noisy pause) are
+        left out; None if no chunk produced usable text.
+
+        ``concurrency`` only bounds chunks in progress; the Groq calls they make
+        (hedges included) share the transcriber's ``max_concurrent_calls`` cap
+        with every other request.
+        """
+        semaphore = asyncio.Semaphore(max(1, min(concurrency, self.max_concurrent_calls)))
+
+        async def one(i: int, data: bytes):
+            async with semaphore:
+                return await self.transcribe(client, f"chunk{i}.wav", data, content_type)
+
+        results = await asyncio.gather(*(one(i, data) for i, (_, data) in enumerate(chunks)))
+        texts, segments, languages = [], [], Counter()
+        for (offset, _), result in zip(chunks, results):
+            if result is None or result.get("suspect"):
+                continue
+            texts.append(result["text"])
+            languages[result.get("language")] += 1
+            if result["segments"]:
+                for seg in result["segments"]:
+                    segments.append({
+                        "start": round(offset + (seg["start"] or 0), 2),
+                        "end": round(offset + (seg["end"] or 0), 2),
+                        "text": seg["text"],
+                    })
+            else:
+                segments.append({"start": round(offset, 2), "end": round(offset + (result.get("duration") or 0), 2), "text": result["text"]})
+        if not texts:
+            return None
+        last_offset, last = chunks[-1][0], results[-1]
+        return {
+            "text": " ".join(texts),
+            "language": languages.most_common(1)[0][0],
+            "duration": round(last_offset + ((last or {}).get("duration") or 0), 2),
+            "segments": segments,
+            "strategy": None,
+            "chunks": len(chunks),
+        }
+
+    def stats(self) -> dict:
+        return dict(self.metrics)
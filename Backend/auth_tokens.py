@@ -0,0 +1,100 @@
+"""
+JWT issuing and an in-process revocation cache.
+
+Access tokens are short-lived and carry the claims the API needs to
+authorize a request (user id, role, gram panchayat), so verifying one needs
+no database lookup. Refresh tokens are long-lived and are exchanged at
+``/api/auth/refresh``, which is where the user document is re-read.
+
+Revoked token ids (logout, refresh rotation) and deactivated users are kept
+in ``RevocationCache``, which is reloaded from Mongo in the background every
+few seconds; revocations made by this process apply immediately, those made
+by other workers within one refresh interval.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from jose import jwt
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+
+def encode_token(claims: dict, token_type: str, ttl: timedelta, secret: str, algorithm: str) -> str:
+    now = datetime.utcnow()
+    payload = {
+        **claims,
+        "typ": token_type,
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + ttl,
+    }
+    return jwt.encode(payload, secret, algorithm=algorithm)
+
+
+def user_claims(user: dict) -> dict:
+    return {
+        "sub": str(user["_id"]),
+        "role": (user.get("role") or "citizen").lower(),
+        "gp": user.get("gram_panchayat"),
+        "name": user.get("name"),
+    }
+
+
+class RevocationCache:
+    """Revoked token ids and inactive user ids, mirrored from Mongo."""
+
+    def __init__(self, revoked_collection, users_collection, refresh_seconds: float = 30.0):
+        self.revoked_collection = revoked_collection
+        self.users_collection = users_collection
+        self.refresh_seconds = refresh_seconds
+        self.revoked_jtis: Set[str] = set()
+        self.inactive_users: Set[str] = set()
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, jti: Optional[str], user_id: str) -> bool:
+        return (jti in self.revoked_jtis) or (user_id in self.inactive_users)
+
+    async def revoke(self, jti: str, user_id: str, expires_at: datetime):
+        """Revoke one token; visible here at once and to other workers on their next reload."""
+        self.revoked_jtis.add(jti)
+        await self.revoked_collection.update_one(
+            {"_id": jti},
+            {"$setOnInsert": {"user_id": user_id, "expires_at": expires_at, "revoked_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def reload(self):
+        now = datetime.utcnow()
+        before = set(self.revoked_jtis)
+        revoked = set()
+        async for doc in self.revoked_collection.find({"expires_at": {"$gt": now}}, {"_id": 1}):
+            revoked.add(doc["_id"])
+        inactive = set()
+        async for doc in self.users_collection.find({"is_active": False}, {"_id": 1}):
+            inactive.add(str(doc["_id"]))
+        # Keep local revocations made while the queries were running
+        self.revoked_jtis = revoked | (self.revoked_jtis - before)
+        self.inactive_users = inactive
+        self.loaded_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"Auth revocation cache refresh warning: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,179 @@
+"""
+GramaBot replies: streamed LLM tokens with an instant rule-based fallback.
+
+``ChatService.stream`` yields Server-Sent Events (``data: {...}\\n\\n``):
+``{"token": ...}`` per completion delta, then ``{"done": true, "source":
+"llm" | "rules"}``. Time to first token is recorded for /api/admin/metrics.
+
+The rule-based reply is served straight away, without waiting on the
+network, when no client is configured or the circuit breaker is open. It is
+also used when the LLM fails or times out before its first token. If the
+client disconnects, the loop stops and the upstream completion stream is
+closed, so the model stops generating.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+SYSTEM_PROMPT = (
+    "You are GramaBot, a helpful assistant for a rural issue reporting app called GramaFix. "
+    "Keep answers concise and friendly. If a user asks for harmful or illegal content, "
+    "reply: 'Sorry, I can't assist with that.'"
+)
+EMPTY_MESSAGE_REPLY = "Please type your question or say hi."
+
+
+def rule_based_reply(message: str) -> str:
+    msg = message.lower()
+
+    def contains(*words):
+        return any(w in msg for w in words)
+
+    if contains("hi", "hello", "hey"):
+        return "Hi! I'm GramaBot. I can help you report issues, check status, or learn how to register. What would you like to do?"
+    if contains("report"):
+        return "To report an issue: go to the Report page, choose a category, add a description and photos, and submit."
+    if contains("status", "track"):
+        return "To check status: open Reports, find your issue, and view its current status and history."
+    if contains("register", "signup", "sign up"):
+        return "To register: open the Register page, enter your details, and create an account. You can enable Authenticator (TOTP) in Profile."
+    if contains("totp", "authenticator", "otp"):
+        return "In your Profile, enable Authenticator to get a QR code. Scan it with Google Authenticator or Authy, then enter the 6-digit code to verify."
+    return "I didn't catch that. Ask about reporting an issue, checking status, registration, or Authenticator (TOTP)."
+
+
+def sse(event: dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def _percentile(samples, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+
+class ChatService:
+    def __init__(
+        self,
+        model: str,
+        breaker,
+        first_token_timeout: float = 8.0,
+        timeout: float = 30.0,
+        temperature: float = 0.2,
+        max_tokens: int = 256,
+    ):
+        self.model = model
+        self.breaker = breaker
+        self.first_token_timeout = first_token_timeout
+        self.timeout = timeout
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.metrics = {"requests": 0, "streams": 0, "llm": 0, "fallbacks": 0, "cancelled": 0, "errors": 0}
+        self._ttft_ms = deque(maxlen=500)
+
+    def _request(self, user_msg: str, **extra) -> dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_msg},
+            ],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            **extra,
+        }
+
+    def _fallback(self, user_msg: str) -> str:
+        self.metrics["fallbacks"] += 1
+        return rule_based_reply(user_msg)
+
+    async def reply(self, client, user_msg: str) -> Tuple[str, str]:
+        """Whole reply as ``(text, source)``; awaits the async client, never blocks the loop."""
+        self.metrics["requests"] += 1
+        if client is None or not self.breaker.allow():
+            return self._fallback(user_msg), "rules"
+        try:
+            completion = await asyncio.wait_for(client.chat.completions.create(**self._request(user_msg)), self.timeout)
+            text = (completion.choices[0].message.content or "").strip()
+        except Exception as e:
+            self.breaker.record_failure()
+            self.metrics["errors"] += 1
+            print(f"Chatbot LLM error: {str(e) or e.__class__.__name__}")
+            return self._fallback(user_msg), "rules"
+        finally:
+            # A cancelled request recorded no outcome: give a half-open trial back
+            self.breaker.release_trial()
+        self.breaker.record_success()
+        self.metrics["llm"] += 1
+        return text, "llm"
+
+    async def stream(self, client, user_msg: str, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncIterator[str]:
+        """SSE events for one reply; stops (and closes the upstream stream) when the client goes away."""
+        self.metrics["streams"] += 1
+        if client is None or not self.breaker.allow():
+            yield sse({"token": self._fallback(user_msg)})
+            yield sse({"done": True, "source": "rules"})
+            return
+
+        started = time.perf_counter()
+        upstream = None
+        first_token = True
+        try:
+            upstream = await asyncio.wait_for(
+                client.chat.completions.create(**self._request(user_msg, stream=True)), self.first_token_timeout
+            )
+            chunks = upstream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(
+                        chunks.__anext__(), self.first_token_timeout if first_token else self.timeout
+                    )
+                except StopAsyncIteration:
+                    break
+                if is_disconnected is not None and await is_disconnected():
+                    self.metrics["cancelled"] += 1
+                    return
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if not token:
+                    continue
+                if first_token:
+                    first_token = False
+                    self._ttft_ms.append((time.perf_counter() - started) * 1000)
+                    self.breaker.record_success()
+                yield sse({"token": token})
+            if first_token:
+                raise RuntimeError("empty completion")
+            self.metrics["llm"] += 1
+            yield sse({"done": True, "source": "llm"})
+        except (asyncio.CancelledError, GeneratorExit):
+            self.metrics["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"Chatbot LLM stream error: {str(e) or e.__class__.__name__}")
+            if first_token:
+                self.breaker.record_failure()
+                yield sse({"token": self._fallback(user_msg)})
+                yield sse({"done": True, "source": "rules"})
+            else:
+                yield sse({"error": "The reply was interrupted. Please try again."})
+                yield sse({"done": True, "source": "llm"})
+        finally:
+            # A disconnect says nothing about the LLM: give an abandoned half-open trial back
+            self.breaker.release_trial()
+            if upstream is not None:
+                try:
+                    await upstream.close()
+                except Exception:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "breaker": self.breaker.state,
+            "ttft_ms_p50": _percentile(self._ttft_ms, 0.5),
+            "ttft_ms_p95": _percentile(self._ttft_ms, 0.95),
+        }
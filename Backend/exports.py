@@ -0,0 +1,320 @@
+"""
+Bulk issue exports.
+
+Shared column definitions for the streaming CSV endpoint, plus background
+export jobs that write Parquet, gzip-compressed NDJSON or CSV files to disk
+in batches (reporting progress in the ``export_jobs`` collection) and a
+Range-aware file response so interrupted downloads can resume.
+
+Running jobs record their owner process and refresh ``heartbeat_at``; with
+several workers sharing the collection, only jobs whose heartbeat has gone
+stale (their process died) are failed by ``export_maintenance``, which also
+enforces the retention period on the export files.
+"""
+import asyncio
+import csv
+import gzip
+import json
+import os
+import re
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+EXPORT_COLUMNS = ["id", "category", "description", "gram_panchayat", "status", "priority_votes", "created_at", "resolved_at"]
+# Only the exported fields leave Mongo
+EXPORT_PROJECTION = {c: 1 for c in EXPORT_COLUMNS if c != "id"}
+
+# format -> (file suffix, media type)
+EXPORT_FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "ndjson": (".ndjson.gz", "application/gzip"),
+    "csv": (".csv", "text/csv"),
+}
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else (value or "")
+
+
+def issue_export_row(doc: dict) -> list:
+    return [
+        str(doc.get("_id")),
+        doc.get("category", ""),
+        (doc.get("description", "") or "").replace("\n", " ").strip(),
+        doc.get("gram_panchayat", ""),
+        doc.get("status", ""),
+        doc.get("priority_votes", 0),
+        _iso(doc.get("created_at")),
+        _iso(doc.get("resolved_at")),
+    ]
+
+
+# ---- File writers (called from worker threads) ----
+
+class CsvExportWriter:
+    def __init__(self, path: str):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write_batch(self, docs):
+        self.writer.writerows(issue_export_row(d) for d in docs)
+
+    def close(self):
+        self.f.close()
+
+
+class NdjsonExportWriter:
+    def __init__(self, path: str):
+        self.f = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+
+    def write_batch(self, docs):
+        for d in docs:
+            self.f.write(json.dumps(dict(zip(EXPORT_COLUMNS, issue_export_row(d))), ensure_ascii=False))
+            self.f.write("\n")
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetExportWriter:
+    def __init__(self, path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ("id", pa.string()),
+            ("category", pa.string()),
+            ("description", pa.string()),
+            ("gram_panchayat", pa.string()),
+            ("status", pa.string()),
+            ("priority_votes", pa.int64()),
+            ("created_at", pa.timestamp("ms")),
+            ("resolved_at", pa.timestamp("ms")),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write_batch(self, docs):
+        def _dt(v):
+            return v if isinstance(v, datetime) else None
+        columns = {
+            "id": [str(d.get("_id")) for d in docs],
+            "category": [d.get("category") for d in docs],
+            "description": [d.get("description") for d in docs],
+            "gram_panchayat": [d.get("gram_panchayat") for d in docs],
+            "status": [d.get("status") for d in docs],
+            "priority_votes": [int(d.get("priority_votes") or 0) for d in docs],
+            "created_at": [_dt(d.get("created_at")) for d in docs],
+            "resolved_at": [_dt(d.get("resolved_at")) for d in docs],
+        }
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvExportWriter, "ndjson": NdjsonExportWriter, "parquet": ParquetExportWriter}
+
+
+def check_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {list(EXPORT_FORMATS)}")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except Exception:
+            raise HTTPException(status_code=400, detail="Parquet export requires the 'pyarrow' package")
+
+
+def export_path(folder: str, job_id: str, fmt: str) -> str:
+    return os.path.join(folder, f"issues_{job_id}{EXPORT_FORMATS[fmt][0]}")
+
+
+HEARTBEAT_SECONDS = 15
+# A queued/running job whose heartbeat is older than this belongs to a dead process
+STALE_AFTER_SECONDS = 4 * HEARTBEAT_SECONDS
+
+
+def job_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _heartbeat(jobs, job_id, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await jobs.update_one({"_id": job_id}, {"$set": {"heartbeat_at": datetime.utcnow()}})
+        except Exception as e:
+            print(f"Export heartbeat warning: {e}")
+
+
+async def run_export_job(jobs, cursor, job_id, fmt: str, path: str, total: int, batch_size: int):
+    """Drain ``cursor`` into ``path`` batch by batch, recording progress on the job document."""
+    tmp_path = path + ".part"
+    await jobs.update_one({"_id": job_id}, {"$set": {
+        "status": "running",
+        "total": total,
+        "started_at": datetime.utcnow(),
+        "owner": job_owner(),
+        "heartbeat_at": datetime.utcnow(),
+    }})
+    heartbeat = asyncio.create_task(_heartbeat(jobs, job_id, HEARTBEAT_SECONDS))
+    writer = None
+    processed = 0
+    try:
+        writer = await asyncio.to_thread(WRITERS[fmt], tmp_path)
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                await asyncio.to_thread(writer.write_batch, batch)
+                processed += len(batch)
+                batch = []
+                await jobs.update_one({"_id": job_id}, {"$set": {"processed": processed}})
+        if batch:
+            await asyncio.to_thread(writer.write_batch, batch)
+            processed += len(batch)
+        await asyncio.to_thread(writer.close)
+        writer = None
+        await asyncio.to_thread(os.replace, tmp_path, path)
+        size = await asyncio.to_thread(os.path.getsize, path)
+        await jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "done",
+            "processed": processed,
+            "size": size,
+            "finished_at": datetime.utcnow(),
+        }})
+    except BaseException as e:
+        if writer is not None:
+            try:
+                await asyncio.to_thread(writer.close)
+            except Exception:
+                pass
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        await jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "failed",
+            "processed": processed,
+            "error": str(e) or e.__class__.__name__,
+            "finished_at": datetime.utcnow(),
+        }})
+        if not isinstance(e, Exception):
+            raise
+    finally:
+        heartbeat.cancel()
+        await cursor.close()
+
+
+async def fail_stale_jobs(jobs, stale_after_seconds: float = STALE_AFTER_SECONDS) -> int:
+    """Mark queued/running jobs whose owner stopped heartbeating as failed."""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after_seconds)
+    result = await jobs.update_many(
+        {
+            "status": {"$in": ["queued", "running"]},
+            "$or": [
+                {"heartbeat_at": {"$lt": cutoff}},
+                # Jobs created before heartbeats were recorded
+                {"heartbeat_at": {"$exists": False}, "created_at": {"$lt": cutoff}},
+            ],
+        },
+        {"$set": {"status": "failed", "error": "interrupted: worker stopped", "finished_at": datetime.utcnow()}},
+    )
+    return result.modified_count
+
+
+async def export_maintenance(jobs, folder: str, retention_seconds: float, interval_seconds: float = 3600):
+    """Every ``interval_seconds``: fail orphaned jobs and delete expired export files."""
+    while True:
+        try:
+            await fail_stale_jobs(jobs)
+            removed = await asyncio.to_thread(purge_old_exports, folder, retention_seconds)
+            if removed:
+                print(f"Removed {removed} expired export file(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Export cleanup warning: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def purge_old_exports(folder: str, max_age_seconds: float) -> int:
+    """Delete export files older than ``max_age_seconds``; returns how many were removed."""
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# ---- Resumable downloads ----
+
+def _parse_range(header: str, size: int):
+    """Return (start, end) inclusive for a single ``bytes=`` range, or None to send the whole file."""
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(m.group(2)))
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+async def _file_chunks(path: str, start: int, length: int):
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(f.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(DOWNLOAD_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def range_file_response(path: str, media_type: str, filename: str, range_header: Optional[str] = None, if_range: Optional[str] = None):
+    """Serve ``path`` honouring a single HTTP Range (206) so clients can resume downloads."""
+    st = os.stat(path)
+    size = st.st_size
+    etag = f'"{int(st.st_mtime)}-{size}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename={filename}",
+    }
+    byte_range = _parse_range(range_header, size) if range_header else None
+    # If-Range: only resume when the client still has the same file version
+    if byte_range and if_range and if_range != etag:
+        byte_range = None
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_file_chunks(path, 0, size), media_type=media_type, headers=headers)
+    start, end = byte_range
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(_file_chunks(path, start, length), status_code=206, media_type=media_type, headers=headers)
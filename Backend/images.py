@@ -0,0 +1,201 @@
+"""
+Image derivative pipeline for issue and progress photos.
+
+The pure functions at the top of this module (``make_derivatives``,
+``resize_image``) are CPU-bound Pillow work and are meant to run in the
+shared process pool from ``workers.py``; they take and return plain bytes so
+nothing heavy crosses the process boundary besides the image itself.
+
+``DiskLRUCache`` backs the on-demand ``/uploads/{key}?w=`` resize route.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+THUMB_SIZE = (320, 320)
+DISPLAY_MAX_EDGE = 1280
+JPEG_QUALITY = 80
+WEBP_QUALITY = 78
+# Originals are re-encoded only to drop metadata, so keep them close to the upload
+ORIGINAL_JPEG_QUALITY = 95
+# On-demand widths are snapped to this ladder so the resize cache stays small
+RESIZE_WIDTHS = (160, 320, 640, 1024, 1600)
+
+# name -> (key suffix, content type)
+DERIVATIVES = {
+    "thumb": ("__thumb.jpg", "image/jpeg"),
+    "thumb_webp": ("__thumb.webp", "image/webp"),
+    "webp": ("__display.webp", "image/webp"),
+}
+
+
+def _open_oriented(data: bytes, target: Optional[Tuple[int, int]] = None):
+    from PIL import Image, ImageOps
+
+    img = Image.open(BytesIO(data))
+    if target and img.format == "JPEG":
+        # Let libjpeg decode at a reduced scale; much cheaper for phone photos
+        img.draft("RGB", target)
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+    return img
+
+
+def _encode(img, fmt: str) -> bytes:
+    # Saving without an ``exif=`` argument drops EXIF (GPS, device info) from the output
+    buf = BytesIO()
+    if fmt == "JPEG":
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        img.save(buf, format="WEBP", quality=WEBP_QUALITY, method=4)
+    return buf.getvalue()
+
+
+def make_derivatives(data: bytes) -> Dict[str, object]:
+    """Auto-orient, strip EXIF and build thumbnail / WebP variants of one image.
+
+    Returns ``{"width", "height", "variants": {name: bytes}}`` where the size is
+    that of the display variant and names are the keys of ``DERIVATIVES``.
+    """
+    display = _open_oriented(data, (DISPLAY_MAX_EDGE, DISPLAY_MAX_EDGE))
+    display.thumbnail((DISPLAY_MAX_EDGE, DISPLAY_MAX_EDGE))
+    thumb = display.copy()
+    thumb.thumbnail(THUMB_SIZE)
+
+    return {
+        "width": display.width,
+        "height": display.height,
+        "variants": {
+            "thumb": _encode(thumb, "JPEG"),
+            "thumb_webp": _encode(thumb, "WEBP"),
+            "webp": _encode(display, "WEBP"),
+        },
+    }
+
+
+def strip_metadata(data: bytes) -> Optional[bytes]:
+    """Re-encode an original JPEG / PNG / WebP without EXIF (GPS, device info).
+
+    Returns None when there is nothing to strip, so the file can be stored as
+    uploaded. Pixels are rotated per the EXIF orientation first, so the image
+    still displays upright without it. Raises ``ValueError`` for data Pillow
+    can't decode, or metadata in a format it can't re-encode in place.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        img = Image.open(BytesIO(data))
+        fmt = img.format
+        if not (img.getexif() or img.info.get("xmp")):
+            return None
+        if fmt not in ("JPEG", "PNG", "WEBP"):
+            raise ValueError(f"can't strip metadata from {fmt} images")
+        icc_profile = img.info.get("icc_profile")
+        img = ImageOps.exif_transpose(img)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"not a readable image: {e}")
+    buf = BytesIO()
+    if fmt == "JPEG":
+        img.save(buf, format="JPEG", quality=ORIGINAL_JPEG_QUALITY, optimize=True, icc_profile=icc_profile)
+    elif fmt == "PNG":
+        img.save(buf, format="PNG", optimize=True, icc_profile=icc_profile)
+    else:
+        img.save(buf, format="WEBP", quality=ORIGINAL_JPEG_QUALITY, icc_profile=icc_profile)
+    return buf.getvalue()
+
+
+def resize_image(data: bytes, width: int, fmt: str = "JPEG") -> bytes:
+    """Downscale an image to ``width`` pixels wide (never upscales), EXIF stripped."""
+    img = _open_oriented(data, (width, width))
+    if img.width > width:
+        from PIL import Image
+
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.LANCZOS)
+    return _encode(img, fmt)
+
+
+def resize_image_file(path: str, width: int, fmt: str = "JPEG") -> bytes:
+    with open(path, "rb") as f:
+        return resize_image(f.read(), width, fmt)
+
+
+def snap_width(width: int) -> int:
+    for w in RESIZE_WIDTHS:
+        if width <= w:
+            return w
+    return RESIZE_WIDTHS[-1]
+
+
+def derivative_key(original_key: str, name: str) -> str:
+    stem = original_key.rsplit(".", 1)[0] if "." in original_key else original_key
+    return f"{stem}{DERIVATIVES[name][0]}"
+
+
+class DiskLRUCache:
+    """Size-bounded on-disk cache with least-recently-used eviction.
+
+    The recency index lives in memory and is rebuilt from file mtimes on
+    start-up; hits refresh the mtime so the order survives restarts.
+    """
+
+    def __init__(self, folder: str, max_bytes: int):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        os.makedirs(folder, exist_ok=True)
+        entries = []
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if name.endswith(".part") or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def file_name(key: str, ext: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ext
+
+    def get(self, name: str) -> Optional[str]:
+        if name not in self._index:
+            return None
+        path = os.path.join(self.folder, name)
+        try:
+            os.utime(path)
+        except OSError:
+            self.total_bytes -= self._index.pop(name)
+            return None
+        self._index.move_to_end(name)
+        return path
+
+    def _write(self, name: str, data: bytes):
+        tmp_path = os.path.join(self.folder, f"{uuid.uuid4().hex}.part")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.folder, name))
+
+    async def put(self, name: str, data: bytes):
+        await asyncio.to_thread(self._write, name, data)
+        self.total_bytes += len(data) - self._index.pop(name, 0)
+        self._index[name] = len(data)
+        evicted = []
+        while self.total_bytes > self.max_bytes and len(self._index) > 1:
+            old_name, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            evicted.append(os.path.join(self.folder, old_name))
+        for path in evicted:
+            try:
+                await asyncio.to_thread(os.remove, path)
+            except OSError:
+                pass
@@ -1,16 +1,56 @@
-from fastapi import FastAPI, UploadFile, Form, File, HTTPException, Depends, BackgroundTasks, Header
+from fastapi import FastAPI, UploadFile, Form, File, HTTPException, Depends, BackgroundTasks, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import base64
+import io
 import os
 import re
 from datetime import datetime, timedelta
-import secrets
-import string
 from typing import List, Optional
 from models import Issue, User, StatusUpdate, Category
+from storage import CircuitBreaker, ContentIndex, LocalStorage, S3Storage, UploadBudget, digest_from_key, store_many
+from images import (
+    DERIVATIVES, DiskLRUCache, derivative_key, make_derivatives, resize_image_file, snap_width, strip_metadata,
+)
+from workers import run_in_process, shutdown_process_pool
+from asr import HedgedTranscriber
+from chatbot import EMPTY_MESSAGE_REPLY, ChatService, sse
+from symbols import normalize_spoken_symbols
+from transcript_cache import TranscriptCache, audio_key, cache_key
+from analytics import facet_pipeline, rollup_pipeline, shape_facet_result, shape_rollup_result
+from exports import (
+    EXPORT_COLUMNS,
+    EXPORT_FORMATS,
+    EXPORT_PROJECTION,
+    check_format,
+    export_maintenance,
+    export_path,
+    issue_export_row,
+    job_owner,
+    range_file_response,
+    run_export_job,
+)
+from notification_fanout import chat_ids_for_phones, issue_audience, status_change_batch
+from otp import OtpEngine
+from transitions import ISSUE_STATUSES, apply_transition, transition_update
+from projector import MirrorProjector, MirrorSource
+from passwords import hash_password, kdf_stats, shutdown_kdf_executor, verify_and_upgrade
+from auth_tokens import ACCESS, REFRESH, RevocationCache, encode_token, user_claims
+from rollups import (
+    ROLLUPS_COLLECTION,
+    RollupWriter,
+    init_rollup_indexes,
+    rebuild_rollups,
+    record_created,
+    record_status_change,
+    record_vote,
+    rollup_match,
+)
 import json
 try:
     from dotenv import load_dotenv
@@ -18,7 +58,6 @@ except Exception:  # python-dotenv not installed
     def load_dotenv(*args, **kwargs):
         return None
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 
 # Load environment variables from .env file
 load_dotenv()
@@ -29,9 +68,12 @@ load_dotenv()
 from telegram_bot import (
     send_telegram_message,
     notify_issue_created,
-    notify_status_update,
+    notify_high_votes,
+    send_telegram_batch,
     get_telegram_bot_link,
-    verify_telegram_chat
+    verify_telegram_chat,
+    dispatcher as telegram_dispatcher,
+    close_telegram_dispatcher,
 )
 
 # ---- App Setup ----
@@ -70,6 +112,21 @@ issues_collection = db["issues"]
 users_collection = db["users"]
 status_updates_collection = db["status_updates"]
 otp_codes_collection = db["otp_codes"]
+# One document per (issue_id, voter); replaces the unbounded issue.voters array
+issue_votes_collection = db["issue_votes"]
+# Reporter gets a one-off "trending" notification when an issue reaches this many votes
+TRENDING_VOTE_THRESHOLD = int(os.getenv("TRENDING_VOTE_THRESHOLD", "10"))
+# Per (gram_panchayat, category, status, day) counters maintained on every issue write
+issue_rollups_collection = db[ROLLUPS_COLLECTION]
+rollup_writer = RollupWriter(db)
+ANALYTICS_FROM_ROLLUPS = os.getenv("ANALYTICS_FROM_ROLLUPS", "true").lower() in ("1", "true", "yes")
+
+async def update_rollups(op, *args):
+    """Apply a rollups.record_* operation; analytics drift is logged rather than failing the request."""
+    try:
+        await op(rollup_writer, *args)
+    except Exception as e:
+        print(f"Rollup update warning: {e}")
 
 # Role-based user collections ("branches")
 users_citizen_collection = db["users_citizen"]
@@ -109,10 +166,40 @@ def get_issue_category_collection(category: str):
     # fallback bucket
     return db[f"issues_{re.sub(r'[^a-z0-9]+', '_', c)}"]
 
+async def _issues_voted_since(since):
+    return await issue_votes_collection.distinct("issue_id", {"created_at": {"$gte": since}})
+
+# The role/category "branches" above are read-side copies kept in sync in the
+# background; request handlers only write users/issues (see projector.py)
+mirror_projector = MirrorProjector(
+    client,
+    db,
+    {
+        "issues": MirrorSource(
+            issues_collection,
+            lambda doc: get_issue_category_collection(doc.get("category")),
+            lambda since: {"updated_at": {"$gte": since}},
+            mirror_prefix="issues_",
+        ),
+        "users": MirrorSource(
+            users_collection,
+            lambda doc: get_user_role_collection(doc.get("role")),
+            lambda since: {"$or": [{"created_at": {"$gte": since}}, {"updated_at": {"$gte": since}}]},
+            mirror_prefix="users_",
+        ),
+    },
+    db["projector_state"],
+    mode=os.getenv("PROJECTOR_MODE", "auto").lower(),
+    reconcile_seconds=float(os.getenv("PROJECTOR_RECONCILE_SECONDS", "60")),
+    related_ids={"issues": _issues_voted_since},
+)
+
 # ---- File Upload Config ----
+# Served by the /uploads/{key} route below (plain files, or resized with ?w=)
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_FOLDER), name="uploads")
+RESIZE_CACHE_FOLDER = os.getenv("RESIZE_CACHE_FOLDER", ".resize_cache")
+RESIZE_CACHE_MB = int(os.getenv("RESIZE_CACHE_MB", "256"))
 
 # ---- Groq Configuration for Whisper ----
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")  # For chatbot
@@ -132,56 +219,57 @@ def get_groq_client(use_voice_key=False):
         raise HTTPException(status_code=500, detail="Groq SDK not installed. Please install 'groq' Python package.")
     return Groq(api_key=api_key)
 
-def normalize_spoken_symbols(text: str) -> str:
-    """
-    Convert spoken programming/special symbols to actual symbols:
-    - "open parenthesis" → "("
-    - "close bracket" → "]"
-    - "colon" → ":"
-    - etc.
-    """
-    if not text:
-        return text
-    
-    # Define patterns for common spoken terms
-    patterns = [
-        (r"\bopen\s+parenthesis\b", "("),
-        (r"\bclose\s+parenthesis\b", ")"),
-        (r"\bopen\s+square\s+bracket\b", "["),
-        (r"\bclose\s+square\s+bracket\b", "]"),
-        (r"\bopen\s+curly\s+brace\b", "{"),
-        (r"\bclose\s+curly\s+brace\b", "}"),
-        (r"\bsemicolon\b", ";"),
-        (r"\bcolon\b", ":"),
-        (r"\bcomma\b", ","),
-        (r"\bperiod\b|\bdot\b", "."),
-        (r"\bplus\s+equals\b", "+="),
-        (r"\bminus\s+equals\b", "-="),
-        (r"\bdouble\s+equals\b", "=="),
-        (r"\bequals\b", "="),
-        (r"\bgreater\s+than\b", ">"),
-        (r"\bless\s+than\b", "<"),
-    (r"\bslash\b", "/"),
-    # replacement must escape backslash for re.sub
-    (r"\bbackslash\b", "\\\\"),
-        (r"\bpercent\b", "%"),
-        (r"\bdollar\s+sign\b", "$"),
-        (r"\bat\s+sign\b", "@"),
-        (r"\bhash\b|\bpound\b", "#"),
-        (r"\bampersand\b", "&"),
-        (r"\basterisk\b|\bstar\b", "*"),
-        (r"\bunderscore\b", "_"),
-        (r"\bhyphen\b|\bdash\b", "-"),
-        (r"\bquestion\s+mark\b", "?"),
-        (r"\bexclamation\s+mark\b", "!"),
-    ]
-    
-    # Apply all replacements (case-insensitive)
-    result = text
-    for pattern, replacement in patterns:
-        result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
-    
-    return result
+# Optional override, e.g. a local fake transcription server for testing
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+_async_groq_clients = {}
+
+def get_async_groq_client(use_voice_key=False):
+    """Shared AsyncGroq client (one keep-alive pool per key). Retries are left to the caller."""
+    api_key = GROQ_API_KEY_VOICE if use_voice_key else GROQ_API_KEY
+    if not api_key:
+        key_type = "voice transcription" if use_voice_key else "chatbot"
+        raise HTTPException(status_code=500, detail=f"Groq API key not configured for {key_type}")
+    client = _async_groq_clients.get(api_key)
+    if client is None:
+        try:
+            from groq import AsyncGroq  # lazy import to avoid hard dependency on startup
+        except Exception:
+            raise HTTPException(status_code=500, detail="Groq SDK not installed. Please install 'groq' Python package.")
+        client = AsyncGroq(api_key=api_key, base_url=GROQ_BASE_URL, max_retries=0)
+        _async_groq_clients[api_key] = client
+    return client
+
+transcriber = HedgedTranscriber(
+    hedge_after=float(os.getenv("ASR_HEDGE_AFTER_SECONDS", "2.5")),
+    attempt_timeout=float(os.getenv("ASR_ATTEMPT_TIMEOUT_SECONDS", "20")),
+    total_timeout=float(os.getenv("ASR_TOTAL_TIMEOUT_SECONDS", "45")),
+    # Concurrent Groq transcription calls across all requests, chunks and hedges
+    max_concurrent_calls=int(os.getenv("ASR_MAX_CONCURRENT_CALLS", "8")),
+)
+# Recordings longer than this are split on silence and transcribed in parallel (0 disables)
+ASR_CHUNK_SECONDS = float(os.getenv("ASR_CHUNK_SECONDS", "45"))
+ASR_CHUNK_CONCURRENCY = int(os.getenv("ASR_CHUNK_CONCURRENCY", "4"))
+
+# GramaBot: after CHAT_BREAKER_FAILURES LLM errors the rule-based replies are served
+# without trying Groq for CHAT_BREAKER_RESET_SECONDS
+chat_service = ChatService(
+    model=os.getenv("GROQ_CHAT_MODEL", "llama-3.1-8b-instant"),
+    breaker=CircuitBreaker(
+        int(os.getenv("CHAT_BREAKER_FAILURES", "3")),
+        float(os.getenv("CHAT_BREAKER_RESET_SECONDS", "30")),
+    ),
+    first_token_timeout=float(os.getenv("CHAT_FIRST_TOKEN_TIMEOUT_SECONDS", "8")),
+    timeout=float(os.getenv("CHAT_TIMEOUT_SECONDS", "30")),
+)
+
+def get_chat_client():
+    """Async Groq client for GramaBot, or None to use the rule-based replies."""
+    if not GROQ_API_KEY:
+        return None
+    try:
+        return get_async_groq_client(use_voice_key=False)
+    except HTTPException:
+        return None
 
 # ---- Predefined Categories ----
 CATEGORIES = [
@@ -196,38 +284,94 @@ CATEGORIES = [
 # ---- Auth / Security ----
 JWT_SECRET = os.getenv("JWT_SECRET", "dev_secret_change_me")
 ALGORITHM = "HS256"
-# Prefer PBKDF2-SHA256 to avoid bcrypt backend issues and 72-byte limit; keep bcrypt variants for legacy verifies
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256", "bcrypt_sha256", "bcrypt"],
-    deprecated="auto",
-)
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+ACCESS_TOKEN_MINUTES = int(os.getenv("ACCESS_TOKEN_MINUTES", "60"))
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "30"))
+# Tokens issued before claims were added (no "typ", no "exp") never expire; only enable
+# this for a migration window. They are still checked against the inactive-user list.
+ALLOW_LEGACY_TOKENS = os.getenv("ALLOW_LEGACY_TOKENS", "false").lower() in ("1", "true", "yes")
+AUTH_CACHE_REFRESH_SECONDS = float(os.getenv("AUTH_CACHE_REFRESH_SECONDS", "15"))
+revoked_tokens_collection = db["revoked_tokens"]
+revocation_cache = RevocationCache(revoked_tokens_collection, users_collection, AUTH_CACHE_REFRESH_SECONDS)
+
+def create_access_token(user: dict) -> str:
+    return encode_token(user_claims(user), ACCESS, timedelta(minutes=ACCESS_TOKEN_MINUTES), JWT_SECRET, ALGORITHM)
+
+def create_refresh_token(user: dict) -> str:
+    return encode_token({"sub": str(user["_id"])}, REFRESH, timedelta(days=REFRESH_TOKEN_DAYS), JWT_SECRET, ALGORITHM)
+
+def issue_tokens(user: dict) -> dict:
+    return {
+        "token": create_access_token(user),
+        "refresh_token": create_refresh_token(user),
+        "expires_in": ACCESS_TOKEN_MINUTES * 60,
+    }
 
-def create_access_token(data: dict, expires_minutes: int = 60 * 24 * 7):
-    to_encode = data.copy()
-    # Optionally add exp; omitted for simplicity but recommended in production
-    return jwt.encode(to_encode, JWT_SECRET, algorithm=ALGORITHM)
+def decode_token(token: str, token_type: str) -> dict:
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if not payload.get("sub") or payload.get("typ") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+    if revocation_cache.is_revoked(payload.get("jti"), payload["sub"]):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    return payload
+
+async def _legacy_token_user(payload: dict):
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+    if revocation_cache.is_revoked(None, user_id):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    if not user.get("is_active", True):
+        raise HTTPException(status_code=403, detail="Account is inactive")
+    return user
 
-async def get_current_user(authorization: Optional[str] = Header(None)):
+def _bearer(authorization: Optional[str]) -> str:
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-    token = authorization.split(" ", 1)[1]
+    return authorization.split(" ", 1)[1]
+
+async def get_current_user(authorization: Optional[str] = Header(None)):
+    """Authenticate from the token claims alone; no database round trip."""
+    token = _bearer(authorization)
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        unverified = jwt.get_unverified_claims(token)
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if "typ" not in unverified and ALLOW_LEGACY_TOKENS:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return await _legacy_token_user(payload)
+    payload = decode_token(token, ACCESS)
+    try:
+        user_id = ObjectId(payload["sub"])
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+    return {
+        "_id": user_id,
+        "role": payload.get("role"),
+        "gram_panchayat": payload.get("gp"),
+        "name": payload.get("name"),
+        "jti": payload.get("jti"),
+        "exp": payload.get("exp"),
+    }
+
+async def get_current_user_doc(user = Depends(get_current_user)):
+    """For endpoints that need the full user document (Telegram, TOTP setup)."""
+    if "jti" not in user:
+        return user  # legacy token path already loaded it
+    doc = await users_collection.find_one({"_id": user["_id"]})
+    if not doc:
+        raise HTTPException(status_code=401, detail="User not found")
+    if not doc.get("is_active", True):
+        raise HTTPException(status_code=403, detail="Account is inactive")
+    return doc
 
 def require_role(roles: List[str]):
     async def _inner(user = Depends(get_current_user)):
@@ -244,34 +388,148 @@ AWS_REGION = os.getenv("AWS_REGION", "")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID", "")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
 
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL", "")  # e.g. a local moto/MinIO server
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "20"))
+S3_MULTIPART_PART_MB = int(os.getenv("S3_MULTIPART_PART_MB", "8"))
+S3_BREAKER_FAILURES = int(os.getenv("S3_BREAKER_FAILURES", "3"))
+S3_BREAKER_RESET_SECONDS = float(os.getenv("S3_BREAKER_RESET_SECONDS", "30"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_MB", "10")) * 1024 * 1024
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_MB", "40")) * 1024 * 1024
+
 def _s3_client():
     import boto3  # lazy import
+    from botocore.config import Config
     return boto3.client(
         "s3",
         region_name=AWS_REGION or None,
+        endpoint_url=AWS_S3_ENDPOINT_URL or None,
         aws_access_key_id=AWS_ACCESS_KEY_ID or None,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY or None,
+        # Short timeouts and few retries: the circuit breaker handles a degraded S3
+        config=Config(
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            connect_timeout=3,
+            read_timeout=15,
+            retries={"max_attempts": 2, "mode": "standard"},
+        ),
     )
 
-def store_file(content: bytes, filename: str, content_type: Optional[str]) -> str:
-    """Store file and return a URL or local path under /uploads."""
-    safe_name = re.sub(r"[^a-zA-Z0-9._-]", "_", filename)
-    key = f"{datetime.now().timestamp()}_{safe_name}"
-    if ENABLE_S3_UPLOADS and AWS_S3_BUCKET:
+# Content-addressed uploads: one document per distinct SHA-256, reference counted
+content_index = ContentIndex(db["upload_blobs"])
+local_storage = LocalStorage(UPLOAD_FOLDER, index=content_index)
+if ENABLE_S3_UPLOADS and AWS_S3_BUCKET:
+    storage_backend = S3Storage(
+        AWS_S3_BUCKET,
+        AWS_REGION,
+        client_factory=_s3_client,
+        fallback=local_storage,
+        endpoint_url=AWS_S3_ENDPOINT_URL,
+        part_size=S3_MULTIPART_PART_MB * 1024 * 1024,
+        breaker=CircuitBreaker(S3_BREAKER_FAILURES, S3_BREAKER_RESET_SECONDS),
+        index=content_index,
+    )
+else:
+    storage_backend = local_storage
+
+def new_upload_budget() -> UploadBudget:
+    """Size budget shared by all files of a single request."""
+    return UploadBudget(MAX_UPLOAD_FILE_BYTES, MAX_UPLOAD_REQUEST_BYTES)
+
+async def store_files(uploads: List[UploadFile]) -> List[str]:
+    """Stream a request's uploads to the configured backend in parallel.
+
+    Returns URLs or local paths under /uploads in the same order as ``uploads``;
+    entries without a filename are skipped.
+    """
+    uploads = [u for u in (uploads or []) if u and u.filename]
+    if not uploads:
+        return []
+    return await store_many(storage_backend, uploads, new_upload_budget(), UPLOAD_CONCURRENCY)
+
+async def release_files(urls: List[str]):
+    """Undo store_files for a request that failed after its uploads were stored."""
+    for url in urls or []:
         try:
-            s3 = _s3_client()
-            extra_args = {"ContentType": content_type} if content_type else {}
-            s3.put_object(Bucket=AWS_S3_BUCKET, Key=key, Body=content, **extra_args)
-            if AWS_REGION:
-                return f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{key}"
-            else:
-                return f"https://{AWS_S3_BUCKET}.s3.amazonaws.com/{key}"
-        except Exception:
-            pass  # fallback to local
-    file_path = os.path.join(UPLOAD_FOLDER, key)
-    with open(file_path, "wb") as f:
-        f.write(content)
-    return f"uploads/{key}"
+            await _backend_for(url).release(url)
+        except Exception as e:
+            print(f"Upload release warning: {e}")
+
+# ---- Image derivatives ----
+resize_cache = DiskLRUCache(RESIZE_CACHE_FOLDER, RESIZE_CACHE_MB * 1024 * 1024)
+_resize_inflight = {}
+
+def _backend_for(url: str):
+    return local_storage if local_storage.owns(url) else storage_backend
+
+async def build_image_variants(url: str) -> Optional[dict]:
+    """Create thumbnail / WebP variants for one stored image; None if it can't be decoded.
+
+    Variants are remembered on the content index, so a deduplicated photo is
+    only processed the first time its bytes are seen.
+    """
+    backend = _backend_for(url)
+    if not backend.owns(url):
+        return None
+    key = backend.key_for(url)
+    digest = digest_from_key(key)
+    if digest:
+        known = await content_index.get_variants(digest)
+        if known:
+            return {"original": url, **known}
+    try:
+        data = await backend.read_bytes(key)
+        result = await run_in_process(make_derivatives, data)
+    except Exception as e:
+        print(f"Image derivative warning for {url}: {e}")
+        return None
+    variants = {"width": result["width"], "height": result["height"]}
+    for name, content in result["variants"].items():
+        variants[name] = await backend.write_bytes(derivative_key(key, name), content, DERIVATIVES[name][1])
+    if digest:
+        await content_index.set_variants(digest, variants)
+    return {"original": url, **variants}
+
+async def strip_upload_metadata(upload: UploadFile):
+    """Swap an upload's bytes for an EXIF-free (GPS-free) copy before it is stored.
+
+    Originals are served publicly as-is, so this happens before anything is
+    written: whichever backend ends up holding the file, only the stripped
+    bytes ever reach it. Files that can't be checked are rejected with 400.
+    """
+    data = await upload.read(MAX_UPLOAD_FILE_BYTES + 1)
+    await upload.seek(0)
+    if len(data) > MAX_UPLOAD_FILE_BYTES:
+        return  # rejected with 413 while it is streamed to storage
+    try:
+        stripped = await run_in_process(strip_metadata, data)
+    except ValueError as e:
+        print(f"Image metadata warning for {upload.filename}: {e}")
+        raise HTTPException(status_code=400, detail=f"'{upload.filename}' is not a supported image")
+    if stripped is not None:
+        upload.file = io.BytesIO(stripped)
+        upload.size = len(stripped)
+
+async def store_images(uploads: List[UploadFile]) -> List[str]:
+    """store_files for photos: EXIF is stripped from each original before it is stored."""
+    uploads = [u for u in (uploads or []) if u and u.filename]
+    await asyncio.gather(*(strip_upload_metadata(u) for u in uploads))
+    return await store_files(uploads)
+
+async def process_issue_images(issue_id, field: str, urls: List[str]):
+    """Background task: derive variants for ``urls`` and append them to the issue's ``field``."""
+    variants = []
+    for url in urls:
+        v = await build_image_variants(url)
+        if v:
+            variants.append(v)
+    if variants:
+        await issues_collection.update_one(
+            {"_id": ObjectId(issue_id)},
+            {"$push": {field: {"$each": variants}}},
+        )
+        mirror_projector.notify("issues", ObjectId(issue_id))
+
 
 # ---- Optional: Twilio SMS (OTP / Alerts) ----
 ENABLE_TWILIO_SMS = os.getenv("ENABLE_TWILIO_SMS", "false").lower() in ("1", "true", "yes")
@@ -280,6 +538,16 @@ TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "")
 TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "")
 DEBUG_OTP = os.getenv("DEBUG_OTP", "false").lower() in ("1", "true", "yes")
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+otp_engine = OtpEngine(
+    otp_codes_collection,
+    db["otp_sends"],
+    key=os.getenv("OTP_HMAC_KEY") or JWT_SECRET,
+    ttl_seconds=OTP_TTL_SECONDS,
+    cooldown_seconds=int(os.getenv("OTP_RESEND_COOLDOWN_SECONDS", "30")),
+    max_attempts=int(os.getenv("OTP_MAX_ATTEMPTS", "5")),
+    max_sends=int(os.getenv("OTP_MAX_SENDS_PER_HOUR", "5")),
+)
 
 def send_sms(to: str, body: str) -> bool:
     if not (ENABLE_TWILIO_SMS or ENABLE_TWILIO_OTP):
@@ -332,18 +600,36 @@ async def init_indexes():
     # Helpful indexes for queries used in app
     await users_collection.create_index("email", unique=True)
     await users_collection.create_index("phone", unique=True)
-    await issues_collection.create_index([("created_at", -1)])
+    # (created_at, _id) backs keyset pagination and newest-first listing; it
+    # supersedes the old single-field created_at index
+    await issues_collection.create_index([("created_at", -1), ("_id", -1)])
+    await issues_collection.create_index([("gram_panchayat", 1), ("created_at", -1), ("_id", -1)])
+    try:
+        await issues_collection.drop_index("created_at_-1")
+    except Exception:
+        pass
     await issues_collection.create_index("gram_panchayat")
+    # Top-voted issues for the dashboard
+    await issues_collection.create_index([("priority_votes", -1)])
+    await issues_collection.create_index([("gram_panchayat", 1), ("priority_votes", -1)])
+    await init_rollup_indexes(issue_rollups_collection)
     await issues_collection.create_index("category")
     await issues_collection.create_index("status")
     await status_updates_collection.create_index("issue_id")
+    await issue_votes_collection.create_index([("issue_id", 1), ("voter", 1)], unique=True)
+    # Mirror reconciliation scans (outbox mode)
+    await issues_collection.create_index("updated_at")
+    await issue_votes_collection.create_index("created_at")
+    # Revoked token ids only matter until the token would have expired anyway
+    await revoked_tokens_collection.create_index("expires_at", expireAfterSeconds=0)
+    await users_collection.create_index("is_active", sparse=True)
     # device tokens removed (Firebase messaging removed)
-    # OTP TTL index (expire after 'expires_at')
+    # OTP codes and per-phone send counters expire via TTL on 'expires_at'
     try:
-        await otp_codes_collection.create_index("phone")
-        await otp_codes_collection.create_index("expires_at", expireAfterSeconds=0)
+        await otp_engine.init_indexes()
     except Exception:
         pass
+    await transcript_cache.init_indexes()
     # per-role user collections
     for uc in (users_citizen_collection, users_admin_collection, users_panchayat_collection):
         try:
@@ -361,12 +647,42 @@ async def init_indexes():
         except Exception:
             pass
 
+async def ensure_rollups():
+    """First start after upgrading: build the rollups from the existing issues."""
+    try:
+        if await issue_rollups_collection.estimated_document_count() == 0 and await issues_collection.estimated_document_count() > 0:
+            buckets = await rebuild_rollups(db)
+            print(f"Built analytics rollups: {buckets} buckets")
+    except Exception as e:
+        print(f"Rollup rebuild warning: {e}")
+
 @app.on_event("startup")
 async def on_startup():
     try:
         await init_indexes()
     except Exception as e:
         print(f"Index initialization warning: {e}")
+    asyncio.create_task(ensure_rollups())
+    revocation_cache.start()
+    try:
+        await mirror_projector.start()
+    except Exception as e:
+        print(f"Mirror projector warning: {e}")
+    # Fails jobs orphaned by a dead worker and enforces EXPORT_RETENTION_HOURS
+    global _export_maintenance_task
+    _export_maintenance_task = asyncio.create_task(export_maintenance(
+        export_jobs_collection, EXPORT_FOLDER, EXPORT_RETENTION_HOURS * 3600, EXPORT_CLEANUP_INTERVAL_SECONDS
+    ))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await revocation_cache.stop()
+    await mirror_projector.stop()
+    if _export_maintenance_task is not None:
+        _export_maintenance_task.cancel()
+    await close_telegram_dispatcher()
+    shutdown_process_pool()
+    shutdown_kdf_executor()
 
 # ---- Routes ----
 
@@ -375,16 +691,93 @@ async def health():
     return {"status": "GramaFix Backend running ✅", "version": "1.0.0"}
 
 
+@app.get("/api/admin/metrics")
+async def get_metrics(user = Depends(require_role(["admin"]))):
+    """Runtime counters for the worker serving this request."""
+    return {
+        "kdf": kdf_stats(),
+        "projector": mirror_projector.stats(),
+        "telegram": telegram_dispatcher.stats(),
+        "asr": transcriber.stats(),
+        "transcript_cache": transcript_cache.stats(),
+        "chatbot": chat_service.stats(),
+    }
+
+
+@app.get("/uploads/{key:path}")
+async def serve_upload(key: str, request: Request, w: Optional[int] = None):
+    """Serve an uploaded file; with ?w= return a resized copy from the LRU disk cache."""
+    root = os.path.realpath(UPLOAD_FOLDER)
+    path = os.path.realpath(os.path.join(root, key))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    if not w:
+        return FileResponse(path)
+    if w < 1:
+        raise HTTPException(status_code=400, detail="w must be a positive integer")
+
+    width = snap_width(w)
+    fmt = "WEBP" if "image/webp" in request.headers.get("accept", "") else "JPEG"
+    ext = ".webp" if fmt == "WEBP" else ".jpg"
+    media_type = "image/webp" if fmt == "WEBP" else "image/jpeg"
+    headers = {"Cache-Control": "public, max-age=604800", "Vary": "Accept"}
+    name = DiskLRUCache.file_name(f"{key}|{width}|{int(os.path.getmtime(path))}", ext)
+    cached = resize_cache.get(name)
+    if cached:
+        return FileResponse(cached, media_type=media_type, headers=headers)
+
+    # Collapse concurrent requests for the same variant into one resize job
+    task = _resize_inflight.get(name)
+    if task is None:
+        task = asyncio.ensure_future(run_in_process(resize_image_file, path, width, fmt))
+        _resize_inflight[name] = task
+        task.add_done_callback(lambda _t: _resize_inflight.pop(name, None))
+    try:
+        data = await asyncio.shield(task)
+    except Exception:
+        # Not an image Pillow can read: serve the original untouched
+        return FileResponse(path)
+    if resize_cache.get(name) is None:
+        await resize_cache.put(name, data)
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+TRANSCRIPT_CACHE_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_ENTRIES", "512"))
+TRANSCRIPT_CACHE_TTL_HOURS = int(os.getenv("TRANSCRIPT_CACHE_TTL_HOURS", "168"))
+transcript_cache = TranscriptCache(
+    db["transcript_cache"], TRANSCRIPT_CACHE_ENTRIES, TRANSCRIPT_CACHE_TTL_HOURS * 3600
+)
+# Part of every cache key: results are only reused under the ASR settings that produced them
+TRANSCRIPT_CACHE_VERSION = f"{transcriber.fingerprint}.{ASR_CHUNK_SECONDS:g}"
+
+async def cached_transcript(key: str) -> Optional[dict]:
+    try:
+        return await transcript_cache.get(key)
+    except Exception as e:
+        print(f"Transcript cache warning: {e}")
+        return None
+
+async def store_transcript(keys, value: dict):
+    try:
+        await transcript_cache.put(keys, value)
+    except Exception as e:
+        print(f"Transcript cache warning: {e}")
+
+def transcript_response(raw: dict) -> dict:
+    """Cached entries hold the raw ASR transcript; symbol normalisation is applied per response."""
+    if not ENABLE_SYMBOL_NORMALIZATION:
+        return raw
+    return {**raw, "transcript": normalize_spoken_symbols(raw["transcript"], raw.get("language"))}
+
+
 @app.post("/api/transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
     """
     Transcribe audio file to text using Groq Whisper model.
     Converts audio to optimal format and uses best settings for accuracy.
     """
-    temp_path = None
-    converted_path = None
     try:
-        # Read uploaded audio file
+        # Read uploaded audio file (kept in memory; nothing is written under uploads/)
         audio_data = await file.read()
         
         print(f"📝 Received audio file: {file.filename}")
@@ -398,161 +791,69 @@ async def transcribe_audio(file: UploadFile = File(...)):
         if len(audio_data) < 1000:
             raise HTTPException(status_code=400, detail="Audio file too short (less than 1KB)")
         
-        # Save temporarily
-        timestamp = datetime.now().timestamp()
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_{timestamp}_{file.filename}")
-        with open(temp_path, "wb") as f:
-            f.write(audio_data)
-        
-        print(f"   Saved to: {temp_path}")
+        # Same bytes as an earlier upload (client retry): answer from the cache
+        raw_key = await asyncio.to_thread(audio_key, "raw", audio_data, TRANSCRIPT_CACHE_VERSION)
+        cached = await cached_transcript(raw_key)
+        if cached:
+            print(f"⚡ Transcript cache hit ({raw_key[:32]})")
+            return JSONResponse(content={"success": True, **transcript_response(cached), "cached": True})
         
-        # Convert to WAV format for better Whisper accuracy
+        # Convert to 16 kHz mono WAV for better Whisper accuracy: ffmpeg decodes
+        # through pipes and the trim/normalize runs in the process pool
+        transcription_bytes = audio_data
+        transcription_name = os.path.basename(file.filename or "audio.webm")
+        transcription_content_type = file.content_type or "audio/webm"
+        chunks = None
+        pcm_key = None
         try:
-            from pydub import AudioSegment
-            from pydub.effects import normalize
-            print("🔄 Converting audio to WAV format for optimal transcription...")
-            
-            # Load audio (supports webm, mp4, ogg, etc.)
-            audio = AudioSegment.from_file(temp_path)
-            
-            # Apply preprocessing to improve transcription accuracy:
-            # 1. Normalize audio (increases volume to optimal level)
-            audio = normalize(audio)
-            
-            # 2. Boost volume by additional 3dB to ensure clarity
-            audio = audio + 3
-            
-            # 3. Remove silence from start and end (common cause of hallucinations)
-            # Detect leading silence
-            def detect_leading_silence(sound, silence_threshold=-40.0, chunk_size=10):
-                trim_ms = 0
-                assert chunk_size > 0
-                while sound[trim_ms:trim_ms+chunk_size].dBFS < silence_threshold and trim_ms < len(sound):
-                    trim_ms += chunk_size
-                return trim_ms
-
-            start_trim = detect_leading_silence(audio)
-            end_trim = detect_leading_silence(audio.reverse())
-            
-            duration = len(audio)
-            if start_trim < duration and end_trim < duration:
-                audio = audio[start_trim:duration-end_trim]
-                print(f"   Trimmed silence: {start_trim}ms from start, {end_trim}ms from end")
-            
-            # 4. Convert to optimal settings for Whisper
-            # 16kHz sample rate, mono, 16-bit
-            audio = audio.set_frame_rate(16000).set_channels(1).set_sample_width(2)
-            
-            converted_path = os.path.join(UPLOAD_FOLDER, f"converted_{timestamp}.wav")
-            audio.export(converted_path, format="wav")
-            print(f"   Converted to: {converted_path}")
-            print(f"   Final audio duration: {len(audio)/1000:.2f}s")
-            
-            # Use converted file for transcription
-            transcription_file = converted_path
-            transcription_content_type = "audio/wav"
+            from audio_preprocess import SilentAudioError, prepare_for_asr
         except ImportError:
-            print("⚠️  pydub not available, using original file")
-            transcription_file = temp_path
-            transcription_content_type = file.content_type or "audio/webm"
-        except Exception as conv_error:
-            print(f"⚠️  Audio conversion failed: {conv_error}, using original file")
-            transcription_file = temp_path
-            transcription_content_type = file.content_type or "audio/webm"
-        
-        # Transcribe using Groq Whisper with voice-specific API key
-        print("🎤 Starting Groq Whisper transcription...")
-        client = get_groq_client(use_voice_key=True)
-        
-        # Common hallucinated phrases that Whisper produces with unclear audio
-        HALLUCINATION_PHRASES = [
-            "thank you", "thanks for watching", "thank you for watching",
-            "bye", "goodbye", "see you", "please subscribe",
-            "thanks", "thank you so much", "like and subscribe",
-            ".", "..", "..."  # Just punctuation
-        ]
-        
-        transcript = None
-        best_transcript = None
-        
-        # Try multiple strategies to get accurate transcription
-        strategies = [
-            # Strategy 1: Turbo model with no hallucination suppression
-            {
-                "model": "whisper-large-v3-turbo",
-                "temperature": 0.0,
-                "language": "en",
-                "prompt": "Report: "  # Short prompt to anchor context
-            },
-            # Strategy 2: Standard model with higher temperature
-            {
-                "model": "whisper-large-v3",
-                "temperature": 0.4,
-                "language": "en",
-            },
-            # Strategy 3: Turbo model with no language constraint
-            {
-                "model": "whisper-large-v3-turbo",
-                "temperature": 0.0,
-            }
-        ]
-        
-        for idx, strategy in enumerate(strategies):
+            print("⚠️  numpy not available, using original file")
+            prepare_for_asr = None
+        if prepare_for_asr is not None:
             try:
-                print(f"🔄 Attempt {idx + 1}: Using {strategy.get('model', 'default')} model...")
-                
-                with open(transcription_file, "rb") as audio_file:
-                    transcription = client.audio.transcriptions.create(
-                        file=(os.path.basename(transcription_file), audio_file, transcription_content_type),
-                        model=strategy["model"],
-                        response_format="verbose_json",
-                        **{k: v for k, v in strategy.items() if k != "model"}
-                    )
-                
-                # Extract text
-                if hasattr(transcription, 'text'):
-                    current_transcript = transcription.text.strip()
-                else:
-                    current_transcript = str(transcription).strip()
-                
-                # Log this attempt
-                print(f"   Result {idx + 1}: '{current_transcript}'")
-                
-                # Check if this is a hallucination
-                is_hallucination = any(
-                    current_transcript.lower().strip() == phrase.lower().strip() 
-                    for phrase in HALLUCINATION_PHRASES
-                )
-                
-                if not is_hallucination and len(current_transcript) > 3:
-                    # Found a good transcription!
-                    transcript = current_transcript
-                    print(f"✅ Valid transcription found on attempt {idx + 1}")
-                    break
-                else:
-                    # Keep this as backup but continue trying
-                    if best_transcript is None or len(current_transcript) > len(best_transcript):
-                        best_transcript = current_transcript
-                    print(f"   ⚠️  Possible hallucination detected, trying next strategy...")
-                    
-            except Exception as e:
-                print(f"   ❌ Attempt {idx + 1} failed: {e}")
-                continue
+                print("🔄 Converting audio to WAV format for optimal transcription...")
+                chunks, info = await run_in_process(prepare_for_asr, audio_data, ASR_CHUNK_SECONDS)
+                transcription_bytes = chunks[0][1]
+                transcription_name = "audio.wav"
+                transcription_content_type = "audio/wav"
+                print(f"   Trimmed silence: {info['trimmed_start_ms']}ms from start, {info['trimmed_end_ms']}ms from end")
+                print(f"   Final audio duration: {info['duration_ms']/1000:.2f}s")
+                if len(chunks) > 1:
+                    print(f"   Long recording: split on silence into {len(chunks)} chunks")
+                # Same recording in a different container/encoding
+                pcm_key = cache_key("pcm", info["pcm_sha256"], TRANSCRIPT_CACHE_VERSION)
+                cached = await cached_transcript(pcm_key)
+                if cached:
+                    print(f"⚡ Transcript cache hit ({pcm_key[:32]})")
+                    await store_transcript([raw_key], cached)
+                    return JSONResponse(content={"success": True, **transcript_response(cached), "cached": True})
+            except SilentAudioError as e:
+                # Nothing to transcribe: don't spend Groq calls on it
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as conv_error:
+                print(f"⚠️  Audio conversion failed: {conv_error}, using original file")
         
-        # If all strategies failed or returned hallucinations, use the best one we got
-        if transcript is None:
-            transcript = best_transcript if best_transcript else "Unable to transcribe audio clearly. Please try again."
-            print(f"⚠️  All attempts showed hallucinations. Using best result: '{transcript}'")
+        # Transcribe using Groq Whisper with voice-specific API key; fallback
+        # strategies are hedged concurrently (see asr.py)
+        print("🎤 Starting Groq Whisper transcription...")
+        client = get_async_groq_client(use_voice_key=True)
+        if chunks and len(chunks) > 1:
+            result = await transcriber.transcribe_chunks(client, chunks, transcription_content_type, ASR_CHUNK_CONCURRENCY)
+        else:
+            result = await transcriber.transcribe(client, transcription_name, transcription_bytes, transcription_content_type)
         
-        # Extract text and metadata from verbose response
-        if hasattr(transcription, 'text'):
-            transcript = transcription.text.strip()
+        if result is None:
+            transcript = "Unable to transcribe audio clearly. Please try again."
+            result = {"language": None, "duration": None, "segments": []}
+            print("⚠️  All transcription attempts failed")
         else:
-            transcript = str(transcription).strip()
+            transcript = result["text"]
+            if result.get("suspect"):
+                print(f"⚠️  All attempts showed hallucinations. Using best result: '{transcript}'")
         
-        # Log detailed information if available
-        detected_language = getattr(transcription, 'language', 'unknown')
-        duration = getattr(transcription, 'duration', 'unknown')
+        detected_language = result.get("language") or "unknown"
+        duration = result.get("duration") or "unknown"
         
         print(f"✅ Transcription received:")
         print(f"   Language detected: {detected_language}")
@@ -561,40 +862,27 @@ async def transcribe_audio(file: UploadFile = File(...)):
         print(f"   Full transcript: '{transcript}'")
         
         # Log segments if available for debugging
-        if hasattr(transcription, 'segments') and transcription.segments:
-            print(f"   Segments: {len(transcription.segments)}")
-            for i, seg in enumerate(transcription.segments[:3]):  # Show first 3 segments
-                seg_text = getattr(seg, 'text', '')
-                print(f"     Segment {i+1}: '{seg_text}'")
-        
-        # Normalize spoken symbols if enabled
-        if ENABLE_SYMBOL_NORMALIZATION:
-            transcript = normalize_spoken_symbols(transcript)
+        if result["segments"]:
+            print(f"   Segments: {len(result['segments'])}")
+            for i, seg in enumerate(result["segments"][:3]):  # Show first 3 segments
+                print(f"     Segment {i+1}: '{seg['text']}'")
         
-        # Clean up temp files
-        try:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
-            if converted_path and os.path.exists(converted_path):
-                os.remove(converted_path)
-        except:
-            pass
+        response = {
+            "transcript": transcript,
+            "language": result.get("language"),
+            "duration": result.get("duration"),
+            "segments": result["segments"],
+        }
+        # Failed or hallucinated results are not cached so a retry gets a fresh attempt
+        if result.get("text") and not result.get("suspect"):
+            await store_transcript([raw_key, pcm_key], response)
         
-        return JSONResponse(content={
-            "success": True,
-            "transcript": transcript
-        })
+        # Normalize spoken symbols if enabled
+        return JSONResponse(content={"success": True, **transcript_response(response), "cached": False})
         
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up temp files on error
-        try:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
-            if converted_path and os.path.exists(converted_path):
-                os.remove(converted_path)
-        except:
-            pass
-        
         # Log the detailed error
         import traceback
         error_detail = traceback.format_exc()
@@ -624,20 +912,13 @@ async def register_user(user: User):
     
     # Hash password
     user_dict = user.model_dump(exclude={"id"})
-    user_dict["password"] = hash_password(user_dict["password"])
-    user_dict["created_at"] = datetime.now()
+    user_dict["password"] = await hash_password(user_dict["password"])
+    user_dict["created_at"] = datetime.utcnow()
     user_dict["is_active"] = True
     
     result = await users_collection.insert_one(user_dict)
     inserted_id = result.inserted_id
-    # Mirror into role-specific collection
-    try:
-        role_coll = get_user_role_collection(user_dict.get("role"))
-        # ensure same _id for cross-updates
-        role_doc = {**user_dict, "_id": inserted_id}
-        await role_coll.insert_one(role_doc)
-    except Exception:
-        pass
+    mirror_projector.notify("users", inserted_id)
     user_dict["_id"] = str(inserted_id)
     
     return {
@@ -660,24 +941,17 @@ async def login_user(credentials: dict):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Check password (with migration fallback from legacy plaintext)
-    stored_pw = user.get("password", "")
-    valid = False
-    try:
-        valid = verify_password(password, stored_pw)
-    except Exception:
-        valid = False
+    # Check password; legacy plaintext and outdated hash parameters are rehashed
+    valid, new_hash = await verify_and_upgrade(password, user.get("password", ""))
     if not valid:
-        # Legacy support: plaintext match then upgrade to hash
-        if stored_pw and stored_pw == password:
-            try:
-                await users_collection.update_one(
-                    {"_id": user["_id"]}, {"$set": {"password": hash_password(password)}}
-                )
-            except Exception:
-                pass
-        else:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        try:
+            await users_collection.update_one(
+                {"_id": user["_id"], "password": user.get("password")}, {"$set": {"password": new_hash}}
+            )
+        except Exception:
+            pass
     
     if not user.get("is_active", True):
         raise HTTPException(status_code=403, detail="Account is inactive")
@@ -691,16 +965,50 @@ async def login_user(credentials: dict):
     if isinstance(user.get("updated_at"), datetime):
         user["updated_at"] = user["updated_at"].isoformat()
     
-    # Generate JWT token
-    token = create_access_token({"sub": user["_id"]})
-    
+    # Generate JWT tokens (short-lived access token + refresh token)
     return {
         "message": "Login successful",
-        "token": token,
+        **issue_tokens(user),
         "user": user
     }
 
 
+@app.post("/api/auth/refresh")
+async def refresh_token(payload: dict):
+    """Exchange a refresh token for a new access/refresh pair (the old refresh token is revoked)."""
+    claims = decode_token(str(payload.get("refresh_token") or ""), REFRESH)
+    try:
+        user = await users_collection.find_one(
+            {"_id": ObjectId(claims["sub"])},
+            {"role": 1, "gram_panchayat": 1, "name": 1, "is_active": 1},
+        )
+    except Exception:
+        user = None
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    if not user.get("is_active", True):
+        raise HTTPException(status_code=403, detail="Account is inactive")
+    await revocation_cache.revoke(claims["jti"], claims["sub"], datetime.utcfromtimestamp(claims["exp"]))
+    return issue_tokens(user)
+
+
+@app.post("/api/auth/logout")
+async def logout(payload: Optional[dict] = None, user = Depends(get_current_user)):
+    """Revoke the presented access token and, if given, the refresh token."""
+    user_id = str(user["_id"])
+    if user.get("jti"):
+        await revocation_cache.revoke(user["jti"], user_id, datetime.utcfromtimestamp(user["exp"]))
+    refresh = (payload or {}).get("refresh_token")
+    if refresh:
+        try:
+            claims = jwt.decode(refresh, JWT_SECRET, algorithms=[ALGORITHM])
+        except JWTError:
+            claims = {}
+        if claims.get("typ") == REFRESH and claims.get("sub") == user_id and claims.get("jti"):
+            await revocation_cache.revoke(claims["jti"], user_id, datetime.utcfromtimestamp(claims["exp"]))
+    return {"message": "Logged out"}
+
+
 ## Firebase phone auth removed: no longer verifying Firebase tokens.
 
 
@@ -727,10 +1035,8 @@ async def update_profile(user_id: str, updates: dict):
         updates.pop("password", None)
         updates.pop("role", None)
         updates.pop("email", None)
-        updates["updated_at"] = datetime.now()
+        updates["updated_at"] = datetime.utcnow()
         
-        # Fetch user to determine role branch
-        existing_user = await users_collection.find_one({"_id": ObjectId(user_id)})
         result = await users_collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": updates}
@@ -738,15 +1044,7 @@ async def update_profile(user_id: str, updates: dict):
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
-        
-        # Mirror update to role-specific collection
-        try:
-            if existing_user:
-                role = existing_user.get("role")
-                role_coll = get_user_role_collection(role)
-                await role_coll.update_one({"_id": ObjectId(user_id)}, {"$set": updates})
-        except Exception:
-            pass
+        mirror_projector.notify("users", ObjectId(user_id))
         return {"message": "Profile updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error updating profile: {str(e)}")
@@ -761,7 +1059,7 @@ async def get_categories():
 # ---- Telegram Integration Routes ----
 
 @app.get("/api/telegram/link")
-async def get_telegram_link(current_user = Depends(get_current_user)):
+async def get_telegram_link(current_user = Depends(get_current_user_doc)):
     """Get Telegram bot deep link for user to connect"""
     user_id = str(current_user["_id"])
     telegram_link = get_telegram_bot_link(user_id)
@@ -814,7 +1112,7 @@ async def telegram_webhook(update: dict):
                         {"_id": ObjectId(user_id)},
                         {"$set": {
                             "telegram_chat_id": chat_id,
-                            "telegram_connected_at": datetime.now()
+                            "telegram_connected_at": datetime.utcnow()
                         }}
                     )
                     
@@ -902,7 +1200,7 @@ async def disconnect_telegram(current_user = Depends(get_current_user)):
 
 
 @app.get("/api/telegram/status")
-async def get_telegram_status(current_user = Depends(get_current_user)):
+async def get_telegram_status(current_user = Depends(get_current_user_doc)):
     """Check if user has Telegram connected"""
     is_connected = bool(current_user.get("telegram_chat_id"))
     connected_at = current_user.get("telegram_connected_at")
@@ -931,13 +1229,7 @@ async def create_issue(
     """Create a new issue report"""
     
     # Handle image uploads
-    image_paths = []
-    if images:
-        for img in images:
-            if img.filename:
-                content = await img.read()
-                stored_path = store_file(content, img.filename, img.content_type)
-                image_paths.append(stored_path)
+    image_paths = await store_images(images)
 
     issue = {
         "category": category,
@@ -953,25 +1245,20 @@ async def create_issue(
         "reporter_phone": reporter_phone,
         "status": "Received",
         "priority_votes": 0,
-        "voters": [],
         "assigned_to": None,
         "gram_panchayat": gram_panchayat,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
-        "resolved_at": None
+        "resolved_at": None,
+        "version": 0
     }
 
     result = await issues_collection.insert_one(issue)
     issue["_id"] = result.inserted_id
-    # Ensure progress_images array exists
-    if not issue.get("progress_images"):
-        issue["progress_images"] = []
-    # Mirror into category-specific collection
-    try:
-        cat_coll = get_issue_category_collection(category)
-        await cat_coll.insert_one(issue)
-    except Exception:
-        pass
+    await update_rollups(record_created, issue)
+    mirror_projector.notify("issues", result.inserted_id)
+    if image_paths:
+        background_tasks.add_task(process_issue_images, result.inserted_id, "image_variants", image_paths)
     # Notifications removed (n8n, Firebase, SMS all removed per user direction)
     
     # SMS notifications disabled per user request
@@ -987,19 +1274,14 @@ async def create_issue(
     # Telegram notification - FREE alternative to SMS
     # Find user by phone and send notification if Telegram connected
     try:
-        user = await users_collection.find_one({"phone": reporter_phone})
-        if user and user.get("telegram_chat_id"):
-            issue_data = {
-                "issue_id": str(result.inserted_id),
-                "category": category,
-                "description": description,
-                "gram_panchayat": gram_panchayat
-            }
-            background_tasks.add_task(
-                notify_issue_created,
-                user.get("telegram_chat_id"),
-                issue_data
-            )
+        issue_data = {
+            "issue_id": str(result.inserted_id),
+            "category": category,
+            "description": description,
+            "gram_panchayat": gram_panchayat
+        }
+        for chat_id in await chat_ids_for_phones(users_collection, [reporter_phone]):
+            background_tasks.add_task(notify_issue_created, chat_id, issue_data)
     except Exception as e:
         print(f"Failed to send Telegram notification: {e}")
     
@@ -1010,15 +1292,22 @@ async def create_issue(
     }
 
 
-@app.get("/api/issues")
-async def get_issues(
+def parse_date_param(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except Exception:
+        return None
+
+def build_issue_query(
     gram_panchayat: Optional[str] = None,
     category: Optional[str] = None,
     status: Optional[str] = None,
-    limit: int = 100
-):
-    """Get all issues with optional filters"""
-    
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> dict:
+    """Mongo filter for the common issue list / export / analytics query parameters."""
     query = {}
     if gram_panchayat:
         query["gram_panchayat"] = gram_panchayat
@@ -1026,46 +1315,150 @@ async def get_issues(
         query["category"] = category
     if status:
         query["status"] = status
+    dt_start = parse_date_param(start_date)
+    dt_end = parse_date_param(end_date)
+    if dt_start or dt_end:
+        query["created_at"] = {}
+        if dt_start:
+            query["created_at"]["$gte"] = dt_start
+        if dt_end:
+            query["created_at"]["$lte"] = dt_end
+    return query
 
-    cursor = issues_collection.find(query).sort("created_at", -1).limit(limit)
-    issues = []
-    
-    async for issue in cursor:
-        issue["_id"] = str(issue["_id"])
-        # ensure datetime serialization
-        if isinstance(issue.get("created_at"), datetime):
-            issue["created_at"] = issue["created_at"].isoformat()
-        if isinstance(issue.get("updated_at"), datetime):
-            issue["updated_at"] = issue["updated_at"].isoformat()
-        if issue.get("resolved_at"):
-            if isinstance(issue.get("resolved_at"), datetime):
-                issue["resolved_at"] = issue["resolved_at"].isoformat()
-        issues.append(issue)
-    
-    return {"issues": issues, "count": len(issues)}
+def serialize_issue(issue: dict) -> dict:
+    issue["_id"] = str(issue["_id"])
+    for field in ("created_at", "updated_at", "resolved_at"):
+        if isinstance(issue.get(field), datetime):
+            issue[field] = issue[field].isoformat()
+    return issue
+
+def encode_issue_cursor(issue: dict) -> str:
+    """Opaque keyset cursor for the (created_at, _id) position of ``issue``.
+
+    Legacy or imported issues may hold ``created_at`` as a string, or not at
+    all. Mongo sorts those after every date (strings first, then missing or
+    null), so the cursor records which of the three groups it points into.
+    """
+    created_at = issue.get("created_at")
+    payload = {"id": str(issue["_id"])}
+    if isinstance(created_at, datetime):
+        payload["t"] = created_at.isoformat()
+    elif isinstance(created_at, str):
+        payload["s"] = created_at
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_issue_cursor(cursor: str) -> dict:
+    """Mongo filter selecting issues strictly after the cursor in (created_at desc, _id desc) order."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        oid = ObjectId(payload["id"])
+        created_at = datetime.fromisoformat(payload["t"]) if "t" in payload else payload.get("s")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    undated = {"$nor": [{"created_at": {"$type": "date"}}, {"created_at": {"$type": "string"}}]}
+    if "t" in payload:
+        return {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+            {"created_at": {"$not": {"$type": "date"}}},
+        ]}
+    if isinstance(created_at, str):
+        return {"$or": [
+            {"created_at": {"$type": "string", "$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+            undated,
+        ]}
+    # No usable created_at: the rest of the undated group, by _id alone
+    return {**undated, "_id": {"$lt": oid}}
+
+ISSUE_PAGE_MAX = 500
+
+# Fields a client may ask for with ?fields=; voters (phone numbers) is never exposed
+ISSUE_FIELDS = {
+    "category", "description", "voice_description", "location", "images", "image_variants",
+    "progress_images", "progress_image_variants", "reporter_name", "reporter_phone", "status",
+    "priority_votes", "assigned_to", "assigned_department", "gram_panchayat",
+    "created_at", "updated_at", "resolved_at", "version",
+}
+# Compact card view for list and map pages, computed inside Mongo
+ISSUE_SUMMARY_PROJECTION = {
+    "category": 1,
+    "status": 1,
+    "priority_votes": 1,
+    "gram_panchayat": 1,
+    "location": 1,
+    "created_at": 1,
+    "description": {"$substrCP": [{"$ifNull": ["$description", ""]}, 0, 140]},
+    "thumb": {"$arrayElemAt": [{"$ifNull": ["$image_variants.thumb", []]}, 0]},
+    "image_count": {"$size": {"$ifNull": ["$images", []]}},
+}
+
+def build_issue_projection(fields: Optional[str]) -> dict:
+    """Mongo projection for ``?fields=``: "summary", or a comma-separated list of ISSUE_FIELDS.
+
+    Without ``fields`` the full document is returned minus the voters array.
+    """
+    if not fields:
+        return {"voters": 0}
+    if fields.strip().lower() == "summary":
+        return dict(ISSUE_SUMMARY_PROJECTION)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = {f for f in requested if f.split(".", 1)[0] not in ISSUE_FIELDS}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    # Drop sub-fields already covered by their parent to avoid a Mongo path collision
+    projection = {f: 1 for f in requested if f.split(".", 1)[0] not in requested or "." not in f}
+    # created_at is needed to build the pagination cursor
+    projection["created_at"] = 1
+    return projection
+
+@app.get("/api/issues")
+async def get_issues(
+    gram_panchayat: Optional[str] = None,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 100,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """Get issues, newest first, with optional filters and date range.
+
+    Paginate by passing the returned ``next_cursor`` back as ``cursor``; it is
+    null on the last page. Each page is an index range scan on
+    (created_at, _id), so deep pages cost the same as the first.
+    ``fields=summary`` (or a comma-separated field list) trims each document
+    inside Mongo before it is sent.
+    """
+    limit = max(1, min(limit, ISSUE_PAGE_MAX))
+    query = build_issue_query(gram_panchayat, category, status, start_date, end_date)
+    if cursor:
+        query = {"$and": [query, decode_issue_cursor(cursor)]} if query else decode_issue_cursor(cursor)
+
+    # Fetch one extra document to learn whether another page exists
+    projection = build_issue_projection(fields)
+    docs = await issues_collection.find(query, projection).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_issue_cursor(docs[limit - 1]) if len(docs) > limit else None
+    issues = [serialize_issue(issue) for issue in docs[:limit]]
+
+    return {"issues": issues, "count": len(issues), "next_cursor": next_cursor}
 
 
 @app.get("/api/issues/{issue_id}")
-async def get_issue(issue_id: str):
-    """Get a specific issue by ID"""
+async def get_issue(issue_id: str, fields: Optional[str] = None):
+    """Get a specific issue by ID, optionally trimmed with ``fields`` (see get_issues)"""
     
     if not ObjectId.is_valid(issue_id):
         raise HTTPException(status_code=400, detail="Invalid issue ID")
     
-    issue = await issues_collection.find_one({"_id": ObjectId(issue_id)})
+    issue = await issues_collection.find_one({"_id": ObjectId(issue_id)}, build_issue_projection(fields))
     
     if not issue:
         raise HTTPException(status_code=404, detail="Issue not found")
     
-    issue["_id"] = str(issue["_id"])
-    if isinstance(issue.get("created_at"), datetime):
-        issue["created_at"] = issue["created_at"].isoformat()
-    if isinstance(issue.get("updated_at"), datetime):
-        issue["updated_at"] = issue["updated_at"].isoformat()
-    if issue.get("resolved_at") and isinstance(issue.get("resolved_at"), datetime):
-        issue["resolved_at"] = issue["resolved_at"].isoformat()
-    
-    return issue
+    return serialize_issue(issue)
 
 
 @app.put("/api/issues/{issue_id}/status")
@@ -1077,125 +1470,81 @@ async def update_issue_status(
     updated_by: str = Form(...),
     assigned_department: Optional[str] = Form(None),
     progress_images: List[UploadFile] = File(None),
+    expected_version: Optional[int] = Form(None),
     user = Depends(require_role(["admin", "officer", "panchayat"]))
 ):
-    """Update issue status (for officers/admin)"""
+    """Update issue status (for officers/admin).
+
+    Pass ``expected_version`` (the issue's ``version`` as last read) to reject
+    the update with 409 if someone else changed the issue in the meantime.
+    """
     
     if not ObjectId.is_valid(issue_id):
         raise HTTPException(status_code=400, detail="Invalid issue ID")
     
-    valid_statuses = ["Received", "In Progress", "Resolved"]
-    if status not in valid_statuses:
-        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
+    if status not in ISSUE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {ISSUE_STATUSES}")
     
-    update_data = {
-        "status": status,
-        "updated_at": datetime.utcnow()
-    }
-    
-    if status == "Resolved":
-        update_data["resolved_at"] = datetime.utcnow()
-    
-    # Handle optional assigned_department
-    if assigned_department:
-        update_data["assigned_department"] = assigned_department
-    # Handle optional progress images
-    new_progress_paths = []
-    if progress_images:
-        for img in progress_images:
-            if img and img.filename:
-                content = await img.read()
-                stored = store_file(content, img.filename, img.content_type)
-                new_progress_paths.append(stored)
-    if new_progress_paths:
-        # Append to array
-        await issues_collection.update_one(
-            {"_id": ObjectId(issue_id)},
-            {"$push": {"progress_images": {"$each": new_progress_paths}}},
+    now = datetime.utcnow()
+    new_progress_paths = await store_images(progress_images)
+    # Status, department, progress images and version bump in one atomic write
+    try:
+        previous = await apply_transition(
+            issues_collection,
+            ObjectId(issue_id),
+            status,
+            transition_update(status, now, assigned_department, new_progress_paths),
+            expected_version,
         )
-
-    result = await issues_collection.update_one(
-        {"_id": ObjectId(issue_id)},
-        {"$set": update_data}
-    )
+    except HTTPException:
+        await release_files(new_progress_paths)
+        raise
+    if new_progress_paths:
+        background_tasks.add_task(process_issue_images, issue_id, "progress_image_variants", new_progress_paths)
+    mirror_projector.notify("issues", previous["_id"])
     
     # Log status update
     status_log = {
         "issue_id": issue_id,
         "status": status,
+        "previous_status": previous.get("status"),
         "remarks": remarks,
         "updated_by": updated_by,
-        "updated_at": datetime.utcnow(),
+        "updated_at": now,
         "assigned_department": assigned_department,
         "progress_images": new_progress_paths,
     }
-    await status_updates_collection.insert_one(status_log)
-    # Mirror update to category-specific collection
-    try:
-        if 'updated_issue' in locals() and updated_issue:
-            cat_coll = get_issue_category_collection(updated_issue.get("category"))
-            await cat_coll.update_one({"_id": ObjectId(issue_id)}, {"$set": update_data})
-    except Exception:
-        pass
-    # Load issue for notifications
-    updated_issue = await issues_collection.find_one({"_id": ObjectId(issue_id)})
-    if updated_issue:
-        # Notifications removed (n8n, Firebase, SMS all removed per user direction)
-        pass
-    
+    await asyncio.gather(
+        status_updates_collection.insert_one(status_log),
+        update_rollups(record_status_change, previous, status),
+    )
     # SMS notifications disabled per user request
     # try:
-    #     if ENABLE_TWILIO_SMS and updated_issue and updated_issue.get("reporter_phone"):
+    #     if ENABLE_TWILIO_SMS and previous.get("reporter_phone"):
     #         send_sms(
-    #             to=updated_issue.get("reporter_phone"),
+    #             to=previous.get("reporter_phone"),
     #             body=f"GramaFix update: Your issue status is now '{status}'."
     #         )
     # except Exception:
     #     pass
     
     # Telegram notification - FREE alternative to SMS
-    # Find user by phone and send status update notification
-    if updated_issue:
-        try:
-            reporter_phone = updated_issue.get("reporter_phone")
-            user = await users_collection.find_one({"phone": reporter_phone})
-            if user and user.get("telegram_chat_id"):
-                # Get old status from the issue before it was updated (for comparison)
-                # Since we already updated, we'll infer from status_updates or just show new status
-                issue_data = {
-                    "issue_id": str(updated_issue["_id"]),
-                    "category": updated_issue.get("category"),
-                    "description": updated_issue.get("description", "")[:100],
-                    "gram_panchayat": updated_issue.get("gram_panchayat")
-                }
-                
-                # Try to get old status from status_updates or default to "Received"
-                old_status = "Received"
-                try:
-                    last_update = await status_updates_collection.find_one(
-                        {"issue_id": issue_id},
-                        sort=[("updated_at", -1)],
-                        skip=1  # Skip the current update
-                    )
-                    if last_update:
-                        old_status = last_update.get("status", "Received")
-                except:
-                    pass
-                
-                background_tasks.add_task(
-                    notify_status_update,
-                    user.get("telegram_chat_id"),
-                    issue_data,
-                    status,
-                    old_status
-                )
-        except Exception as e:
-            print(f"Failed to send Telegram notification: {e}")
+    # One aggregation resolves the reporter and every voter with a linked Telegram chat
+    try:
+        audience = await issue_audience(issues_collection, previous["_id"])
+        if audience:
+            batch = status_change_batch(audience, status, previous.get("status") or "Received")
+            if batch:
+                background_tasks.add_task(send_telegram_batch, batch)
+    except Exception as e:
+        print(f"Failed to send Telegram notification: {e}")
     
     return {
         "message": "Status updated successfully",
         "issue_id": issue_id,
-        "new_status": status
+        "new_status": status,
+        "previous_status": previous.get("status"),
+        "version": previous.get("version", 0) + 1,
     }
 
 
@@ -1207,26 +1556,12 @@ async def request_otp(payload: dict):
     phone = payload.get("phone")
     if not phone:
         raise HTTPException(status_code=400, detail="phone is required")
-    # generate 6-digit code
-    code = "".join(secrets.choice(string.digits) for _ in range(6))
-    hashed = pwd_context.hash(code)
-    now = datetime.utcnow()
-    expires_at = now + timedelta(minutes=5)
-    doc = {
-        "phone": phone,
-        "code": hashed,
-        "created_at": now,
-        "expires_at": expires_at,
-        "attempts": 0,
-    }
-    await otp_codes_collection.update_one(
-        {"phone": phone},
-        {"$set": doc},
-        upsert=True,
-    )
+    code = await otp_engine.issue(phone)
     # send SMS if enabled
     if ENABLE_TWILIO_OTP:
-        send_sms(to=phone, body=f"Your GramaFix OTP is {code}. It expires in 5 minutes.")
+        await asyncio.to_thread(
+            send_sms, phone, f"Your GramaFix OTP is {code}. It expires in {OTP_TTL_SECONDS // 60} minutes."
+        )
     resp = {"success": True, "message": "OTP sent if SMS is enabled"}
     if DEBUG_OTP and not ENABLE_TWILIO_OTP:
         resp["debug_code"] = code
@@ -1242,44 +1577,31 @@ async def verify_otp(payload: dict):
     gram_panchayat = payload.get("gram_panchayat")
     if not phone or not code:
         raise HTTPException(status_code=400, detail="phone and code are required")
-    rec = await otp_codes_collection.find_one({"phone": phone})
-    if not rec:
-        raise HTTPException(status_code=400, detail="OTP not requested or expired")
-    # basic attempt limit
-    attempts = rec.get("attempts", 0)
-    if attempts >= 5:
-        raise HTTPException(status_code=429, detail="Too many attempts. Request a new OTP.")
-    await otp_codes_collection.update_one({"_id": rec["_id"]}, {"$inc": {"attempts": 1}})
-    try:
-        valid = verify_password(code, rec.get("code", ""))
-    except Exception:
-        valid = False
-    if not valid:
+    if not await otp_engine.verify(phone, code):
         raise HTTPException(status_code=401, detail="Invalid code")
-    # success - optionally delete the record now
+    # fetch or create user by phone in one round trip; BEFORE is None when we inserted
+    new_user = {
+        "_id": ObjectId(),
+        "name": name,
+        "phone": phone,
+        "role": "citizen",
+        "gram_panchayat": gram_panchayat,
+        "created_at": datetime.utcnow(),
+        "is_active": True,
+    }
     try:
-        await otp_codes_collection.delete_one({"_id": rec["_id"]})
-    except Exception:
-        pass
-    # fetch or create user by phone
-    user = await users_collection.find_one({"phone": phone})
-    if not user:
-        user = {
-            "name": name,
-            "phone": phone,
-            "role": "citizen",
-            "gram_panchayat": gram_panchayat,
-            "created_at": datetime.utcnow(),
-            "is_active": True,
-        }
-        result = await users_collection.insert_one(user)
-        user["_id"] = result.inserted_id
-        # mirror to role branch
-        try:
-            role_coll = get_user_role_collection("citizen")
-            await role_coll.insert_one({**user})
-        except Exception:
-            pass
+        user = await users_collection.find_one_and_update(
+            {"phone": phone},
+            {"$setOnInsert": new_user},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+    except DuplicateKeyError:
+        # concurrent first login for the same phone
+        user = await users_collection.find_one({"phone": phone})
+    if user is None:
+        user = new_user
+        mirror_projector.notify("users", user["_id"])
     # sanitize and issue token
     user_out = dict(user)
     uid = user_out.pop("_id", None)
@@ -1287,14 +1609,13 @@ async def verify_otp(payload: dict):
     user_out.pop("password", None)
     if isinstance(user_out.get("created_at"), datetime):
         user_out["created_at"] = user_out["created_at"].isoformat()
-    token = create_access_token({"sub": user_out["_id"]})
-    return {"message": "OTP verified", "token": token, "user": user_out}
+    return {"message": "OTP verified", **issue_tokens(user), "user": user_out}
 
 
 # ---- TOTP Authentication (App-based OTP like Google Authenticator) ----
 
 @app.post("/api/auth/totp/setup/start")
-async def totp_setup_start(user=Depends(get_current_user)):
+async def totp_setup_start(user=Depends(get_current_user_doc)):
     """Begin TOTP setup for the current user. Returns otpauth URI and QR as data URL."""
     try:
         import pyotp
@@ -1408,63 +1729,134 @@ async def totp_verify(payload: dict):
     user_out.pop("password", None)
     if isinstance(user_out.get("created_at"), datetime):
         user_out["created_at"] = user_out["created_at"].isoformat()
-    token = create_access_token({"sub": user_out["_id"]})
-    return {"message": "TOTP verified", "token": token, "user": user_out}
+    return {"message": "TOTP verified", **issue_tokens(user), "user": user_out}
 
 
 # ---- CSV Export ----
 
-@app.get("/api/admin/export/issues.csv")
-async def export_issues_csv(gram_panchayat: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, user = Depends(require_role(["admin", "officer", "panchayat"]))):
-    """Export issues as CSV. Optionally filtered by gram_panchayat."""
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_FOLDER = os.getenv("EXPORT_FOLDER", "exports")  # outside the public /uploads tree
+EXPORT_RETENTION_HOURS = float(os.getenv("EXPORT_RETENTION_HOURS", "48"))
+os.makedirs(EXPORT_FOLDER, exist_ok=True)
+EXPORT_CLEANUP_INTERVAL_SECONDS = float(os.getenv("EXPORT_CLEANUP_INTERVAL_SECONDS", "600"))
+export_jobs_collection = db["export_jobs"]
+_export_tasks = set()
+_export_maintenance_task = None
+
+def export_cursor(query: dict):
+    return issues_collection.find(query, EXPORT_PROJECTION, batch_size=EXPORT_BATCH_SIZE).sort([("created_at", -1), ("_id", -1)])
+
+async def stream_issues_csv(request: Request, query: dict):
+    """Yield the export as ~64 KB CSV chunks while the cursor advances.
+
+    Memory stays flat regardless of export size. When the client goes away
+    the generator stops (Starlette cancels it, and we also poll between
+    chunks) and the server-side cursor is closed.
+    """
     import csv
     from io import StringIO
-    query = {}
-    if gram_panchayat:
-        query["gram_panchayat"] = gram_panchayat
-    # Date filters
-    def parse_dt(s):
-        try:
-            return datetime.fromisoformat(s)
-        except Exception:
-            return None
-    dt_start = parse_dt(start_date) if start_date else None
-    dt_end = parse_dt(end_date) if end_date else None
-    if dt_start or dt_end:
-        query["created_at"] = {}
-        if dt_start:
-            query["created_at"]["$gte"] = dt_start
-        if dt_end:
-            query["created_at"]["$lte"] = dt_end
-    cursor = issues_collection.find(query).sort("created_at", -1)
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "id",
-        "category",
-        "description",
-        "gram_panchayat",
-        "status",
-        "priority_votes",
-        "created_at",
-        "resolved_at",
-    ])
-    async for doc in cursor:
-        writer.writerow([
-            str(doc.get("_id")),
-            doc.get("category", ""),
-            (doc.get("description", "") or "").replace("\n", " ").strip(),
-            doc.get("gram_panchayat", ""),
-            doc.get("status", ""),
-            doc.get("priority_votes", 0),
-            doc.get("created_at").isoformat() if isinstance(doc.get("created_at"), datetime) else doc.get("created_at"),
-            doc.get("resolved_at").isoformat() if isinstance(doc.get("resolved_at"), datetime) else (doc.get("resolved_at") or ""),
-        ])
-    output.seek(0)
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    cursor = export_cursor(query)
+    try:
+        async for doc in cursor:
+            writer.writerow(issue_export_row(doc))
+            if buf.tell() >= EXPORT_CHUNK_BYTES:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+                if await request.is_disconnected():
+                    return
+        if buf.tell():
+            yield buf.getvalue()
+    finally:
+        await cursor.close()
+
+@app.get("/api/admin/export/issues.csv")
+async def export_issues_csv(request: Request, gram_panchayat: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, user = Depends(require_role(["admin", "officer", "panchayat"]))):
+    """Export issues as CSV. Optionally filtered by gram_panchayat."""
+    query = build_issue_query(gram_panchayat=gram_panchayat, start_date=start_date, end_date=end_date)
     headers = {
         "Content-Disposition": "attachment; filename=issues.csv"
     }
-    return StreamingResponse(iter([output.getvalue()]), media_type="text/csv", headers=headers)
+    return StreamingResponse(stream_issues_csv(request, query), media_type="text/csv", headers=headers)
+
+
+# ---- Background Export Jobs ----
+
+def serialize_export_job(job: dict) -> dict:
+    out = {k: v for k, v in job.items() if k not in ("_id", "path", "owner", "heartbeat_at")}
+    out["job_id"] = str(job["_id"])
+    for field in ("created_at", "started_at", "finished_at"):
+        if isinstance(out.get(field), datetime):
+            out[field] = out[field].isoformat()
+    if job.get("status") == "done":
+        out["download_url"] = f"/api/admin/exports/{out['job_id']}/download"
+    return out
+
+@app.post("/api/admin/exports", status_code=202)
+async def create_export_job(payload: dict, user = Depends(require_role(["admin", "officer", "panchayat"]))):
+    """Start a background export (format: parquet | ndjson | csv) with the same filters as the CSV export."""
+    fmt = (payload.get("format") or "csv").lower()
+    check_format(fmt)
+    filters = {k: payload.get(k) for k in ("gram_panchayat", "start_date", "end_date") if payload.get(k)}
+    query = build_issue_query(**filters)
+    job_id = ObjectId()
+    path = export_path(EXPORT_FOLDER, str(job_id), fmt)
+    total = await issues_collection.count_documents(query)
+    job = {
+        "_id": job_id,
+        "format": fmt,
+        "filters": filters,
+        "status": "queued",
+        "processed": 0,
+        "total": total,
+        "path": path,
+        "created_by": str(user["_id"]),
+        "created_at": datetime.utcnow(),
+        "owner": job_owner(),
+        "heartbeat_at": datetime.utcnow(),
+    }
+    await export_jobs_collection.insert_one(job)
+    task = asyncio.create_task(
+        run_export_job(export_jobs_collection, export_cursor(query), job_id, fmt, path, total, EXPORT_BATCH_SIZE)
+    )
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
+    return serialize_export_job(job)
+
+@app.get("/api/admin/exports/{job_id}")
+async def get_export_job(job_id: str, user = Depends(require_role(["admin", "officer", "panchayat"]))):
+    """Export job status and progress (processed / total rows)."""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    job = await export_jobs_collection.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return serialize_export_job(job)
+
+@app.get("/api/admin/exports/{job_id}/download")
+async def download_export(
+    job_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    user = Depends(require_role(["admin", "officer", "panchayat"])),
+):
+    """Download a finished export; supports HTTP Range requests to resume."""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    job = await export_jobs_collection.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.get("status") != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job.get('status')}")
+    path = job.get("path")
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=410, detail="Export file has expired")
+    filename = os.path.basename(path)
+    return range_file_response(path, EXPORT_FORMATS[job["format"]][1], filename, range_header, if_range)
 
 
 @app.get("/api/issues/{issue_id}/status_history")
@@ -1485,44 +1877,58 @@ async def get_status_history(issue_id: str):
 # Device token registration removed (Firebase messaging removed)
 
 
+async def notify_trending(issue: dict):
+    """Tell the reporter (if linked to Telegram) that their issue crossed the vote threshold."""
+    try:
+        user = await users_collection.find_one({"phone": issue.get("reporter_phone")}, {"telegram_chat_id": 1})
+        if user and user.get("telegram_chat_id"):
+            issue_data = {
+                "issue_id": str(issue["_id"]),
+                "category": issue.get("category"),
+                "gram_panchayat": issue.get("gram_panchayat"),
+            }
+            await notify_high_votes(user["telegram_chat_id"], issue_data, issue.get("priority_votes", 0))
+    except Exception as e:
+        print(f"Failed to send trending notification: {e}")
+
+
 @app.post("/api/issues/{issue_id}/vote")
-async def vote_issue(issue_id: str, voter_phone: str = Form(...)):
+async def vote_issue(background_tasks: BackgroundTasks, issue_id: str, voter_phone: str = Form(...)):
     """Vote for an issue to increase priority"""
     
     if not ObjectId.is_valid(issue_id):
         raise HTTPException(status_code=400, detail="Invalid issue ID")
+    oid = ObjectId(issue_id)
     
-    issue = await issues_collection.find_one({"_id": ObjectId(issue_id)})
-    
-    if not issue:
-        raise HTTPException(status_code=404, detail="Issue not found")
-    
-    # Check if user already voted
-    if voter_phone in issue.get("voters", []):
+    # The unique (issue_id, voter) index makes double votes impossible, even concurrently
+    try:
+        await issue_votes_collection.insert_one({"issue_id": oid, "voter": voter_phone, "created_at": datetime.utcnow()})
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="You have already voted for this issue")
     
-    # Add vote
-    result = await issues_collection.update_one(
-        {"_id": ObjectId(issue_id)},
-        {
-            "$inc": {"priority_votes": 1},
-            "$push": {"voters": voter_phone}
-        }
+    # Atomic counter bump; the voters check only matters for votes cast before the votes collection existed
+    issue = await issues_collection.find_one_and_update(
+        {"_id": oid, "voters": {"$ne": voter_phone}},
+        {"$inc": {"priority_votes": 1}},
+        projection={"priority_votes": 1, "category": 1, "gram_panchayat": 1, "reporter_phone": 1, "status": 1, "created_at": 1},
+        return_document=ReturnDocument.AFTER,
     )
-    # Mirror vote to category collection
-    try:
-        cat_coll = get_issue_category_collection(issue.get("category"))
-        await cat_coll.update_one(
-            {"_id": ObjectId(issue_id)},
-            {"$inc": {"priority_votes": 1}, "$push": {"voters": voter_phone}}
-        )
-    except Exception:
-        pass
+    if issue is None:
+        await issue_votes_collection.delete_one({"issue_id": oid, "voter": voter_phone})
+        if not await issues_collection.count_documents({"_id": oid}, limit=1):
+            raise HTTPException(status_code=404, detail="Issue not found")
+        raise HTTPException(status_code=400, detail="You have already voted for this issue")
+    await update_rollups(record_vote, issue)
+    mirror_projector.notify("issues", oid)
+    
+    # $inc is atomic, so exactly one vote observes the count landing on the threshold
+    if issue["priority_votes"] == TRENDING_VOTE_THRESHOLD:
+        background_tasks.add_task(notify_trending, issue)
     
     return {
         "message": "Vote recorded successfully",
         "issue_id": issue_id,
-        "total_votes": issue["priority_votes"] + 1
+        "total_votes": issue["priority_votes"]
     }
 
 
@@ -1533,173 +1939,51 @@ async def chatbot_message(payload: dict):
     """Chatbot endpoint. Uses GROQ_API_KEY for chatbot, falls back to rule-based replies."""
     user_msg = (payload.get("message") or "").strip()
     if not user_msg:
-        return {"reply": "Please type your question or say hi."}
+        return {"reply": EMPTY_MESSAGE_REPLY}
+    reply, _ = await chat_service.reply(get_chat_client(), user_msg)
+    return {"reply": reply}
 
-    # Try Groq LLM first if configured
-    if GROQ_API_KEY:
-        try:
-            from groq import Groq
-            model = os.getenv("GROQ_CHAT_MODEL", "llama-3.1-8b-instant")
-            client = get_groq_client(use_voice_key=False)  # Use chatbot key
-            completion = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are GramaBot, a helpful assistant for a rural issue reporting app called GramaFix. Keep answers concise and friendly. If a user asks for harmful or illegal content, reply: 'Sorry, I can't assist with that.'"},
-                    {"role": "user", "content": user_msg},
-                ],
-                temperature=0.2,
-                max_tokens=256,
-            )
-            reply = completion.choices[0].message.content.strip()
-            return {"reply": reply}
-        except Exception as e:
-            # Fallback to rule-based
-            pass
 
-    # Rule-based fallback
-    msg = user_msg.lower()
-    def contains(*words):
-        return any(w in msg for w in words)
-    if contains("hi", "hello", "hey"):
-        return {"reply": "Hi! I'm GramaBot. I can help you report issues, check status, or learn how to register. What would you like to do?"}
-    if contains("report"):
-        return {"reply": "To report an issue: go to the Report page, choose a category, add a description and photos, and submit."}
-    if contains("status", "track"):
-        return {"reply": "To check status: open Reports, find your issue, and view its current status and history."}
-    if contains("register", "signup", "sign up"):
-        return {"reply": "To register: open the Register page, enter your details, and create an account. You can enable Authenticator (TOTP) in Profile."}
-    if contains("totp", "authenticator", "otp"):
-        return {"reply": "In your Profile, enable Authenticator to get a QR code. Scan it with Google Authenticator or Authy, then enter the 6-digit code to verify."}
-    return {"reply": "I didn't catch that. Ask about reporting an issue, checking status, registration, or Authenticator (TOTP)."}
+@app.post("/api/chatbot/stream")
+async def chatbot_stream(payload: dict, request: Request):
+    """Same as /api/chatbot/message, streamed token by token as Server-Sent Events.
+
+    Events are ``{"token": ...}`` followed by ``{"done": true, "source": "llm" | "rules"}``.
+    """
+    user_msg = (payload.get("message") or "").strip()
+    if user_msg:
+        events = chat_service.stream(get_chat_client(), user_msg, request.is_disconnected)
+    else:
+        async def events_for_empty():
+            yield sse({"token": EMPTY_MESSAGE_REPLY})
+            yield sse({"done": True, "source": "rules"})
+        events = events_for_empty()
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events, media_type="text/event-stream", headers=headers)
 
 
 @app.get("/api/analytics")
 async def get_analytics(gram_panchayat: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, trend_days: int = 14):
-    """Get analytics data for dashboard"""
-    
-    query = {}
-    if gram_panchayat:
-        query["gram_panchayat"] = gram_panchayat
-    # Date filters
-    def parse_dt(s):
-        try:
-            return datetime.fromisoformat(s)
-        except Exception:
-            return None
-    dt_start = parse_dt(start_date) if start_date else None
-    dt_end = parse_dt(end_date) if end_date else None
-    if dt_start or dt_end:
-        query["created_at"] = {}
-        if dt_start:
-            query["created_at"]["$gte"] = dt_start
-        if dt_end:
-            query["created_at"]["$lte"] = dt_end
-    
-    # Total issues
-    total_issues = await issues_collection.count_documents(query)
-    
-    # Issues by status
-    received = await issues_collection.count_documents({**query, "status": "Received"})
-    in_progress = await issues_collection.count_documents({**query, "status": "In Progress"})
-    resolved = await issues_collection.count_documents({**query, "status": "Resolved"})
-    
-    # Issues by category
-    category_stats = []
-    for cat in CATEGORIES:
-        count = await issues_collection.count_documents({**query, "category": cat["name"]})
-        category_stats.append({"category": cat["name"], "icon": cat["icon"], "count": count})
-    
-    # Most voted issues
-    top_issues = []
-    cursor = issues_collection.find(query).sort("priority_votes", -1).limit(5)
-    async for issue in cursor:
-        top_issues.append({
-            "id": str(issue["_id"]),
-            "category": issue["category"],
-            "description": issue["description"][:100],
-            "votes": issue["priority_votes"]
-        })
-    
-    # Trend data: counts per day
-    trend = []
-    try:
-        from datetime import timezone
-        pipeline = [
-            {"$match": query},
-            {
-                "$group": {
-                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
-                    "count": {"$sum": 1},
-                }
-            },
-            {"$sort": {"_id": 1}},
-        ]
-        async for row in issues_collection.aggregate(pipeline):
-            trend.append({"date": row.get("_id"), "count": row.get("count", 0)})
-        # Optionally limit to last trend_days entries
-        if trend_days and len(trend) > trend_days:
-            trend = trend[-trend_days:]
-    except Exception:
-        trend = []
-
-    return {
-        "total_issues": total_issues,
-        "status_breakdown": {
-            "received": received,
-            "in_progress": in_progress,
-            "resolved": resolved
-        },
-        "category_breakdown": category_stats,
-        "top_priority_issues": top_issues,
-        "resolution_rate": round((resolved / total_issues * 100) if total_issues > 0 else 0, 2),
-        "trend": trend,
-    }
-
-
-@app.get("/api/issues")
-async def get_issues(
-    gram_panchayat: Optional[str] = None,
-    category: Optional[str] = None,
-    status: Optional[str] = None,
-    limit: int = 100,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-):
-    """Get all issues with optional filters and date range"""
-    query = {}
-    if gram_panchayat:
-        query["gram_panchayat"] = gram_panchayat
-    if category:
-        query["category"] = category
-    if status:
-        query["status"] = status
-    def parse_dt(s):
-        try:
-            return datetime.fromisoformat(s)
-        except Exception:
-            return None
-    dt_start = parse_dt(start_date) if start_date else None
-    dt_end = parse_dt(end_date) if end_date else None
-    if dt_start or dt_end:
-        query["created_at"] = {}
-        if dt_start:
-            query["created_at"]["$gte"] = dt_start
-        if dt_end:
-            query["created_at"]["$lte"] = dt_end
+    """Get analytics data for dashboard.
 
-    cursor = issues_collection.find(query).sort("created_at", -1).limit(limit)
-    issues = []
-    async for issue in cursor:
-        issue["_id"] = str(issue["_id"])
-        if isinstance(issue.get("created_at"), datetime):
-            issue["created_at"] = issue["created_at"].isoformat()
-        if isinstance(issue.get("updated_at"), datetime):
-            issue["updated_at"] = issue["updated_at"].isoformat()
-        if issue.get("resolved_at") and isinstance(issue.get("resolved_at"), datetime):
-            issue["resolved_at"] = issue["resolved_at"].isoformat()
-        issues.append(issue)
-
-    return {"issues": issues, "count": len(issues)}
+    Counts and the trend come from the issue_rollups buckets (date filters are
+    applied at day granularity); set ANALYTICS_FROM_ROLLUPS=false to aggregate
+    the issues directly with a single $facet instead.
+    """
+    query = build_issue_query(gram_panchayat=gram_panchayat, start_date=start_date, end_date=end_date)
+    if not ANALYTICS_FROM_ROLLUPS:
+        rows = await issues_collection.aggregate(facet_pipeline(query, trend_days)).to_list(length=1)
+        return shape_facet_result(rows[0] if rows else {}, CATEGORIES)
+
+    match = rollup_match(gram_panchayat, parse_date_param(start_date), parse_date_param(end_date))
+    top_cursor = issues_collection.find(
+        query, {"category": 1, "priority_votes": 1, "description": {"$substrCP": [{"$ifNull": ["$description", ""]}, 0, 100]}}
+    ).sort("priority_votes", -1).limit(5)
+    rows, top = await asyncio.gather(
+        issue_rollups_collection.aggregate(rollup_pipeline(match, trend_days)).to_list(length=1),
+        top_cursor.to_list(length=5),
+    )
+    return shape_rollup_result(rows[0] if rows else {}, top, CATEGORIES)
 
 
 @app.post("/api/users")
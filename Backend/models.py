@@ -12,16 +12,20 @@ class Issue(BaseModel):
     voice_description: Optional[str] = None
     location: dict  # {latitude, longitude, address}
     images: List[str] = []  # Image file paths
+    image_variants: List[dict] = []  # Thumbnail / WebP variants per image (filled in the background)
+    progress_images: List[str] = []  # Work-progress photos added on status updates
+    progress_image_variants: List[dict] = []  # Variants of progress_images (filled in the background)
     reporter_name: str
     reporter_phone: str
     status: str = "Received"  # Received, In Progress, Resolved
     priority_votes: int = 0
-    voters: List[str] = []  # Phone numbers of voters
+    voters: List[str] = []  # Legacy only; votes now live in the issue_votes collection
     assigned_to: Optional[str] = None  # Officer name
     gram_panchayat: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     resolved_at: Optional[datetime] = None
+    version: int = 0  # Bumped on every status change (optimistic concurrency)
 
 
 class User(BaseModel):
@@ -0,0 +1,95 @@
+"""
+Notification fan-out: who hears about an issue event, resolved in one query.
+
+``issue_audience`` runs a single aggregation on ``issues`` that looks up the
+issue's voters (``issue_votes``, plus the legacy ``voters`` array) and then
+every linked Telegram account among reporter and voters with one ``$lookup``
+on ``users.phone`` (unique index). A status change on a popular issue costs
+one database round trip however many people voted for it.
+
+``status_change_batch`` turns that into deduplicated ``(chat_id, text)``
+messages for ``telegram_bot.send_telegram_batch``.
+"""
+from typing import List, Optional, Tuple
+
+from telegram_bot import status_update_message
+
+ISSUE_FIELDS = {"category": 1, "gram_panchayat": 1, "description": 1, "reporter_phone": 1, "status": 1}
+
+
+def audience_pipeline(issue_id, votes_collection: str = "issue_votes", users_collection: str = "users") -> List[dict]:
+    return [
+        {"$match": {"_id": issue_id}},
+        {"$project": {**ISSUE_FIELDS, "voters": 1}},
+        {"$lookup": {
+            "from": votes_collection,
+            "localField": "_id",
+            "foreignField": "issue_id",
+            "pipeline": [{"$project": {"_id": 0, "voter": 1}}],
+            "as": "votes",
+        }},
+        {"$set": {"phones": {"$setUnion": [
+            ["$reporter_phone"],
+            "$votes.voter",
+            {"$ifNull": ["$voters", []]},
+        ]}}},
+        {"$lookup": {
+            "from": users_collection,
+            "localField": "phones",
+            "foreignField": "phone",
+            "pipeline": [
+                {"$match": {"telegram_chat_id": {"$nin": [None, ""]}}},
+                {"$project": {"_id": 0, "phone": 1, "telegram_chat_id": 1}},
+            ],
+            "as": "recipients",
+        }},
+        {"$project": {"votes": 0, "voters": 0, "phones": 0}},
+    ]
+
+
+async def issue_audience(issues, issue_id) -> Optional[dict]:
+    """The issue's notification fields plus ``recipients`` (phone, telegram_chat_id), or None."""
+    rows = await issues.aggregate(audience_pipeline(issue_id)).to_list(length=1)
+    return rows[0] if rows else None
+
+
+async def chat_ids_for_phones(users, phones) -> List[str]:
+    """Linked Telegram chats for ``phones`` in one ``$in`` query, deduplicated."""
+    phones = [p for p in set(phones) if p]
+    if not phones:
+        return []
+    seen = []
+    async for u in users.find(
+        {"phone": {"$in": phones}, "telegram_chat_id": {"$nin": [None, ""]}},
+        {"telegram_chat_id": 1},
+    ):
+        if u["telegram_chat_id"] not in seen:
+            seen.append(u["telegram_chat_id"])
+    return seen
+
+
+def status_change_batch(audience: dict, new_status: str, old_status: str) -> List[Tuple[str, str]]:
+    """One message per distinct chat; the reporter gets the reporter wording even if they also voted."""
+    issue_data = {
+        "issue_id": str(audience["_id"]),
+        "category": audience.get("category"),
+        "description": (audience.get("description") or "")[:100],
+        "gram_panchayat": audience.get("gram_panchayat"),
+    }
+    reporter_phone = audience.get("reporter_phone")
+    reporter_chats = {r["telegram_chat_id"] for r in audience.get("recipients", []) if r.get("phone") == reporter_phone}
+    batch = []
+    seen = set()
+    for chat_id in reporter_chats:
+        seen.add(chat_id)
+        batch.append((chat_id, status_update_message(issue_data, new_status, old_status)))
+    voter_text = None
+    for r in audience.get("recipients", []):
+        chat_id = r["telegram_chat_id"]
+        if chat_id in seen:
+            continue
+        seen.add(chat_id)
+        if voter_text is None:
+            voter_text = status_update_message(issue_data, new_status, old_status, voter=True)
+        batch.append((chat_id, voter_text))
+    return batch
@@ -0,0 +1,124 @@
+"""
+One-time SMS codes for phone login.
+
+Codes live for a few minutes and are only guessable within the attempt
+limit, so they are stored as a keyed HMAC (cheap, constant cost) instead of
+a password hash. There is one document per phone (``_id`` = phone number):
+
+- issuing is a single conditional upsert; a pending code that is still in
+  its resend cooldown makes the upsert collide on ``_id`` (DuplicateKeyError)
+- verifying is a single ``find_one_and_update`` that counts the attempt and
+  marks the code consumed in the same write
+- sends per phone are additionally capped per window (``otp_sends``) to
+  protect the SMS provider; only requests past the cooldown are charged
+"""
+import hashlib
+import hmac
+import secrets
+import string
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class OtpEngine:
+    def __init__(
+        self,
+        codes,
+        sends,
+        key: str,
+        ttl_seconds: int = 300,
+        cooldown_seconds: int = 30,
+        max_attempts: int = 5,
+        max_sends: int = 5,
+        send_window_seconds: int = 3600,
+        digits: int = 6,
+    ):
+        self.codes = codes
+        self.sends = sends
+        self.key = key.encode("utf-8")
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.cooldown = timedelta(seconds=cooldown_seconds)
+        self.max_attempts = max_attempts
+        self.max_sends = max_sends
+        self.send_window_seconds = send_window_seconds
+        self.digits = digits
+
+    async def init_indexes(self):
+        await self.codes.create_index("expires_at", expireAfterSeconds=0)
+        await self.sends.create_index("expires_at", expireAfterSeconds=0)
+
+    def digest(self, phone: str, code: str) -> str:
+        return hmac.new(self.key, f"{phone}:{code}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    async def _charge_send(self, phone: str, now: datetime):
+        window = int(now.timestamp()) // self.send_window_seconds
+        doc = await self.sends.find_one_and_update(
+            {"_id": f"{phone}:{window}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {"expires_at": now + timedelta(seconds=self.send_window_seconds)},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["count"] > self.max_sends:
+            raise HTTPException(status_code=429, detail="Too many OTP requests for this number. Try again later.")
+
+    async def _refund_send(self, phone: str, now: datetime):
+        window = int(now.timestamp()) // self.send_window_seconds
+        await self.sends.update_one({"_id": f"{phone}:{window}"}, {"$inc": {"count": -1}})
+
+    async def issue(self, phone: str) -> str:
+        """Create a fresh code for ``phone`` and return it (the caller delivers it).
+
+        The resend cooldown is checked before the per-window send cap is
+        charged, so requests rejected by the cooldown don't use up the cap.
+        """
+        now = datetime.utcnow()
+        rec = await self.codes.find_one({"_id": phone}, {"resend_after": 1, "consumed": 1})
+        if rec and not rec.get("consumed") and rec.get("resend_after") and rec["resend_after"] > now:
+            raise HTTPException(status_code=429, detail="Please wait before requesting another OTP.")
+        await self._charge_send(phone, now)
+        code = "".join(secrets.choice(string.digits) for _ in range(self.digits))
+        try:
+            await self.codes.update_one(
+                # Matches no document while the previous code is in its cooldown,
+                # so the upsert then fails on the duplicate _id
+                {"_id": phone, "$or": [{"resend_after": {"$lte": now}}, {"consumed": True}]},
+                {"$set": {
+                    "code": self.digest(phone, code),
+                    "created_at": now,
+                    "resend_after": now + self.cooldown,
+                    "expires_at": now + self.ttl,
+                    "attempts": 0,
+                    "consumed": False,
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # A concurrent request won the cooldown slot after our check
+            await self._refund_send(phone, now)
+            raise HTTPException(status_code=429, detail="Please wait before requesting another OTP.")
+        return code
+
+    async def verify(self, phone: str, code: str) -> bool:
+        """Count one attempt and consume the code if it matches, in a single write."""
+        now = datetime.utcnow()
+        doc = await self.codes.find_one_and_update(
+            {"_id": phone, "expires_at": {"$gt": now}, "consumed": False, "attempts": {"$lt": self.max_attempts}},
+            [{"$set": {
+                "attempts": {"$add": ["$attempts", 1]},
+                "consumed": {"$eq": ["$code", self.digest(phone, str(code).strip())]},
+            }}],
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            # Failure path only: work out which error to report
+            rec = await self.codes.find_one({"_id": phone}, {"expires_at": 1, "consumed": 1, "attempts": 1})
+            if rec and rec.get("expires_at") and rec["expires_at"] > now and not rec.get("consumed"):
+                raise HTTPException(status_code=429, detail="Too many attempts. Request a new OTP.")
+            raise HTTPException(status_code=400, detail="OTP not requested or expired")
+        return bool(doc.get("consumed"))
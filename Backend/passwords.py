@@ -0,0 +1,112 @@
+"""
+Password hashing off the event loop.
+
+PBKDF2 is deliberately slow, so every hash/verify runs on a small dedicated
+thread pool (KDF_MAX_WORKERS) instead of inside the async handlers; a login
+burst then queues here rather than stalling every other request on the
+worker. ``kdf_stats`` exposes the queue depth for /api/admin/metrics.
+
+Hashes made with older parameters (fewer PBKDF2_ROUNDS, bcrypt, legacy
+plaintext) are upgraded transparently on the next successful login via
+``verify_and_upgrade``.
+"""
+import asyncio
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+KDF_MAX_WORKERS = int(os.getenv("KDF_MAX_WORKERS", "0")) or max(1, min(4, os.cpu_count() or 1))
+# 0 keeps passlib's default round count
+PBKDF2_ROUNDS = int(os.getenv("PBKDF2_ROUNDS", "0"))
+
+# Prefer PBKDF2-SHA256 to avoid bcrypt backend issues and 72-byte limit; keep bcrypt variants for legacy verifies
+_context_kwargs = {"pbkdf2_sha256__rounds": PBKDF2_ROUNDS} if PBKDF2_ROUNDS else {}
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256", "bcrypt_sha256", "bcrypt"],
+    deprecated="auto",
+    **_context_kwargs,
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_in_flight = 0
+_completed = 0
+_total_ms = 0.0
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=KDF_MAX_WORKERS, thread_name_prefix="kdf")
+    return _executor
+
+
+def shutdown_kdf_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _timed(fn, *args):
+    global _completed, _total_ms
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        with _lock:
+            _completed += 1
+            _total_ms += (time.perf_counter() - t0) * 1000
+
+
+async def _run(fn, *args):
+    global _in_flight
+    with _lock:
+        _in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), _timed, fn, *args)
+    finally:
+        with _lock:
+            _in_flight -= 1
+
+
+def kdf_stats() -> dict:
+    with _lock:
+        return {
+            "workers": KDF_MAX_WORKERS,
+            "in_flight": _in_flight,
+            "queued": max(0, _in_flight - KDF_MAX_WORKERS),
+            "completed": _completed,
+            "avg_ms": round(_total_ms / _completed, 2) if _completed else 0.0,
+        }
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await _run(pwd_context.verify, plain_password, hashed_password)
+    except (ValueError, TypeError):
+        return False
+
+
+def _verify_and_upgrade(password: str, stored: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return pwd_context.verify_and_update(password, stored)
+    except (ValueError, TypeError):
+        # Not a recognised hash: legacy plaintext password
+        if stored and hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8")):
+            return True, pwd_context.hash(password)
+        return False, None
+
+
+async def verify_and_upgrade(password: str, stored: str) -> Tuple[bool, Optional[str]]:
+    """Return (valid, new_hash); ``new_hash`` is set when the stored value should be replaced."""
+    return await _run(_verify_and_upgrade, password, stored or "")
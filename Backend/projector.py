@@ -0,0 +1,248 @@
+"""
+Background projector for the per-category / per-role mirror collections.
+
+``issues`` and ``users`` are the sources of truth; ``issues_<category>`` and
+``users_<role>`` are read-side copies. Request handlers write only the
+source collection and the projector brings the mirrors up to date by
+replacing the mirrored document with the current source document (an
+idempotent upsert, so replays and duplicate deliveries are harmless).
+
+Two modes, picked at startup (PROJECTOR_MODE=auto|changestream|outbox|off):
+
+- changestream: tail a database change stream filtered to the source
+  collections, persisting the resume token in ``projector_state`` so a
+  restart continues where it left off. Needs a replica set or mongos.
+- outbox: standalone servers have no change streams, so handlers call
+  ``notify(source, _id)`` which queues the id in memory; a worker drains the
+  queue in batches. A periodic reconciliation pass re-projects anything
+  touched since the last pass (``updated_at``/``created_at`` and new votes)
+  so ids lost in a crash still converge.
+
+``stats()`` reports queue depth and the observed projection lag.
+"""
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional
+
+from pymongo import ReplaceOne
+from pymongo.errors import OperationFailure
+
+STATE_ID = "mirrors"
+# Resume token is no longer in the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class MirrorSource:
+    """A source collection and how to find the mirror collection for one of its documents.
+
+    All mirrors of a source share ``mirror_prefix``; when a document moves to
+    another mirror (category or role changed) its old copies are removed.
+    """
+
+    def __init__(
+        self,
+        collection,
+        mirror_for: Callable[[dict], object],
+        touched_query: Callable[[datetime], dict],
+        mirror_prefix: Optional[str] = None,
+    ):
+        self.collection = collection
+        self.mirror_for = mirror_for
+        self.touched_query = touched_query
+        self.mirror_prefix = mirror_prefix
+
+
+class MirrorProjector:
+    def __init__(
+        self,
+        client,
+        db,
+        sources: Dict[str, MirrorSource],
+        state_collection,
+        mode: str = "auto",
+        batch_size: int = 200,
+        reconcile_seconds: float = 60.0,
+        related_ids: Optional[Dict[str, Callable[[datetime], object]]] = None,
+    ):
+        self.client = client
+        self.db = db
+        self.sources = sources
+        self.state = state_collection
+        self.mode = mode
+        self.batch_size = batch_size
+        self.reconcile_seconds = reconcile_seconds
+        # source -> async fn(since) yielding extra ids touched without a timestamp (e.g. votes)
+        self.related_ids = related_ids or {}
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.projected = 0
+        self.errors = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.last_applied_at: Optional[datetime] = None
+        self._tasks = []
+
+    # ---- lifecycle ----
+
+    async def _has_change_streams(self) -> bool:
+        try:
+            hello = await self.client.admin.command("hello")
+        except Exception:
+            hello = await self.client.admin.command("isMaster")
+        return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+    async def start(self):
+        if self.mode == "off":
+            return
+        if self.mode == "auto":
+            self.mode = "changestream" if await self._has_change_streams() else "outbox"
+        if self.mode == "changestream":
+            self._tasks.append(asyncio.create_task(self._run_change_stream()))
+        else:
+            self._tasks.append(asyncio.create_task(self._run_outbox()))
+            self._tasks.append(asyncio.create_task(self._reconcile_loop()))
+        print(f"Mirror projector started ({self.mode})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def notify(self, source: str, _id):
+        """Record that a source document changed (outbox mode only; never blocks)."""
+        if self.mode == "outbox" and _id is not None:
+            self.queue.put_nowait((source, _id, time.monotonic()))
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "queued": self.queue.qsize(),
+            "projected": self.projected,
+            "errors": self.errors,
+            "last_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "last_applied_at": self.last_applied_at.isoformat() if self.last_applied_at else None,
+        }
+
+    def _observe_lag(self, lag_ms: float):
+        self.last_lag_ms = max(0.0, lag_ms)
+        self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+        self.last_applied_at = datetime.utcnow()
+
+    # ---- applying ----
+
+    async def _apply(self, source: str, docs: Iterable[dict]):
+        by_mirror = {}
+        for doc in docs:
+            mirror = self.sources[source].mirror_for(doc)
+            by_mirror.setdefault(mirror.name, (mirror, []))[1].append(doc)
+        for mirror, mirror_docs in by_mirror.values():
+            await mirror.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in mirror_docs], ordered=False)
+            self.projected += len(mirror_docs)
+        prefix = self.sources[source].mirror_prefix
+        if prefix and by_mirror:
+            # Drop the copies left in whichever mirror a document belonged to before
+            names = await self.db.list_collection_names(filter={"name": {"$regex": f"^{re.escape(prefix)}"}})
+            for name in names:
+                stale = [d["_id"] for mirror_name, (_, mirror_docs) in by_mirror.items() if mirror_name != name for d in mirror_docs]
+                if stale:
+                    await self.db[name].delete_many({"_id": {"$in": stale}})
+
+    async def project_ids(self, source: str, ids):
+        ids = list(set(ids))
+        for i in range(0, len(ids), self.batch_size):
+            chunk = ids[i:i + self.batch_size]
+            docs = await self.sources[source].collection.find({"_id": {"$in": chunk}}).to_list(length=None)
+            await self._apply(source, docs)
+
+    # ---- change stream mode ----
+
+    async def _run_change_stream(self):
+        by_name = {s.collection.name: name for name, s in self.sources.items()}
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(by_name)},
+            "operationType": {"$in": ["insert", "update", "replace"]},
+        }}]
+        while True:
+            state = await self.state.find_one({"_id": STATE_ID}) or {}
+            token = state.get("resume_token")
+            try:
+                saved_at = 0.0
+                async with self.db.watch(pipeline, full_document="updateLookup", resume_after=token) as stream:
+                    async for change in stream:
+                        doc = change.get("fullDocument")
+                        if doc is not None:
+                            await self._apply(by_name[change["ns"]["coll"]], [doc])
+                            cluster_time = change.get("clusterTime")
+                            if cluster_time is not None:
+                                self._observe_lag((time.time() - cluster_time.time) * 1000)
+                        # Checkpoint at most once a second; replaying a few events is harmless
+                        if time.monotonic() - saved_at >= 1.0:
+                            await self.state.update_one(
+                                {"_id": STATE_ID}, {"$set": {"resume_token": stream.resume_token}}, upsert=True
+                            )
+                            saved_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.errors += 1
+                print(f"Mirror projector change stream error: {e}")
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # Too far behind to resume: re-project everything, then follow from now
+                    await self.state.update_one({"_id": STATE_ID}, {"$unset": {"resume_token": ""}})
+                    await self._reconcile(datetime.min)
+                await asyncio.sleep(1)
+            except Exception as e:
+                self.errors += 1
+                print(f"Mirror projector change stream error: {e}")
+                await asyncio.sleep(5)
+
+    # ---- outbox mode ----
+
+    async def _run_outbox(self):
+        while True:
+            item = await self.queue.get()
+            batch = [item]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            by_source = {}
+            for source, _id, _ in batch:
+                by_source.setdefault(source, []).append(_id)
+            try:
+                for source, ids in by_source.items():
+                    await self.project_ids(source, ids)
+                self._observe_lag((time.monotonic() - min(t for _, _, t in batch)) * 1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The reconciliation pass will pick these up
+                self.errors += 1
+                print(f"Mirror projector warning: {e}")
+
+    async def _reconcile(self, since: datetime):
+        for name, source in self.sources.items():
+            ids = [d["_id"] async for d in source.collection.find(source.touched_query(since), {"_id": 1})]
+            related = self.related_ids.get(name)
+            if related is not None:
+                ids.extend(await related(since))
+            if ids:
+                await self.project_ids(name, ids)
+
+    async def _reconcile_loop(self):
+        state = await self.state.find_one({"_id": STATE_ID}) or {}
+        # First run after the upgrade: the mirrors were written inline until now
+        since = state.get("reconciled_at") or datetime.utcnow()
+        while True:
+            started = datetime.utcnow()
+            try:
+                # Overlap one interval so writes racing the previous pass are not missed
+                await self._reconcile(since - timedelta(seconds=self.reconcile_seconds))
+                since = started
+                await self.state.update_one({"_id": STATE_ID}, {"$set": {"reconciled_at": since}}, upsert=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"Mirror projector reconcile warning: {e}")
+            await asyncio.sleep(self.reconcile_seconds)
@@ -0,0 +1,264 @@
+"""
+Incrementally maintained analytics rollups.
+
+``issue_rollups`` holds one document per (gram_panchayat, category, status,
+day) with the number of issues in that bucket and the votes they carry.
+Issue writes keep it current with ``$inc``; ``/api/analytics`` reads it
+instead of scanning the issues, so dashboard cost depends on the number of
+buckets, not on the size of the issue history.
+
+Rebuild from scratch (e.g. after a restore or a schema change):
+
+    python rollups.py rebuild
+
+The app may keep writing during a rebuild; see ``RollupWriter``.
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+ROLLUPS_COLLECTION = "issue_rollups"
+# {"_id": "rebuild", "active": bool, "started_at": ...}: the rebuild flag/lock
+STATE_COLLECTION = "issue_rollups_state"
+# Buckets written while a rebuild was running, recomputed once it has swapped in
+DIRTY_COLLECTION = "issue_rollups_dirty"
+REBUILD_FLAG_TTL_SECONDS = 1.0
+# A flag older than this belongs to a rebuild that died; it is ignored and can be taken over
+REBUILD_STALE_SECONDS = 3600
+
+
+def rollup_day(dt: Optional[datetime]) -> Optional[datetime]:
+    if not isinstance(dt, datetime):
+        return None
+    return datetime(dt.year, dt.month, dt.day)
+
+
+def _bucket(gram_panchayat, category, status, created_at) -> dict:
+    return {
+        "gram_panchayat": gram_panchayat,
+        "category": category,
+        "status": status,
+        "day": rollup_day(created_at),
+    }
+
+
+async def init_rollup_indexes(rollups):
+    await rollups.create_index(
+        [("gram_panchayat", 1), ("day", 1), ("category", 1), ("status", 1)], unique=True
+    )
+    await rollups.create_index([("day", 1)])
+
+
+class RollupWriter:
+    """Applies bucket increments, or defers them while a rebuild is running.
+
+    A rebuild snapshots the issues into a new collection and swaps it in, so
+    an ``$inc`` on the old collection in between would be lost. While the
+    rebuild flag is set, writers only mark the touched buckets dirty; the
+    rebuild recomputes those buckets from the issues after the swap. The
+    flag is read at most every ``flag_ttl`` seconds per process.
+    """
+
+    def __init__(self, db, flag_ttl: float = REBUILD_FLAG_TTL_SECONDS):
+        self.rollups = db[ROLLUPS_COLLECTION]
+        self.state = db[STATE_COLLECTION]
+        self.dirty = db[DIRTY_COLLECTION]
+        self.flag_ttl = flag_ttl
+        self._rebuilding = False
+        self._checked_at = 0.0
+
+    async def rebuilding(self) -> bool:
+        if time.monotonic() - self._checked_at >= self.flag_ttl:
+            self._rebuilding = _rebuild_active(await self.state.find_one({"_id": "rebuild"}))
+            self._checked_at = time.monotonic()
+        return self._rebuilding
+
+    async def apply(self, increments: List[Tuple[dict, dict]]):
+        if not increments:
+            return
+        if await self.rebuilding():
+            await mark_dirty(self.dirty, [bucket for bucket, _ in increments])
+            return
+        await self.rollups.bulk_write(
+            [UpdateOne(bucket, {"$inc": inc}, upsert=True) for bucket, inc in increments], ordered=False
+        )
+
+
+async def mark_dirty(dirty, buckets: List[dict]):
+    now = datetime.utcnow()
+    await dirty.bulk_write(
+        [UpdateOne({"_id": bucket}, {"$set": {"marked_at": now}}, upsert=True) for bucket in buckets], ordered=False
+    )
+
+
+async def record_created(writer: RollupWriter, issue: dict):
+    await writer.apply([(
+        _bucket(issue.get("gram_panchayat"), issue.get("category"), issue.get("status"), issue.get("created_at")),
+        {"count": 1, "votes": issue.get("priority_votes", 0) or 0},
+    )])
+
+
+async def record_vote(writer: RollupWriter, issue: dict, delta: int = 1):
+    """``issue`` must carry gram_panchayat, category, status and created_at."""
+    await writer.apply([(
+        _bucket(issue.get("gram_panchayat"), issue.get("category"), issue.get("status"), issue.get("created_at")),
+        {"votes": delta},
+    )])
+
+
+async def record_status_change(writer: RollupWriter, before: dict, new_status: str):
+    """Move an issue (and its votes) from its previous status bucket to ``new_status``."""
+    if before.get("status") == new_status:
+        return
+    votes = before.get("priority_votes", 0) or 0
+    gp, category, created_at = before.get("gram_panchayat"), before.get("category"), before.get("created_at")
+    await writer.apply([
+        (_bucket(gp, category, before.get("status"), created_at), {"count": -1, "votes": -votes}),
+        (_bucket(gp, category, new_status, created_at), {"count": 1, "votes": votes}),
+    ])
+
+
+def rollup_match(gram_panchayat: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+    """Rollup filter for the analytics parameters; date bounds are widened to whole days."""
+    match = {}
+    if gram_panchayat:
+        match["gram_panchayat"] = gram_panchayat
+    if start or end:
+        match["day"] = {}
+        if start:
+            match["day"]["$gte"] = rollup_day(start)
+        if end:
+            match["day"]["$lte"] = rollup_day(end)
+    return match
+
+
+def _rebuild_active(state: Optional[dict]) -> bool:
+    if not state or not state.get("active"):
+        return False
+    started_at = state.get("started_at")
+    return isinstance(started_at, datetime) and datetime.utcnow() - started_at < timedelta(seconds=REBUILD_STALE_SECONDS)
+
+
+def _bucket_pipeline(bucket: dict) -> list:
+    match = {"gram_panchayat": bucket["gram_panchayat"], "category": bucket["category"], "status": bucket["status"]}
+    day = bucket["day"]
+    if day is None:
+        match["created_at"] = {"$not": {"$type": "date"}}
+    else:
+        match["created_at"] = {"$gte": day, "$lt": day + timedelta(days=1)}
+    return [
+        {"$match": match},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "votes": {"$sum": {"$ifNull": ["$priority_votes", 0]}}}},
+    ]
+
+
+async def recompute_dirty(db, issues_name: str = "issues") -> int:
+    """Recompute every dirty bucket from the issues; returns how many were fixed."""
+    dirty, rollups, issues = db[DIRTY_COLLECTION], db[ROLLUPS_COLLECTION], db[issues_name]
+    fixed = 0
+    while True:
+        batch = await dirty.find().to_list(length=500)
+        if not batch:
+            return fixed
+        for doc in batch:
+            bucket = doc["_id"]
+            rows = await issues.aggregate(_bucket_pipeline(bucket)).to_list(length=1)
+            if rows:
+                await rollups.update_one(bucket, {"$set": {"count": rows[0]["count"], "votes": rows[0]["votes"]}}, upsert=True)
+            else:
+                await rollups.delete_one(bucket)
+            # Only clear the mark if nobody touched the bucket again meanwhile
+            await dirty.delete_one({"_id": bucket, "marked_at": doc["marked_at"]})
+            fixed += 1
+
+
+async def rebuild_rollups(db, issues_name: str = "issues", flag_ttl: float = REBUILD_FLAG_TTL_SECONDS):
+    """Recompute every bucket from the issues collection and atomically swap it in.
+
+    Sets the rebuild flag first (one rebuild at a time: raises RuntimeError if
+    another one is running) and waits until every writer has seen it, so no
+    increment is lost in the swap; buckets written meanwhile are recomputed.
+    """
+    state = db[STATE_COLLECTION]
+    now = datetime.utcnow()
+    try:
+        await state.update_one(
+            {"_id": "rebuild", "$or": [
+                {"active": {"$ne": True}},
+                {"started_at": {"$lt": now - timedelta(seconds=REBUILD_STALE_SECONDS)}},
+            ]},
+            {"$set": {"active": True, "started_at": now, "pid": os.getpid()}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise RuntimeError("Another rollup rebuild is already running")
+
+    tmp_name = f"{ROLLUPS_COLLECTION}_rebuild_{os.getpid()}"
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "gram_panchayat": "$gram_panchayat",
+                "category": "$category",
+                "status": "$status",
+                "day": {"$dateTrunc": {"date": "$created_at", "unit": "day"}},
+            },
+            "count": {"$sum": 1},
+            "votes": {"$sum": {"$ifNull": ["$priority_votes", 0]}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "gram_panchayat": "$_id.gram_panchayat",
+            "category": "$_id.category",
+            "status": "$_id.status",
+            "day": "$_id.day",
+            "count": 1,
+            "votes": 1,
+        }},
+        {"$out": tmp_name},
+    ]
+    try:
+        # Writers cache the flag for flag_ttl; after this none is still using $inc
+        await asyncio.sleep(2 * flag_ttl)
+        await db[issues_name].aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+        await db[tmp_name].rename(ROLLUPS_COLLECTION, dropTarget=True)
+        await init_rollup_indexes(db[ROLLUPS_COLLECTION])
+        await recompute_dirty(db, issues_name)
+    finally:
+        await state.update_one({"_id": "rebuild"}, {"$set": {"active": False, "finished_at": datetime.utcnow()}})
+        # Writers that still saw the flag after the last pass marked their buckets dirty
+        await asyncio.sleep(2 * flag_ttl)
+        await recompute_dirty(db, issues_name)
+    return await db[ROLLUPS_COLLECTION].estimated_document_count()
+
+
+async def _main(argv):
+    if len(argv) < 2 or argv[1] != "rebuild":
+        print("usage: python rollups.py rebuild")
+        return 2
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/GramaFix")
+    db_name = os.getenv("MONGODB_DB_NAME") or (uri.rsplit("/", 1)[-1].split("?", 1)[0] or "GramaFix")
+    client = AsyncIOMotorClient(uri)
+    try:
+        started = datetime.utcnow()
+        buckets = await rebuild_rollups(client[db_name])
+        print(f"Rebuilt {ROLLUPS_COLLECTION} in {db_name}: {buckets} buckets in {(datetime.utcnow() - started).total_seconds():.1f}s")
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv)))
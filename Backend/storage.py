@@ -0,0 +1,647 @@
+"""
+Async storage backends for issue and progress images.
+
+Uploads are streamed from the incoming ``UploadFile`` in fixed-size chunks so
+memory use stays bounded, size limits are enforced while the bytes arrive, and
+every blocking disk or boto3 call runs on a worker thread instead of the event
+loop.
+
+Stored objects are content-addressed: the SHA-256 of the bytes is computed
+while streaming and becomes the object key, and ``ContentIndex`` keeps a
+reference count per digest so identical photos are only written once.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from pymongo import ReturnDocument
+
+CHUNK_SIZE = 256 * 1024
+
+
+class UploadBudget:
+    """Per-request byte accounting for streamed uploads."""
+
+    def __init__(self, max_file_bytes: int, max_request_bytes: int):
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.used = 0
+        self._charged: Dict[int, int] = {}
+
+    def charge(self, filename: str, file_bytes: int, chunk_bytes: int, owner: Optional[int] = None):
+        self.used += chunk_bytes
+        if owner is not None:
+            self._charged[owner] = self._charged.get(owner, 0) + chunk_bytes
+        if self.max_file_bytes and file_bytes > self.max_file_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File '{filename}' exceeds the {self.max_file_bytes // (1024 * 1024)} MB limit",
+            )
+        if self.max_request_bytes and self.used > self.max_request_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Total upload size exceeds the {self.max_request_bytes // (1024 * 1024)} MB limit",
+            )
+
+    def refund(self, owner: int):
+        """Give back only what ``owner`` was charged (other files share the budget)."""
+        self.used -= self._charged.pop(owner, 0)
+
+
+async def iter_upload(upload: UploadFile, budget: UploadBudget, hasher=None, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield the upload in chunks, charging each one against the budget.
+
+    If ``hasher`` is given it is fed every chunk, so the content digest is
+    ready as soon as the stream ends without a second pass over the file.
+    """
+    size = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        budget.charge(upload.filename or "upload", size, len(chunk), id(upload))
+        if hasher is not None:
+            hasher.update(chunk)
+        yield chunk
+
+
+def content_key(digest: str, filename: str) -> str:
+    """Object key for content with ``digest``; keeps a short, safe file extension."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,5}", ext):
+        ext = ""
+    return f"{digest}{ext}"
+
+
+def digest_from_key(key: str) -> Optional[str]:
+    stem = os.path.basename(key).split(".", 1)[0].split("__", 1)[0]
+    return stem if re.fullmatch(r"[0-9a-f]{64}", stem) else None
+
+
+class ContentIndex:
+    """Reference-counted index of stored objects keyed by SHA-256 digest.
+
+    Documents look like ``{_id: digest, url, size, content_type, refs,
+    variants, created_at}``; ``_id`` is the lookup key so no extra index is
+    needed.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def claim(self, digest: str) -> Optional[str]:
+        """Take a reference on already-stored content; returns its URL, or None if unseen."""
+        doc = await self.collection.find_one_and_update(
+            {"_id": digest}, {"$inc": {"refs": 1}}, projection={"url": 1}
+        )
+        return doc["url"] if doc else None
+
+    async def register(self, digest: str, url: str, size: int, content_type: Optional[str]):
+        """Record newly written content. Safe if a concurrent upload registered it first."""
+        await self.collection.update_one(
+            {"_id": digest},
+            {
+                "$inc": {"refs": 1},
+                "$setOnInsert": {
+                    "url": url,
+                    "size": size,
+                    "content_type": content_type,
+                    "created_at": datetime.utcnow(),
+                },
+            },
+            upsert=True,
+        )
+
+    async def release(self, digest: str) -> Optional[dict]:
+        """Drop a reference; returns the removed entry (with its ``variants``) when the last one is gone."""
+        doc = await self.collection.find_one_and_update(
+            {"_id": digest}, {"$inc": {"refs": -1}}, projection={"refs": 1}, return_document=ReturnDocument.AFTER
+        )
+        if doc is None or doc.get("refs", 0) > 0:
+            return None
+        return await self.collection.find_one_and_delete({"_id": digest, "refs": {"$lte": 0}})
+
+    async def exists(self, digest: str) -> bool:
+        return await self.collection.find_one({"_id": digest}, {"_id": 1}) is not None
+
+    async def get_variants(self, digest: str) -> Optional[dict]:
+        doc = await self.collection.find_one({"_id": digest}, {"variants": 1})
+        return (doc or {}).get("variants")
+
+    async def set_variants(self, digest: str, variants: dict):
+        await self.collection.update_one({"_id": digest}, {"$set": {"variants": variants}})
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _publish(tmp_path: str, final_path: str) -> bool:
+    """Move ``tmp_path`` into place; returns False (keeping it) if the file already exists."""
+    if os.path.exists(final_path):
+        return False
+    os.replace(tmp_path, final_path)
+    return True
+
+
+def _restore_or_discard(tmp_path: str, final_path: str):
+    # Same digest means same bytes: put our copy back only if a release removed the file
+    if os.path.exists(final_path):
+        _remove_quietly(tmp_path)
+    else:
+        os.replace(tmp_path, final_path)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class StorageBackend:
+    """Interface: stream an upload to durable storage and return its public path or URL."""
+
+    index: Optional[ContentIndex] = None
+
+    async def save(self, upload: UploadFile, budget: UploadBudget) -> str:
+        raise NotImplementedError
+
+    def url_for(self, key: str) -> str:
+        raise NotImplementedError
+
+    def owns(self, url: str) -> bool:
+        return url.startswith(self.url_for(""))
+
+    def key_for(self, url: str) -> str:
+        return url[len(self.url_for("")):]
+
+    async def read_bytes(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def write_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> str:
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def claim(self, digest: str) -> Optional[str]:
+        if self.index is None:
+            return None
+        return await self.index.claim(digest)
+
+    async def register(self, digest: str, url: str, size: int, content_type: Optional[str]):
+        if self.index is not None:
+            await self.index.register(digest, url, size, content_type)
+
+    async def move_aside(self, key: str) -> Optional[str]:
+        """Take ``key`` out of service without destroying it; returns a handle, or None if it is gone."""
+        raise NotImplementedError
+
+    async def restore(self, handle: str, key: str):
+        raise NotImplementedError
+
+    async def discard(self, handle: str):
+        raise NotImplementedError
+
+    async def delete_url(self, url: str):
+        if self.owns(url):
+            await self.delete(self.key_for(url))
+
+    async def release(self, url: str):
+        """Drop this request's reference to ``url``; delete the object and its variants when unreferenced.
+
+        The object is moved aside before the index is re-checked. An upload of
+        the same content that registers in between either finds it restored
+        here or, if it was already discarded, writes it again itself (saves
+        verify the object after registering).
+        """
+        key = self.key_for(url)
+        digest = digest_from_key(key)
+        if self.index is None or digest is None:
+            return
+        entry = await self.index.release(digest)
+        if entry is None:
+            return
+        handle = await self.move_aside(key)
+        if await self.index.exists(digest):
+            if handle is not None:
+                await self.restore(handle, key)
+            return
+        if handle is not None:
+            await self.discard(handle)
+        for name, variant_url in (entry.get("variants") or {}).items():
+            if isinstance(variant_url, str):
+                await self.delete_url(variant_url)
+
+
+class LocalStorage(StorageBackend):
+    """Writes uploads under ``folder`` (served at ``/uploads``) via worker threads.
+
+    Partial files are written to a private staging directory outside the
+    static mount and only renamed into place once fully received.
+    """
+
+    def __init__(self, folder: str, url_prefix: str = "uploads", tmp_folder: Optional[str] = None, index: Optional[ContentIndex] = None):
+        self.folder = folder
+        self.url_prefix = url_prefix
+        self.index = index
+        self.tmp_folder = tmp_folder or os.path.join(
+            os.path.dirname(os.path.abspath(folder)), f".{os.path.basename(folder)}_tmp"
+        )
+        os.makedirs(self.folder, exist_ok=True)
+        os.makedirs(self.tmp_folder, exist_ok=True)
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    async def _write_tmp(self, chunks: AsyncIterator[bytes]) -> Tuple[str, int]:
+        tmp_path = os.path.join(self.tmp_folder, f"{uuid.uuid4().hex}.part")
+        size = 0
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+                size += len(chunk)
+            await asyncio.to_thread(f.close)
+        except BaseException:
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(_remove_quietly, tmp_path)
+            raise
+        return tmp_path, size
+
+    async def write_stream(self, key: str, chunks: AsyncIterator[bytes]) -> str:
+        tmp_path, _ = await self._write_tmp(chunks)
+        await asyncio.to_thread(os.replace, tmp_path, self.path_for(key))
+        return self.url_for(key)
+
+    async def save(self, upload: UploadFile, budget: UploadBudget) -> str:
+        hasher = hashlib.sha256()
+        tmp_path, size = await self._write_tmp(iter_upload(upload, budget, hasher))
+        digest = hasher.hexdigest()
+        existing = await self.claim(digest)
+        if existing:
+            await asyncio.to_thread(_remove_quietly, tmp_path)
+            return existing
+        key = content_key(digest, upload.filename)
+        path = self.path_for(key)
+        published = await asyncio.to_thread(_publish, tmp_path, path)
+        url = self.url_for(key)
+        await self.register(digest, url, size, upload.content_type)
+        if not published:
+            # The file we found may belong to a release that ran before our
+            # register; now that we hold a reference, make sure it is still there.
+            await asyncio.to_thread(_restore_or_discard, tmp_path, path)
+        return url
+
+    async def move_aside(self, key: str) -> Optional[str]:
+        released = os.path.join(self.tmp_folder, f"{uuid.uuid4().hex}.released")
+        try:
+            await asyncio.to_thread(os.replace, self.path_for(key), released)
+        except FileNotFoundError:
+            return None
+        return released
+
+    async def restore(self, handle: str, key: str):
+        await asyncio.to_thread(os.replace, handle, self.path_for(key))
+
+    async def discard(self, handle: str):
+        await asyncio.to_thread(_remove_quietly, handle)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(_remove_quietly, self.path_for(key))
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.folder, key)
+
+    async def read_bytes(self, key: str) -> bytes:
+        return await asyncio.to_thread(_read_file, self.path_for(key))
+
+    async def write_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> str:
+        async def _single():
+            yield data
+        return await self.write_stream(key, _single())
+
+
+class CircuitBreaker:
+    """Trips after consecutive failures so callers can skip a degraded dependency.
+
+    While open, ``allow()`` returns False until ``reset_after`` seconds have
+    passed; then a single trial call is let through (half-open). A success
+    closes the breaker, a failure re-opens it. Callers release the trial in a
+    ``finally`` (``release_trial``) so a cancelled or rejected call that
+    recorded neither outcome doesn't leave the breaker waiting on it forever.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_after: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Let the next half-open call through; a no-op once an outcome was recorded."""
+        self._trial_in_flight = False
+
+
+class S3Storage(StorageBackend):
+    """Streams uploads to S3 through one long-lived, pooled boto3 client.
+
+    Files up to ``part_size`` go out as a single ``put_object``; larger files
+    become a multipart upload so at most one part is buffered at a time. If
+    S3 fails, or the circuit breaker is open, the upload is (re)played from
+    the start into ``fallback`` (normally local disk).
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        region: str = "",
+        client_factory=None,
+        fallback: Optional[LocalStorage] = None,
+        endpoint_url: str = "",
+        part_size: int = 8 * 1024 * 1024,
+        breaker: Optional[CircuitBreaker] = None,
+        index: Optional[ContentIndex] = None,
+    ):
+        self.bucket = bucket
+        self.index = index
+        self.region = region
+        self.client_factory = client_factory
+        self.fallback = fallback
+        self.endpoint_url = endpoint_url.rstrip("/")
+        # S3 rejects multipart parts smaller than 5 MB (except the last one)
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # boto3 clients are thread-safe; build one and share its connection pool
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.client_factory()
+        return self._client
+
+    def url_for(self, key: str) -> str:
+        if self.endpoint_url:
+            return f"{self.endpoint_url}/{self.bucket}/{key}"
+        if self.region:
+            return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+        return f"https://{self.bucket}.s3.amazonaws.com/{key}"
+
+    async def _upload(self, upload: UploadFile, budget: UploadBudget) -> str:
+        extra_args = {"ContentType": upload.content_type} if upload.content_type else {}
+        client = await asyncio.to_thread(lambda: self.client)
+        hasher = hashlib.sha256()
+        size = 0
+        part = bytearray()
+        parts = []
+        # Multipart uploads start before the digest is known, so they go to a
+        # staging key and are copied to the content key once complete
+        staging_key = f"incoming/{uuid.uuid4().hex}"
+        upload_id = None
+        staged = False
+        try:
+            async for chunk in iter_upload(upload, budget, hasher):
+                size += len(chunk)
+                part += chunk
+                if len(part) >= self.part_size:
+                    if upload_id is None:
+                        resp = await asyncio.to_thread(
+                            client.create_multipart_upload, Bucket=self.bucket, Key=staging_key, **extra_args
+                        )
+                        upload_id = resp["UploadId"]
+                    parts.append(await self._upload_part(client, staging_key, upload_id, len(parts) + 1, bytes(part)))
+                    part = bytearray()
+
+            digest = hasher.hexdigest()
+            existing = await self.claim(digest)
+            if existing:
+                if upload_id is not None:
+                    await self._abort(client, staging_key, upload_id)
+                return existing
+
+            key = content_key(digest, upload.filename)
+            if upload_id is None:
+                source = {"Body": bytes(part), **extra_args}
+                await asyncio.to_thread(client.put_object, Bucket=self.bucket, Key=key, **source)
+            else:
+                if part:
+                    parts.append(await self._upload_part(client, staging_key, upload_id, len(parts) + 1, bytes(part)))
+                await asyncio.to_thread(
+                    client.complete_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=staging_key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+                upload_id = None
+                staged = True
+                source = {"CopySource": {"Bucket": self.bucket, "Key": staging_key}}
+                await asyncio.to_thread(client.copy_object, Bucket=self.bucket, Key=key, **source)
+            url = self.url_for(key)
+            await self.register(digest, url, size, upload.content_type)
+            # A release of the same content may have removed the object before
+            # our register; now that we hold a reference, write it again if so
+            try:
+                if not await self._exists(client, key):
+                    write = client.put_object if "Body" in source else client.copy_object
+                    await asyncio.to_thread(write, Bucket=self.bucket, Key=key, **source)
+            except BaseException:
+                await self.release(url)
+                raise
+        except BaseException:
+            if upload_id is not None:
+                await self._abort(client, staging_key, upload_id)
+            raise
+        finally:
+            if staged:
+                await self._delete_quietly(client, staging_key)
+        return url
+
+    async def _exists(self, client, key: str) -> bool:
+        try:
+            await asyncio.to_thread(client.head_object, Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if str(getattr(e, "response", {}).get("Error", {}).get("Code")) in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def _delete_quietly(self, client, key: str):
+        try:
+            await asyncio.to_thread(client.delete_object, Bucket=self.bucket, Key=key)
+        except Exception:
+            pass
+
+    async def _abort(self, client, key: str, upload_id: str):
+        try:
+            await asyncio.to_thread(client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except Exception:
+            pass
+
+    async def _upload_part(self, client, key: str, upload_id: str, number: int, body: bytes) -> dict:
+        resp = await asyncio.to_thread(
+            client.upload_part, Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+        )
+        return {"ETag": resp["ETag"], "PartNumber": number}
+
+    async def read_bytes(self, key: str) -> bytes:
+        client = await asyncio.to_thread(lambda: self.client)
+
+        def _get():
+            return client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        return await asyncio.to_thread(_get)
+
+    async def write_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> str:
+        if self.breaker.allow():
+            extra_args = {"ContentType": content_type} if content_type else {}
+            try:
+                client = await asyncio.to_thread(lambda: self.client)
+                await asyncio.to_thread(client.put_object, Bucket=self.bucket, Key=key, Body=data, **extra_args)
+                self.breaker.record_success()
+                return self.url_for(key)
+            except Exception:
+                self.breaker.record_failure()
+                if self.fallback is None:
+                    raise
+            finally:
+                self.breaker.release_trial()
+        elif self.fallback is None:
+            raise HTTPException(status_code=503, detail="Image storage temporarily unavailable")
+        return await self.fallback.write_bytes(key, data, content_type)
+
+    async def delete(self, key: str):
+        client = await asyncio.to_thread(lambda: self.client)
+        await asyncio.to_thread(client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def release(self, url: str):
+        if self.fallback is not None and self.fallback.owns(url):
+            return await self.fallback.release(url)
+        return await super().release(url)
+
+    async def delete_url(self, url: str):
+        # Variants written while S3 was down live on the fallback
+        if self.fallback is not None and self.fallback.owns(url):
+            return await self.fallback.delete_url(url)
+        return await super().delete_url(url)
+
+    async def move_aside(self, key: str) -> Optional[str]:
+        client = await asyncio.to_thread(lambda: self.client)
+        if not await self._exists(client, key):
+            return None
+        released = f"released/{uuid.uuid4().hex}"
+        await asyncio.to_thread(
+            client.copy_object, Bucket=self.bucket, Key=released, CopySource={"Bucket": self.bucket, "Key": key}
+        )
+        await asyncio.to_thread(client.delete_object, Bucket=self.bucket, Key=key)
+        return released
+
+    async def restore(self, handle: str, key: str):
+        client = await asyncio.to_thread(lambda: self.client)
+        await asyncio.to_thread(
+            client.copy_object, Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": handle}
+        )
+        await self._delete_quietly(client, handle)
+
+    async def discard(self, handle: str):
+        client = await asyncio.to_thread(lambda: self.client)
+        await self._delete_quietly(client, handle)
+
+    async def save(self, upload: UploadFile, budget: UploadBudget) -> str:
+        if not self.breaker.allow():
+            if self.fallback is None:
+                raise HTTPException(status_code=503, detail="Image storage temporarily unavailable")
+            return await self.fallback.save(upload, budget)
+        try:
+            url = await self._upload(upload, budget)
+            self.breaker.record_success()
+            return url
+        except HTTPException:
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            if self.fallback is None:
+                raise
+        finally:
+            # A 413 or a cancelled sibling upload says nothing about S3's health
+            self.breaker.release_trial()
+        # Replay the (already spooled) UploadFile from the start into the fallback
+        budget.refund(id(upload))
+        await upload.seek(0)
+        return await self.fallback.save(upload, budget)
+
+
+async def store_many(backend: StorageBackend, uploads: List[UploadFile], budget: UploadBudget, concurrency: int = 4) -> List[str]:
+    """Store several uploads concurrently, preserving their order in the result.
+
+    If any upload fails (e.g. 413 over the budget) the others are cancelled,
+    and references taken by the ones that already succeeded are released
+    again so a rejected request leaves nothing behind.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(upload: UploadFile) -> str:
+        async with semaphore:
+            return await backend.save(upload, budget)
+
+    tasks = [asyncio.ensure_future(_one(u)) for u in uploads]
+    if not tasks:
+        return []
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    errors = [t.exception() for t in tasks if not t.cancelled() and t.exception() is not None]
+    if errors or any(t.cancelled() for t in tasks):
+        for t in tasks:
+            if not t.cancelled() and t.exception() is None:
+                try:
+                    await backend.release(t.result())
+                except Exception:
+                    pass
+        raise errors[0] if errors else asyncio.CancelledError()
+    return [t.result() for t in tasks]
@@ -0,0 +1,149 @@
+"""
+Spoken-symbol normalisation for voice transcripts.
+
+"open parenthesis" -> "(", "double equals" -> "==", "question mark" -> "?"...
+
+All spoken forms of a vocabulary are compiled into one alternation (longest
+phrase first, so "double equals" wins over "equals") and every match is
+resolved through a lookup table, so a transcript is rewritten in a single
+pass instead of one ``re.sub`` per symbol.
+
+Vocabularies are per language. English is always active; other languages
+(Hindi and Kannada spoken forms below, or anything added with
+``register_vocabulary``) are layered on top when Whisper reports that
+language. Word boundaries also count Indic letters and vowel signs, which
+``\\b`` does not, so e.g. "डॉट" is only replaced as a whole word.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Optional
+
+ENGLISH = {
+    "open parenthesis": "(",
+    "close parenthesis": ")",
+    "open square bracket": "[",
+    "close square bracket": "]",
+    "open curly brace": "{",
+    "close curly brace": "}",
+    "semicolon": ";",
+    "colon": ":",
+    "comma": ",",
+    "period": ".",
+    "dot": ".",
+    "plus equals": "+=",
+    "minus equals": "-=",
+    "double equals": "==",
+    "equals": "=",
+    "greater than": ">",
+    "less than": "<",
+    "slash": "/",
+    "backslash": "\\",
+    "percent": "%",
+    "dollar sign": "$",
+    "at sign": "@",
+    "hash": "#",
+    "pound": "#",
+    "ampersand": "&",
+    "asterisk": "*",
+    "star": "*",
+    "underscore": "_",
+    "hyphen": "-",
+    "dash": "-",
+    "question mark": "?",
+    "exclamation mark": "!",
+}
+
+HINDI = {
+    "पूर्ण विराम": "।",
+    "अल्पविराम": ",",
+    "कॉमा": ",",
+    "डॉट": ".",
+    "कोलन": ":",
+    "प्रश्नवाचक चिह्न": "?",
+    "विस्मयादिबोधक चिह्न": "!",
+    "प्रतिशत": "%",
+    "स्लैश": "/",
+    "डैश": "-",
+    "हैश": "#",
+}
+
+KANNADA = {
+    "ಪೂರ್ಣ ವಿರಾಮ": ".",
+    "ಪೂರ್ಣವಿರಾಮ": ".",
+    "ಅಲ್ಪವಿರಾಮ": ",",
+    "ಕಾಮಾ": ",",
+    "ಡಾಟ್": ".",
+    "ಕೋಲನ್": ":",
+    "ಪ್ರಶ್ನಾರ್ಥಕ ಚಿಹ್ನೆ": "?",
+    "ಆಶ್ಚರ್ಯಸೂಚಕ ಚಿಹ್ನೆ": "!",
+    "ಶೇಕಡಾ": "%",
+    "ಸ್ಲ್ಯಾಶ್": "/",
+    "ಡ್ಯಾಶ್": "-",
+}
+
+VOCABULARIES: Dict[str, Dict[str, str]] = {"en": ENGLISH, "hi": HINDI, "kn": KANNADA}
+# Whisper's verbose_json reports full language names
+LANGUAGE_ALIASES = {"english": "en", "hindi": "hi", "kannada": "kn"}
+
+# Latin word characters plus the Devanagari..Kannada blocks (letters *and* vowel signs)
+WORD_CHARS = r"\w\u0900-\u0D7F"
+
+
+def _key(phrase: str) -> str:
+    return " ".join(phrase.lower().split())
+
+
+class SymbolNormalizer:
+    def __init__(self, vocabulary: Dict[str, str]):
+        self.table = {_key(spoken): symbol for spoken, symbol in vocabulary.items()}
+        phrases = sorted(self.table, key=len, reverse=True)
+        alternation = "|".join(r"\s+".join(map(re.escape, p.split())) for p in phrases)
+        self.pattern = re.compile(rf"(?<![{WORD_CHARS}])(?:{alternation})(?![{WORD_CHARS}])", re.IGNORECASE)
+
+    def _replace(self, match: "re.Match") -> str:
+        return self.table.get(_key(match.group(0)), match.group(0))
+
+    def __call__(self, text: str) -> str:
+        if not text:
+            return text
+        return self.pattern.sub(self._replace, text)
+
+
+def language_code(language: Optional[str]) -> Optional[str]:
+    if not language:
+        return None
+    language = language.strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+def register_vocabulary(language: str, vocabulary: Dict[str, str]):
+    """Add (or extend) the spoken forms for a language."""
+    code = language_code(language)
+    VOCABULARIES[code] = {**VOCABULARIES.get(code, {}), **vocabulary}
+    _normalizer.cache_clear()
+
+
+@lru_cache(maxsize=32)
+def _normalizer(code: str) -> SymbolNormalizer:
+    vocabulary = dict(VOCABULARIES["en"])
+    if code != "en":
+        vocabulary.update(VOCABULARIES.get(code, {}))
+    return SymbolNormalizer(vocabulary)
+
+
+def normalizer_for(language: Optional[str] = None) -> SymbolNormalizer:
+    return _normalizer(language_code(language) or "en")
+
+
+normalizer_for()  # compile the English pattern at import time
+
+
+def normalize_spoken_symbols(text: str, language: Optional[str] = None) -> str:
+    """
+    Convert spoken programming/special symbols to actual symbols:
+    - "open parenthesis" → "("
+    - "close bracket" → "]"
+    - "colon" → ":"
+    - etc.
+    """
+    return normalizer_for(language)(text)
@@ -2,8 +2,12 @@
 Telegram Bot Integration for GramaFix Issue Notifications
 Free, instant notifications via Telegram
 """
+import asyncio
 import os
 import logging
+import random
+import time
+from collections import OrderedDict
 from typing import Optional
 import httpx
 
@@ -12,7 +16,179 @@ logger = logging.getLogger(__name__)
 # Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 ENABLE_TELEGRAM = os.getenv("ENABLE_TELEGRAM_NOTIFICATIONS", "true").lower() == "true"
-TELEGRAM_API_BASE = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+# Point at a local fake Bot API server for testing
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+TELEGRAM_API_BASE = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}"
+# Telegram allows ~30 messages/s overall and ~1 message/s to the same chat
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "4"))
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "20"))
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def idle(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class TelegramDispatcher:
+    """
+    Long-lived Bot API client: one keep-alive connection pool, global and
+    per-chat rate limiting, and retries with jittered backoff that honour
+    Telegram's ``retry_after`` on 429.
+    """
+
+    def __init__(
+        self,
+        api_base: str = TELEGRAM_API_BASE,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        max_retries: int = TELEGRAM_MAX_RETRIES,
+        max_connections: int = TELEGRAM_MAX_CONNECTIONS,
+        timeout: float = 10.0,
+        max_chat_buckets: int = 10000,
+    ):
+        self.api_base = api_base
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_chat_buckets = max_chat_buckets
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+        self.metrics = {
+            "sent": 0,
+            "failed": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "in_flight": 0,
+            "total_ms": 0.0,
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_base,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, 1)
+            self.chat_buckets[chat_id] = bucket
+            # Forget the oldest chats that have fully refilled
+            while len(self.chat_buckets) > self.max_chat_buckets:
+                oldest_id, oldest = next(iter(self.chat_buckets.items()))
+                if not oldest.idle():
+                    break
+                self.chat_buckets.pop(oldest_id)
+        else:
+            self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, 0.5 * 2^attempt], capped
+        return random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+
+    async def call(self, method: str, payload: dict, chat_id: Optional[str] = None) -> Optional[dict]:
+        """POST a Bot API method; returns the decoded response or None after giving up."""
+        self.metrics["in_flight"] += 1
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                if chat_id is not None:
+                    await self._chat_bucket(str(chat_id)).acquire()
+                await self.global_bucket.acquire()
+                delay = None
+                try:
+                    response = await self._get_client().post(f"/{method}", json=payload)
+                except httpx.TransportError as e:
+                    logger.warning(f"Telegram {method} transport error: {e}")
+                    delay = self._backoff(attempt)
+                else:
+                    if response.status_code == 200:
+                        self.metrics["sent"] += 1
+                        return response.json()
+                    if response.status_code == 429:
+                        self.metrics["rate_limited"] += 1
+                        try:
+                            retry_after = response.json().get("parameters", {}).get("retry_after")
+                        except Exception:
+                            retry_after = None
+                        delay = float(retry_after) if retry_after else self._backoff(attempt)
+                    elif response.status_code >= 500:
+                        delay = self._backoff(attempt)
+                    else:
+                        # 400/403 etc. (bad chat id, bot blocked): retrying won't help
+                        logger.error(f"Failed to send Telegram {method}: {response.status_code} - {response.text}")
+                        break
+                if attempt < self.max_retries:
+                    self.metrics["retries"] += 1
+                    await asyncio.sleep(delay)
+            self.metrics["failed"] += 1
+            return None
+        finally:
+            self.metrics["in_flight"] -= 1
+            self.metrics["total_ms"] += (time.perf_counter() - started) * 1000
+
+    async def send(self, chat_id: str, message: str, parse_mode: str = "HTML") -> bool:
+        result = await self.call(
+            "sendMessage",
+            {
+                "chat_id": chat_id,
+                "text": message,
+                "parse_mode": parse_mode,
+                "disable_web_page_preview": True
+            },
+            chat_id=chat_id,
+        )
+        return result is not None
+
+    def stats(self) -> dict:
+        done = self.metrics["sent"] + self.metrics["failed"]
+        out = {k: v for k, v in self.metrics.items() if k != "total_ms"}
+        out["avg_ms"] = round(self.metrics["total_ms"] / done, 1) if done else 0.0
+        out["tracked_chats"] = len(self.chat_buckets)
+        return out
+
+
+dispatcher = TelegramDispatcher()
+
+
+async def close_telegram_dispatcher():
+    await dispatcher.aclose()
 
 
 async def send_telegram_message(chat_id: str, message: str, parse_mode: str = "HTML") -> bool:
@@ -36,25 +212,10 @@ async def send_telegram_message(chat_id: str, message: str, parse_mode: str = "H
         return False
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{TELEGRAM_API_BASE}/sendMessage",
-                json={
-                    "chat_id": chat_id,
-                    "text": message,
-                    "parse_mode": parse_mode,
-                    "disable_web_page_preview": True
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Telegram message sent successfully to {chat_id}")
-                return True
-            else:
-                logger.error(f"Failed to send Telegram message: {response.status_code} - {response.text}")
-                return False
-                
+        sent = await dispatcher.send(chat_id, message, parse_mode)
+        if sent:
+            logger.info(f"Telegram message sent successfully to {chat_id}")
+        return sent
     except Exception as e:
         logger.error(f"Error sending Telegram message: {str(e)}")
         return False
@@ -80,10 +241,8 @@ Thank you for helping improve your community! 🙏
     return await send_telegram_message(chat_id, message)
 
 
-async def notify_status_update(chat_id: str, issue_data: dict, new_status: str, old_status: str) -> bool:
-    """
-    Send notification when issue status changes
-    """
+def status_update_message(issue_data: dict, new_status: str, old_status: str, voter: bool = False) -> str:
+    """Status change text for the reporter, or (``voter=True``) for someone who upvoted the issue."""
     status_emoji = {
         "Received": "📥",
         "In Progress": "⚙️",
@@ -92,9 +251,10 @@ async def notify_status_update(chat_id: str, issue_data: dict, new_status: str,
     }
     
     emoji = status_emoji.get(new_status, "📢")
+    title = "An Issue You Supported Was Updated!" if voter else "Issue Status Updated!"
     
     message = f"""
-{emoji} <b>Issue Status Updated!</b>
+{emoji} <b>{title}</b>
 
 🆔 <b>Issue ID:</b> {issue_data.get('issue_id', 'N/A')}
 📋 <b>Category:</b> {issue_data.get('category', 'N/A')}
@@ -106,7 +266,12 @@ async def notify_status_update(chat_id: str, issue_data: dict, new_status: str,
 📍 <b>Location:</b> {issue_data.get('gram_panchayat', 'N/A')}
 """
     
-    if new_status == "Resolved":
+    if voter:
+        if new_status == "Resolved":
+            message += "\n✨ This issue has been resolved. Thank you for raising its priority!"
+        else:
+            message += "\n👍 Thanks for voting - community support helps prioritize action."
+    elif new_status == "Resolved":
         message += "\n✨ Great news! Your issue has been resolved. Thank you for your patience!"
     elif new_status == "In Progress":
         message += "\n⚡ Good news! We're working on your issue now."
@@ -114,8 +279,20 @@ async def notify_status_update(chat_id: str, issue_data: dict, new_status: str,
         message += "\n❌ Unfortunately, this issue cannot be processed. Please contact support for details."
     
     message += "\n\n🔗 <i>View full details on GramaFix</i>"
-    
-    return await send_telegram_message(chat_id, message)
+    return message
+
+
+async def notify_status_update(chat_id: str, issue_data: dict, new_status: str, old_status: str) -> bool:
+    """
+    Send notification when issue status changes
+    """
+    return await send_telegram_message(chat_id, status_update_message(issue_data, new_status, old_status))
+
+
+async def send_telegram_batch(messages) -> int:
+    """Send ``(chat_id, text)`` pairs concurrently; the dispatcher applies the rate limits. Returns how many were sent."""
+    results = await asyncio.gather(*(send_telegram_message(chat_id, text) for chat_id, text in messages))
+    return sum(1 for ok in results if ok)
 
 
 async def notify_high_votes(chat_id: str, issue_data: dict, vote_count: int) -> bool:
@@ -165,13 +342,7 @@ async def verify_telegram_chat(chat_id: str) -> bool:
         return False
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{TELEGRAM_API_BASE}/getChat",
-                json={"chat_id": chat_id},
-                timeout=5.0
-            )
-            return response.status_code == 200
+        return await dispatcher.call("getChat", {"chat_id": chat_id}) is not None
     except Exception as e:
         logger.error(f"Error verifying Telegram chat: {str(e)}")
         return False
@@ -35,7 +35,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 {"_id": ObjectId(user_id)},
                 {"$set": {
                     "telegram_chat_id": chat_id,
-                    "telegram_connected_at": datetime.now()
+                    "telegram_connected_at": datetime.utcnow()
                 }}
             )
             
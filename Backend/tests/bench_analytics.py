@@ -0,0 +1,119 @@
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics import facet_pipeline, shape_facet_result  # noqa: E402
+
+MONGO_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB", "GramaFix_bench")
+N_ISSUES = int(os.getenv("BENCH_ISSUES", "200000"))
+RUNS = int(os.getenv("BENCH_RUNS", "7"))
+
+# Benchmark: sequential count_documents analytics vs a single $facet pipeline.
+# - Seeds BENCH_ISSUES synthetic issues into a scratch database (dropped at the end)
+# - Times both implementations unfiltered and filtered by gram_panchayat
+# Requires a running MongoDB (MONGODB_URI).
+
+CATEGORIES = [
+    {"name": "Roads", "icon": "🛣"},
+    {"name": "Water", "icon": "💧"},
+    {"name": "Electricity", "icon": "💡"},
+    {"name": "School", "icon": "🏫"},
+    {"name": "Farming", "icon": "🚜"},
+    {"name": "Sanitation", "icon": "🗑"},
+]
+STATUSES = ["Received", "In Progress", "Resolved"]
+PANCHAYATS = [f"GP{i}" for i in range(50)]
+
+
+async def seed(coll):
+    await coll.drop()
+    now = datetime.utcnow()
+    batch = []
+    for i in range(N_ISSUES):
+        batch.append({
+            "category": random.choice(CATEGORIES)["name"],
+            "description": "Synthetic issue %d " % i + "x" * random.randint(20, 300),
+            "status": random.choice(STATUSES),
+            "priority_votes": random.randint(0, 500),
+            "gram_panchayat": random.choice(PANCHAYATS),
+            "created_at": now - timedelta(minutes=random.randint(0, 60 * 24 * 365 * 2)),
+        })
+        if len(batch) == 10000:
+            await coll.insert_many(batch)
+            batch = []
+    if batch:
+        await coll.insert_many(batch)
+    await coll.create_index([("created_at", -1), ("_id", -1)])
+    await coll.create_index("gram_panchayat")
+    await coll.create_index("category")
+    await coll.create_index("status")
+
+
+async def legacy_analytics(coll, query, trend_days=14):
+    """The previous implementation: ~12 sequential round trips."""
+    total_issues = await coll.count_documents(query)
+    received = await coll.count_documents({**query, "status": "Received"})
+    in_progress = await coll.count_documents({**query, "status": "In Progress"})
+    resolved = await coll.count_documents({**query, "status": "Resolved"})
+    category_stats = []
+    for cat in CATEGORIES:
+        count = await coll.count_documents({**query, "category": cat["name"]})
+        category_stats.append({"category": cat["name"], "icon": cat["icon"], "count": count})
+    top_issues = []
+    async for issue in coll.find(query).sort("priority_votes", -1).limit(5):
+        top_issues.append({"id": str(issue["_id"]), "votes": issue["priority_votes"]})
+    trend = []
+    pipeline = [
+        {"$match": query},
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+    async for row in coll.aggregate(pipeline):
+        trend.append({"date": row.get("_id"), "count": row.get("count", 0)})
+    trend = trend[-trend_days:]
+    return {"total_issues": total_issues, "status": (received, in_progress, resolved), "categories": category_stats, "top": top_issues, "trend": trend}
+
+
+async def facet_analytics(coll, query, trend_days=14):
+    rows = await coll.aggregate(facet_pipeline(query, trend_days)).to_list(length=1)
+    return shape_facet_result(rows[0] if rows else {}, CATEGORIES)
+
+
+async def timed(fn, *args):
+    samples = []
+    result = None
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        result = await fn(*args)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URI)
+    coll = client[BENCH_DB]["issues"]
+    try:
+        print(f"Seeding {N_ISSUES} issues into {BENCH_DB}.issues ...")
+        await seed(coll)
+        for label, query in (("all issues", {}), ("one panchayat", {"gram_panchayat": "GP7"})):
+            legacy_ms, legacy = await timed(legacy_analytics, coll, query)
+            facet_ms, facet = await timed(facet_analytics, coll, query)
+            assert legacy["total_issues"] == facet["total_issues"], (legacy["total_issues"], facet["total_issues"])
+            assert [c["count"] for c in legacy["categories"]] == [c["count"] for c in facet["category_breakdown"][:len(CATEGORIES)]]
+            assert legacy["trend"] == facet["trend"]
+            print(f"{label:>14}: sequential {legacy_ms:8.1f} ms | $facet {facet_ms:8.1f} ms | speedup x{legacy_ms / facet_ms:.1f}")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
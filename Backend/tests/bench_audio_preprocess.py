@@ -0,0 +1,105 @@
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.effects import normalize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_preprocess import SilentAudioError, preprocess  # noqa: E402
+
+RUNS = int(os.getenv("BENCH_RUNS", "5"))
+CLIP_SECONDS = [int(s) for s in os.getenv("BENCH_SECONDS", "10,60,300").split(",")]
+# Production decodes every upload to this rate before preprocessing, so both sides get it
+RATE = 16000
+# Voice notes start with a pause and often run on after the speaker is done
+LEAD_SILENCE, TAIL_SILENCE = 0.2, 0.3
+
+# Benchmark of the trim/normalise stage alone: pydub 10 ms dBFS walk
+# (previous /api/transcribe preprocessing) vs. NumPy gate + frame-RMS trim.
+# - Synthesises 16 kHz mono clips: 20% near-silence, speech-like bursts,
+#   30% near-silence (no resampling on either side)
+# - Checks both find roughly the same speech span, that quietly recorded speech
+#   (around -49 and -55 dBFS RMS) is kept, and that digital silence and
+#   low-level hiss are rejected
+# Requires numpy and pydub (no ffmpeg needed: clips are built from raw PCM).
+
+
+def synth_clip(seconds: int, gain: float = 0.25) -> AudioSegment:
+    rng = np.random.default_rng(seconds)
+    lead, tail = int(LEAD_SILENCE * seconds * RATE), int(TAIL_SILENCE * seconds * RATE)
+    body = max(RATE, seconds * RATE - lead - tail)
+    t = np.arange(body) / RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2  # syllable-ish amplitude modulation
+    speech = envelope * (0.3 * np.sin(2 * np.pi * 220 * t) + 0.1 * rng.standard_normal(body))
+    mono = np.concatenate([0.0005 * rng.standard_normal(lead), speech, 0.0005 * rng.standard_normal(tail)])
+    return AudioSegment((mono * gain * 32767).astype("<i2").tobytes(), frame_rate=RATE, sample_width=2, channels=1)
+
+
+def legacy_preprocess(audio: AudioSegment):
+    audio = normalize(audio)
+    audio = audio + 3
+
+    def detect_leading_silence(sound, silence_threshold=-40.0, chunk_size=10):
+        trim_ms = 0
+        while sound[trim_ms:trim_ms + chunk_size].dBFS < silence_threshold and trim_ms < len(sound):
+            trim_ms += chunk_size
+        return trim_ms
+
+    start_trim = detect_leading_silence(audio)
+    end_trim = detect_leading_silence(audio.reverse())
+    duration = len(audio)
+    if start_trim < duration and end_trim < duration:
+        audio = audio[start_trim:duration - end_trim]
+    return start_trim, end_trim, len(audio)
+
+
+def numpy_preprocess(audio: AudioSegment):
+    pcm, info = preprocess(np.array(audio.get_array_of_samples()), audio.frame_rate, audio.channels, audio.sample_width)
+    return info["trimmed_start_ms"], info["trimmed_end_ms"], info["duration_ms"]
+
+
+def timed(fn, *args):
+    samples = []
+    result = None
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    for seconds in CLIP_SECONDS:
+        clip = synth_clip(seconds)
+        legacy_ms, legacy = timed(legacy_preprocess, clip)
+        numpy_ms, fast = timed(numpy_preprocess, clip)
+        # Thresholds differ by the legacy +3 dB boost, so allow a little slack
+        assert abs(legacy[0] - fast[0]) <= 100 and abs(legacy[1] - fast[1]) <= 100, (legacy, fast)
+        print(f"{seconds:>4}s clip: pydub {legacy_ms:9.1f} ms | numpy {numpy_ms:7.1f} ms | speedup x{legacy_ms / numpy_ms:.1f} | trim {fast[0]}/{fast[1]} ms")
+
+    loud = numpy_preprocess(synth_clip(10))
+    for gain in (0.028, 0.014):
+        clip = synth_clip(10, gain)
+        quiet = numpy_preprocess(clip)
+        assert abs(quiet[0] - loud[0]) <= 100 and abs(quiet[1] - loud[1]) <= 100, (quiet, loud)
+        print(f"quiet speech at {clip.dBFS:.1f} dBFS kept: trim {quiet[0]}/{quiet[1]} ms")
+
+    rng = np.random.default_rng(0)
+    hiss = (0.001 * rng.standard_normal(3 * RATE) * 32767).astype("<i2")  # about -60 dBFS
+    rejected = {
+        "digital silence": AudioSegment.silent(duration=3000, frame_rate=RATE),
+        "low-level hiss": AudioSegment(hiss.tobytes(), frame_rate=RATE, sample_width=2, channels=1),
+    }
+    for name, clip in rejected.items():
+        try:
+            numpy_preprocess(clip)
+            raise AssertionError(f"{name} was not rejected")
+        except SilentAudioError as e:
+            print(f"{name} rejected: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from symbols import ENGLISH, normalize_spoken_symbols, register_vocabulary  # noqa: E402
+
+RUNS = int(os.getenv("BENCH_RUNS", "5"))
+TRANSCRIPTS = int(os.getenv("BENCH_TRANSCRIPTS", "2000"))
+
+# Correctness + microbenchmark for the spoken-symbol normaliser:
+# - the single-pass engine gives the same output as the previous 28-pass
+#   re.sub implementation (copied below) on a random corpus of transcripts
+# - longest match wins, case and spacing are tolerated
+# - Hindi/Kannada vocabularies apply only to their language, on whole words
+# - times both over the corpus
+# Stdlib only.
+
+
+def legacy_normalize(text: str) -> str:
+    if not text:
+        return text
+    patterns = [
+        (r"\bopen\s+parenthesis\b", "("),
+        (r"\bclose\s+parenthesis\b", ")"),
+        (r"\bopen\s+square\s+bracket\b", "["),
+        (r"\bclose\s+square\s+bracket\b", "]"),
+        (r"\bopen\s+curly\s+brace\b", "{"),
+        (r"\bclose\s+curly\s+brace\b", "}"),
+        (r"\bsemicolon\b", ";"),
+        (r"\bcolon\b", ":"),
+        (r"\bcomma\b", ","),
+        (r"\bperiod\b|\bdot\b", "."),
+        (r"\bplus\s+equals\b", "+="),
+        (r"\bminus\s+equals\b", "-="),
+        (r"\bdouble\s+equals\b", "=="),
+        (r"\bequals\b", "="),
+        (r"\bgreater\s+than\b", ">"),
+        (r"\bless\s+than\b", "<"),
+        (r"\bslash\b", "/"),
+        (r"\bbackslash\b", "\\\\"),
+        (r"\bpercent\b", "%"),
+        (r"\bdollar\s+sign\b", "$"),
+        (r"\bat\s+sign\b", "@"),
+        (r"\bhash\b|\bpound\b", "#"),
+        (r"\bampersand\b", "&"),
+        (r"\basterisk\b|\bstar\b", "*"),
+        (r"\bunderscore\b", "_"),
+        (r"\bhyphen\b|\bdash\b", "-"),
+        (r"\bquestion\s+mark\b", "?"),
+        (r"\bexclamation\s+mark\b", "!"),
+    ]
+    result = text
+    for pattern, replacement in patterns:
+        result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
+    return result
+
+
+FILLER = (
+    "the handpump near the school is broken since monday water is dirty "
+    "street light pole number twelve not working please send someone road "
+    "has a big pothole near the temple dotted stardust hashtag dashboard"
+).split()
+
+
+def corpus(n: int):
+    rng = random.Random(7)
+    spoken = list(ENGLISH)
+    texts = []
+    for _ in range(n):
+        words = []
+        for _ in range(rng.randint(15, 60)):
+            if rng.random() < 0.15:
+                phrase = rng.choice(spoken)
+                phrase = phrase.upper() if rng.random() < 0.1 else phrase
+                words.append(phrase.replace(" ", rng.choice([" ", "  ", "\t"])))
+            else:
+                words.append(rng.choice(FILLER))
+        texts.append(" ".join(words) + rng.choice(["", ".", " period", "?"]))
+    return texts
+
+
+def timed(fn, texts):
+    samples = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    texts = corpus(TRANSCRIPTS)
+    mismatches = [t for t in texts if legacy_normalize(t) != normalize_spoken_symbols(t)]
+    assert not mismatches, f"{len(mismatches)} mismatches, e.g. {mismatches[0]!r}"
+    print(f"{len(texts)} transcripts: identical to the previous implementation")
+
+    cases = [
+        ("if x double equals y", None, "if x == y"),
+        ("count Plus  Equals one", None, "count += one"),
+        ("a backslash n", None, "a \\ n"),
+        ("dotted line dot", None, "dotted line ."),
+        ("नल टूटा है पूर्ण विराम पचास प्रतिशत", "hindi", "नल टूटा है । पचास %"),
+        ("डॉटर डॉट", "hindi", "डॉटर ."),
+        ("डॉट", "english", "डॉट"),
+        ("ನೀರು ಬರುತ್ತಿಲ್ಲ ಪೂರ್ಣವಿರಾಮ", "kannada", "ನೀರು ಬರುತ್ತಿಲ್ಲ ."),
+        ("comma डॉट", "hi", ", ."),
+        ("", None, ""),
+    ]
+    for text, language, expected in cases:
+        got = normalize_spoken_symbols(text, language)
+        assert got == expected, (text, language, got, expected)
+    register_vocabulary("tamil", {"புள்ளி": "."})
+    assert normalize_spoken_symbols("புள்ளி comma", "tamil") == ". ,"
+    print(f"{len(cases) + 1} targeted cases pass")
+
+    legacy_ms = timed(legacy_normalize, texts)
+    fast_ms = timed(normalize_spoken_symbols, texts)
+    print(f"legacy {legacy_ms:8.1f} ms | single-pass {fast_ms:7.1f} ms | speedup x{legacy_ms / fast_ms:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from groq import AsyncGroq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asr import HedgedTranscriber  # noqa: E402
+
+# Checks HedgedTranscriber against a local fake Groq transcription server:
+# - a slow primary is hedged after hedge_after and the faster fallback wins
+# - a hallucinated primary ("Thank you.") triggers the fallback immediately
+# - the chosen attempt's text/language are returned (not the last attempt's)
+# - attempts past their deadline time out
+# - with the call cap saturated a slow primary is not hedged
+# - chunks of a long recording run concurrently and are stitched in order
+# - chunked transcription with hedged fallbacks never has more Groq calls in
+#   flight than the transcriber's call cap
+# No network access or API key needed.
+
+# (model, temperature) -> (delay seconds, text)
+SCENARIO = {}
+requests_seen = []
+in_flight = {"now": 0, "peak": 0}
+lock = threading.Lock()
+
+
+class FakeTranscriptions(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        fields = dict(re.findall(rb'name="(model|temperature)"\r\n\r\n([^\r]*)', body))
+        key = (fields.get(b"model", b"").decode(), float(fields.get(b"temperature", b"0") or 0))
+        requests_seen.append(key)
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        delay, text = SCENARIO.get(key, (0, "default"))
+        time.sleep(delay)
+        with lock:
+            in_flight["now"] -= 1
+        data = json.dumps({"text": text, "language": "english", "duration": 2.0, "segments": []}).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client cancelled this attempt
+
+
+async def run(client, **kwargs):
+    t = HedgedTranscriber(**kwargs)
+    t0 = time.perf_counter()
+    result = await t.transcribe(client, "audio.wav", b"RIFF" + b"\0" * 2000, "audio/wav")
+    return result, time.perf_counter() - t0, t.stats()
+
+
+async def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTranscriptions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = AsyncGroq(api_key="test", base_url=f"http://127.0.0.1:{server.server_address[1]}", max_retries=0)
+    try:
+        SCENARIO.clear()
+        SCENARIO[("whisper-large-v3-turbo", 0.0)] = (3.0, "slow primary answer")
+        SCENARIO[("whisper-large-v3", 0.4)] = (0.2, "fast fallback answer")
+        result, elapsed, stats = await run(client, hedge_after=0.5)
+        print(f"slow primary: {result['text']!r} in {elapsed:.2f}s {stats}")
+        assert result["text"] == "fast fallback answer" and elapsed < 1.5 and stats["cancelled"] >= 1
+
+        SCENARIO.clear()
+        SCENARIO[("whisper-large-v3-turbo", 0.0)] = (0.1, "Thank you.")
+        SCENARIO[("whisper-large-v3", 0.4)] = (0.1, "The handpump near the school is broken")
+        result, elapsed, stats = await run(client, hedge_after=5.0)
+        print(f"hallucination: {result['text']!r} in {elapsed:.2f}s {stats}")
+        assert result["text"] == "The handpump near the school is broken" and elapsed < 1.0
+        assert result["language"] == "english" and result["strategy"] == 1
+
+        SCENARIO.clear()
+        for key in (("whisper-large-v3-turbo", 0.0), ("whisper-large-v3", 0.4)):
+            SCENARIO[key] = (2.0, "too slow")
+        result, elapsed, stats = await run(client, hedge_after=0.2, attempt_timeout=0.5, total_timeout=1.5)
+        print(f"deadlines: {result} in {elapsed:.2f}s {stats}")
+        assert result is None and stats["timeouts"] >= 2 and elapsed < 2.0
+
+        SCENARIO.clear()
+        SCENARIO[("whisper-large-v3-turbo", 0.0)] = (1.0, "slow but only answer")
+        requests_seen.clear()
+        result, elapsed, stats = await run(client, hedge_after=0.2, max_concurrent_calls=1)
+        print(f"call cap 1: {result['text']!r} in {elapsed:.2f}s after {len(requests_seen)} request(s) {stats}")
+        assert result["text"] == "slow but only answer" and len(requests_seen) == 1 and stats["hedged"] == 0
+
+        SCENARIO.clear()
+        SCENARIO[("whisper-large-v3-turbo", 0.0)] = (0.5, "part of a long report")
+        chunks = [(i * 40.0, b"RIFF" + b"\0" * 2000) for i in range(6)]
+        t0 = time.perf_counter()
+        result = await HedgedTranscriber(hedge_after=5.0).transcribe_chunks(client, chunks, "audio/wav", concurrency=6)
+        elapsed = time.perf_counter() - t0
+        print(f"chunks: {result['chunks']} chunks, {len(result['segments'])} segments in {elapsed:.2f}s")
+        assert elapsed < 1.5 and result["text"].count("part of a long report") == 6
+        assert [seg["start"] for seg in result["segments"]] == [i * 40.0 for i in range(6)] and result["duration"] == 202.0
+
+        SCENARIO.clear()
+        SCENARIO[("whisper-large-v3-turbo", 0.0)] = (0.2, "Thank you.")
+        SCENARIO[("whisper-large-v3", 0.4)] = (0.2, "part of a long report")
+        requests_seen.clear()
+        in_flight["peak"] = 0
+        capped = HedgedTranscriber(hedge_after=0.1, max_concurrent_calls=2)
+        result = await capped.transcribe_chunks(client, chunks, "audio/wav", concurrency=6)
+        print(f"call cap 2: {len(requests_seen)} requests, peak {in_flight['peak']} in flight {capped.stats()}")
+        assert result["text"].count("part of a long report") == 6 and in_flight["peak"] <= 2
+        print("OK")
+    finally:
+        await client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
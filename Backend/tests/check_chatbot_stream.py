@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from groq import AsyncGroq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chatbot import ChatService  # noqa: E402
+from storage import CircuitBreaker  # noqa: E402
+
+# Checks ChatService.stream against a local fake Groq chat-completions server:
+# - tokens are relayed as SSE events in order, and time to first token is recorded
+# - a client disconnect stops relaying and closes the upstream stream
+# - an upstream error before the first token serves the rule-based reply
+# - once the breaker is open the rule-based reply is instant (no request made)
+# - a half-open trial abandoned by a disconnect or a cancelled reply is given
+#   back, so the next message still reaches the LLM
+# No network access or API key needed.
+
+SCENARIO = {"status": 200, "tokens": [], "delay": 0.0}
+state = {"requests": 0}
+
+
+class FakeChat(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        state["requests"] += 1
+        if SCENARIO["status"] != 200:
+            body = b'{"error": {"message": "unavailable"}}'
+            self.send_response(SCENARIO["status"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for token in SCENARIO["tokens"]:
+                time.sleep(SCENARIO["delay"])
+                chunk = {
+                    "id": "c1", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client went away
+
+
+def events(raw):
+    return [json.loads(e[len("data: "):]) for e in raw]
+
+
+async def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeChat)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = AsyncGroq(api_key="test", base_url=f"http://127.0.0.1:{server.server_address[1]}", max_retries=0)
+    service = ChatService("fake", CircuitBreaker(2, 60.0), first_token_timeout=2.0)
+    try:
+        SCENARIO.update(status=200, tokens=["To report", " an issue", ", open Report."], delay=0.05)
+        out = events([e async for e in service.stream(client, "how do I report?")])
+        print(f"stream: {out}")
+        assert "".join(e.get("token", "") for e in out) == "To report an issue, open Report."
+        assert out[-1] == {"done": True, "source": "llm"} and service.stats()["ttft_ms_p50"] is not None
+
+        SCENARIO.update(tokens=[f"t{i} " for i in range(50)], delay=0.05)
+        seen = []
+        gone = {"flag": False}
+
+        async def is_disconnected():
+            return gone["flag"]
+
+        async for event in service.stream(client, "tell me a story", is_disconnected):
+            seen.append(event)
+            gone["flag"] = len(seen) >= 3
+        print(f"disconnect: stopped after {len(seen)} of 51 events")
+        assert len(seen) == 3 and service.stats()["cancelled"] == 1
+
+        SCENARIO.update(status=503)
+        for _ in range(2):
+            out = events([e async for e in service.stream(client, "status of my issue")])
+            assert out[-1]["source"] == "rules" and "check status" in out[0]["token"]
+        requests_before = state["requests"]
+        t0 = time.perf_counter()
+        out = events([e async for e in service.stream(client, "status of my issue")])
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        print(f"breaker open: {out[0]['token']!r} in {elapsed_ms:.2f} ms {service.stats()}")
+        assert state["requests"] == requests_before and elapsed_ms < 5 and service.stats()["breaker"] == "open"
+
+        SCENARIO.update(status=200, tokens=["Hello", " there"], delay=0.2)
+        trial = ChatService("fake", CircuitBreaker(1, 0.05), first_token_timeout=2.0)
+        trial.breaker.record_failure()
+        await asyncio.sleep(0.06)
+
+        async def gone_now():
+            return True
+
+        assert [e async for e in trial.stream(client, "hi", gone_now)] == []
+        assert trial.breaker.state == "half-open" and trial.breaker.allow(), "disconnected trial was never released"
+        trial.breaker.release_trial()
+        task = asyncio.ensure_future(trial.reply(client, "hi"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert trial.breaker.state == "half-open" and trial.breaker.allow(), "cancelled trial was never released"
+        trial.breaker.release_trial()
+        out = events([e async for e in trial.stream(client, "hi")])
+        print(f"after abandoned trials: {out[-1]} breaker {trial.breaker.state}")
+        assert out[-1] == {"done": True, "source": "llm"} and trial.breaker.state == "closed"
+        print("OK")
+    finally:
+        await client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
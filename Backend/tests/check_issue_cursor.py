@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+# Checks GET /api/issues keyset pagination over legacy documents:
+# - issues whose created_at is a date, an ISO string, null or missing are
+#   all paged through exactly once, in the same order as one unpaged query
+# - building the cursor never fails on a non-date created_at
+# Uses a scratch collection in the database from MONGODB_URI (dropped after).
+
+COLLECTION = "issues_cursor_check"
+
+
+async def main_check():
+    collection = main.db[COLLECTION]
+    await collection.drop()
+    base = datetime(2024, 1, 1)
+    docs = [{"category": "Roads", "created_at": base + timedelta(days=i % 5)} for i in range(9)]
+    docs += [{"category": "Water", "created_at": (base + timedelta(days=i)).isoformat()} for i in range(5)]
+    docs += [{"category": "School", "created_at": None} for _ in range(3)]
+    docs += [{"category": "Farming"} for _ in range(4)]
+    await collection.insert_many(docs)
+    main.issues_collection = collection
+    try:
+        expected = [
+            str(d["_id"])
+            for d in await collection.find({}).sort([("created_at", -1), ("_id", -1)]).to_list(length=None)
+        ]
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = await main.get_issues(limit=4, cursor=cursor)
+            seen += [issue["_id"] for issue in page["issues"]]
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        print(f"{len(seen)} issues in {pages} pages")
+        assert seen == expected, (seen, expected)
+        print("OK")
+    finally:
+        await collection.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_check())
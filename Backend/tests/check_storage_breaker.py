@@ -0,0 +1,80 @@
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import CircuitBreaker, LocalStorage, S3Storage, UploadBudget, store_many  # noqa: E402
+
+# Checks the S3 circuit breaker around cancelled and rejected uploads:
+# - a half-open trial upload cancelled because a sibling file hit 413 gives
+#   the trial back, so the next upload is let through to S3 again
+# - a trial rejected with 413 itself does the same, without re-opening
+# Uses a fake boto3 client; no network access or credentials needed.
+
+
+class SlowS3:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.puts = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        time.sleep(self.delay)
+        self.puts.append(Key)
+        return {}
+
+    def head_object(self, Bucket, Key):
+        assert Key in self.puts
+        return {}
+
+
+def upload(name: str, size: int) -> UploadFile:
+    return UploadFile(io.BytesIO(b"x" * size), filename=name, headers=Headers({"content-type": "image/jpeg"}))
+
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    return breaker
+
+
+async def main():
+    s3 = SlowS3(0.3)
+    fallback = LocalStorage(os.path.join(tempfile.mkdtemp(), "uploads"))
+    storage = S3Storage("bucket", client_factory=lambda: s3, fallback=fallback, breaker=half_open_breaker())
+    try:
+        # The small file is the half-open trial; the big one goes to the fallback,
+        # fails there with 413 and cancels the trial
+        await store_many(storage, [upload("ok.jpg", 1000), upload("big.jpg", 4096)], UploadBudget(2048, 0))
+        raise AssertionError("expected 413")
+    except HTTPException as e:
+        assert e.status_code == 413
+    breaker = storage.breaker
+    print(f"after cancelled trial: state {breaker.state} trial_in_flight {breaker._trial_in_flight}")
+    assert breaker.state == "half-open" and breaker.allow(), "cancelled trial was never released"
+    breaker.release_trial()
+
+    storage.breaker = half_open_breaker()
+    try:
+        await storage.save(upload("big.jpg", 4096), UploadBudget(2048, 0))
+        raise AssertionError("expected 413")
+    except HTTPException as e:
+        assert e.status_code == 413
+    assert storage.breaker.state == "half-open" and storage.breaker.allow(), "rejected trial was never released"
+    storage.breaker.release_trial()
+
+    s3.delay = 0
+    url = await storage.save(upload("next.jpg", 1000), UploadBudget(2048, 0))
+    assert storage.breaker.state == "closed" and url.startswith("https://bucket.s3.amazonaws.com/")
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from telegram_bot import TelegramDispatcher  # noqa: E402
+
+# Checks TelegramDispatcher against a local fake Bot API server:
+# - a 429 with retry_after is retried after the advertised delay
+# - a 403 (bot blocked) is not retried
+# - messages to one chat are spaced by the per-chat rate limit
+# - a burst to many chats stays within the keep-alive pool (connections <= pool size)
+# No network access or bot token needed.
+
+calls = []
+connections = set()
+flaky_seen = set()
+
+
+class FakeBotApi(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        chat_id = str(body.get("chat_id"))
+        calls.append((chat_id, time.monotonic()))
+        connections.add(self.client_address)
+        if chat_id == "flaky" and chat_id not in flaky_seen:
+            flaky_seen.add(chat_id)
+            self._reply(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}})
+        elif chat_id == "blocked":
+            self._reply(403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"})
+        else:
+            self._reply(200, {"ok": True, "result": {"message_id": len(calls)}})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+async def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/botTEST"
+    d = TelegramDispatcher(api_base=base, global_rate=30, chat_rate=2, max_retries=3, max_connections=2)
+    try:
+        t0 = time.monotonic()
+        assert await d.send("flaky", "hello")
+        assert time.monotonic() - t0 >= 1.0, "retry_after was not honoured"
+        assert not await d.send("blocked", "hello")
+        assert sum(1 for c, _ in calls if c == "blocked") == 1, "403 must not be retried"
+
+        calls.clear()
+        results = await asyncio.gather(*(d.send("same-chat", f"msg {i}") for i in range(4)))
+        assert all(results)
+        stamps = [t for c, t in calls if c == "same-chat"]
+        gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+        assert min(gaps) >= 0.45, f"per-chat limit not applied: {gaps}"
+
+        results = await asyncio.gather(*(d.send(f"chat-{i}", "burst") for i in range(10)))
+        assert all(results)
+
+        stats = d.stats()
+        print("stats:", stats)
+        print("distinct client connections:", len(connections))
+        assert stats["sent"] == 15 and stats["failed"] == 1 and stats["rate_limited"] == 1
+        assert len(connections) <= d.max_connections, f"{len(connections)} connections for a pool of {d.max_connections}"
+        print("OK")
+    finally:
+        await d.aclose()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
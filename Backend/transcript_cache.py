@@ -0,0 +1,88 @@
+"""
+Transcription result cache keyed by audio fingerprint.
+
+Villagers on flaky links often re-send the same voice note. Results are
+cached under ``raw:<version>:<sha256 of the uploaded bytes>`` and, once the
+audio has been decoded, ``pcm:<version>:<sha256 of the normalised 16 kHz
+WAV>`` so the same recording re-encoded by the client still hits. The
+version fingerprints the ASR models and prompts, so changing them doesn't
+serve transcripts made with the old settings. Entries hold the raw ASR
+result; post-processing such as symbol normalisation is applied on the way
+out. Two tiers:
+
+- an in-process LRU (``max_entries``) for millisecond repeats
+- the ``transcript_cache`` collection, TTL-indexed on ``expires_at``, shared
+  by all workers and surviving restarts
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from pymongo import UpdateOne
+
+
+def cache_key(kind: str, digest: str, version: str = "") -> str:
+    return f"{kind}:{version}:{digest}" if version else f"{kind}:{digest}"
+
+
+def audio_key(kind: str, data: bytes, version: str = "") -> str:
+    return cache_key(kind, hashlib.sha256(data).hexdigest(), version)
+
+
+class TranscriptCache:
+    def __init__(self, collection, max_entries: int = 512, ttl_seconds: int = 7 * 24 * 3600):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.metrics = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0}
+
+    async def init_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def _remember(self, key: str, value: dict, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] > time.time():
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return entry[0]
+            self._memory.pop(key, None)
+        doc = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+        if doc is None:
+            self.metrics["misses"] += 1
+            return None
+        value = doc["value"]
+        remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+        self._remember(key, value, time.time() + remaining)
+        self.metrics["db_hits"] += 1
+        return value
+
+    async def put(self, keys: Iterable[str], value: dict):
+        keys = [k for k in keys if k]
+        if not keys:
+            return
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        for key in keys:
+            self._remember(key, value, time.time() + self.ttl_seconds)
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": key},
+                {"$set": {"value": value, "created_at": now, "expires_at": expires_at}},
+                upsert=True,
+            )
+            for key in keys
+        ], ordered=False)
+        self.metrics["stores"] += 1
+
+    def stats(self) -> dict:
+        return {**self.metrics, "memory_entries": len(self._memory)}
@@ -0,0 +1,87 @@
+"""
+Issue status state machine.
+
+Issues move Received -> In Progress -> Resolved; officers may post further
+updates (remarks, progress photos) while an issue is In Progress. A
+transition is applied with one ``find_one_and_update`` whose filter only
+matches when the current status may move to the target (and, if the client
+sent one, when ``version`` is unchanged), so two officers updating the same
+issue cannot both win. The returned BEFORE document carries the previous
+state for rollups and notifications.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+ISSUE_STATUSES = ["Received", "In Progress", "Resolved"]
+TRANSITIONS = {
+    "Received": {"In Progress"},
+    "In Progress": {"In Progress", "Resolved"},
+    "Resolved": set(),
+}
+# Fields of the previous state needed by rollups and notifications
+BEFORE_PROJECTION = {
+    "status": 1,
+    "category": 1,
+    "gram_panchayat": 1,
+    "created_at": 1,
+    "priority_votes": 1,
+    "version": 1,
+}
+
+
+def allowed_from(target: str) -> List[str]:
+    return [s for s, targets in TRANSITIONS.items() if target in targets]
+
+
+def _version_filter(version: int):
+    # Issues created before versioning have no field; treat that as version 0
+    return {"$in": [0, None]} if version == 0 else version
+
+
+def transition_update(target: str, now: datetime, assigned_department: Optional[str] = None, progress_images: Optional[List[str]] = None) -> dict:
+    update = {
+        "$set": {"status": target, "updated_at": now},
+        "$inc": {"version": 1},
+    }
+    if target == "Resolved":
+        update["$set"]["resolved_at"] = now
+    if assigned_department:
+        update["$set"]["assigned_department"] = assigned_department
+    if progress_images:
+        update["$push"] = {"progress_images": {"$each": progress_images}}
+    return update
+
+
+async def apply_transition(issues, issue_id, target: str, update: dict, expected_version: Optional[int] = None) -> dict:
+    """Apply ``update`` if the transition is allowed; returns the issue as it was before.
+
+    Raises 400 for an unknown status, 404 for a missing issue and 409 when the
+    transition is not allowed from the current status or the version moved on.
+    """
+    if target not in TRANSITIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {ISSUE_STATUSES}")
+    query = {"_id": issue_id, "status": {"$in": allowed_from(target)}}
+    if expected_version is not None:
+        query["version"] = _version_filter(expected_version)
+    previous = await issues.find_one_and_update(
+        query, update, projection=BEFORE_PROJECTION, return_document=ReturnDocument.BEFORE
+    )
+    if previous is not None:
+        return previous
+    # Failure path only: explain why nothing matched
+    current = await issues.find_one({"_id": issue_id}, {"status": 1, "version": 1})
+    if current is None:
+        raise HTTPException(status_code=404, detail="Issue not found")
+    current_version = current.get("version", 0)
+    if expected_version is not None and current_version != expected_version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Issue was modified by someone else (version {current_version}); reload and try again",
+        )
+    raise HTTPException(
+        status_code=409,
+        detail=f"Cannot change status from '{current.get('status')}' to '{target}'",
+    )
@@ -0,0 +1,44 @@
+"""
+Shared process pool for CPU-bound work (image processing, media decoding).
+
+Workers are started with the "spawn" method so they never inherit the event
+loop, the Mongo client or any other thread state of the API process. Only
+functions from modules that are safe to import on their own (no FastAPI app,
+no database connections) should be submitted.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0")) or max(1, min(4, os.cpu_count() or 1))
+
+_pool = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_in_process(fn, *args):
+    """Run ``fn(*args)`` in the shared pool, rebuilding the pool once if a worker died."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_process_pool(), fn, *args)
+    except BrokenProcessPool:
+        shutdown_process_pool()
+        return await loop.run_in_executor(get_process_pool(), fn, *args)
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import MapView from "./MapView";
+import { authFetch } from "./auth";
 
 export default function AdminDashboard() {
   const [issues, setIssues] = useState([]);
@@ -52,11 +53,8 @@ export default function AdminDashboard() {
     if (gpFilter) params.set("gram_panchayat", gpFilter);
     if (startDate) params.set("start_date", startDate);
     if (endDate) params.set("end_date", endDate);
-    const token = localStorage.getItem("token");
     try {
-      const res = await fetch(`http://localhost:8000/api/admin/export/issues.csv?${params.toString()}`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
+      const res = await authFetch(`http://localhost:8000/api/admin/export/issues.csv?${params.toString()}`);
       const blob = await res.blob();
       const url = URL.createObjectURL(blob);
       const a = document.createElement("a");
@@ -89,13 +87,11 @@ export default function AdminDashboard() {
     }
 
     try {
-      const token = localStorage.getItem("token");
-      const response = await fetch(
+      const response = await authFetch(
         `http://localhost:8000/api/issues/${selectedIssue._id}/status`,
         {
           method: "PUT",
           body: formData,
-          headers: { Authorization: `Bearer ${token}` },
         }
       );
 
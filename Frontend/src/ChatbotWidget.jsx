@@ -6,23 +6,51 @@ export default function ChatbotWidget() {
   const [input, setInput] = useState('');
   const [busy, setBusy] = useState(false);
 
+  const appendToLast = (token) => {
+    setMessages((m) => {
+      const last = m[m.length - 1];
+      return [...m.slice(0, -1), { ...last, text: last.text + token }];
+    });
+  };
+
   const send = async () => {
     const text = input.trim();
     if (!text) return;
-    setMessages((m) => [...m, { role: 'user', text }]);
+    setMessages((m) => [...m, { role: 'user', text }, { role: 'bot', text: '' }]);
     setInput('');
     setBusy(true);
+    let received = false;
     try {
-      const res = await fetch('http://localhost:8000/api/chatbot/message', {
+      // Tokens arrive as Server-Sent Events: data: {"token": "..."} ... data: {"done": true}
+      const res = await fetch('http://localhost:8000/api/chatbot/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ message: text })
       });
-      const data = await res.json();
-      const reply = data?.reply || "Sorry, I'm not sure about that.";
-      setMessages((m) => [...m, { role: 'bot', text: reply }]);
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+          if (!event.startsWith('data: ')) continue;
+          const data = JSON.parse(event.slice(6));
+          if (data.token) {
+            received = true;
+            appendToLast(data.token);
+          } else if (data.error) {
+            appendToLast(` (${data.error})`);
+          }
+        }
+      }
+      if (!received) appendToLast("Sorry, I'm not sure about that.");
     } catch {
-      setMessages((m) => [...m, { role: 'bot', text: 'Network error. Please try again later.' }]);
+      if (!received) appendToLast('Network error. Please try again later.');
     } finally {
       setBusy(false);
     }
@@ -1,5 +1,6 @@
 import React, { useState } from "react";
 import { useNavigate } from "react-router-dom";
+import { saveSession } from "./auth";
 
 export default function Login() {
   const [form, setForm] = useState({ email: "", password: "" });
@@ -29,10 +30,8 @@ export default function Login() {
       const data = await response.json();
 
       if (response.ok) {
-        // Store user data and authentication token
-        localStorage.setItem("user", JSON.stringify(data.user));
-        localStorage.setItem("token", data.token);
-        localStorage.setItem("loggedIn", "true");
+        // Store user data and the access/refresh token pair
+        saveSession(data);
         
         // Redirect based on role
         if (data.user.role === "admin" || data.user.role === "officer") {
@@ -66,9 +65,7 @@ export default function Login() {
       });
       const data = await res.json();
       if (!res.ok) throw new Error(data?.detail || "Verification failed");
-      localStorage.setItem("user", JSON.stringify(data.user));
-      localStorage.setItem("token", data.token);
-      localStorage.setItem("loggedIn", "true");
+      saveSession(data);
       if (data.user.role === "admin" || data.user.role === "officer") {
         navigate("/admin");
       } else {
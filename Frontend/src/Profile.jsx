@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
+import { authFetch, clearSession, logout } from "./auth";
 
 export default function Profile() {
   const [user, setUser] = useState(null);
@@ -34,18 +35,14 @@ export default function Profile() {
         setLoading(false);
       } catch {
         // Clear bad state and redirect
-        localStorage.removeItem("user");
-        localStorage.removeItem("token");
-        localStorage.removeItem("loggedIn");
+        clearSession();
         navigate("/login");
       }
     })();
   }, [navigate]);
 
   const handleLogout = async () => {
-    localStorage.removeItem("user");
-    localStorage.removeItem("token");
-    localStorage.removeItem("loggedIn");
+    await logout();
     navigate("/login");
   };
 
@@ -62,12 +59,9 @@ export default function Profile() {
   useEffect(() => {
     const fetchTelegramStatus = async () => {
       try {
-        const token = localStorage.getItem("token");
-        if (!token) return;
+        if (!localStorage.getItem("token")) return;
         
-        const res = await fetch("http://localhost:8000/api/telegram/status", {
-          headers: { Authorization: `Bearer ${token}` }
-        });
+        const res = await authFetch("http://localhost:8000/api/telegram/status");
         
         if (res.ok) {
           const data = await res.json();
@@ -88,11 +82,7 @@ export default function Profile() {
 
   const startTotp = async () => {
     try {
-      const token = localStorage.getItem("token");
-      const res = await fetch("http://localhost:8000/api/auth/totp/setup/start", {
-        method: "POST",
-        headers: { Authorization: `Bearer ${token}` },
-      });
+      const res = await authFetch("http://localhost:8000/api/auth/totp/setup/start", { method: "POST" });
       const data = await res.json();
       if (!res.ok) throw new Error(data?.detail || "Failed to start setup");
       setQr(data.qr_data_url);
@@ -103,13 +93,9 @@ export default function Profile() {
 
   const verifyTotp = async () => {
     try {
-      const token = localStorage.getItem("token");
-      const res = await fetch("http://localhost:8000/api/auth/totp/setup/verify", {
+      const res = await authFetch("http://localhost:8000/api/auth/totp/setup/verify", {
         method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
+        headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ code: totpCode }),
       });
       const data = await res.json();
@@ -125,10 +111,7 @@ export default function Profile() {
 
   const connectTelegram = async () => {
     try {
-      const token = localStorage.getItem("token");
-      const res = await fetch("http://localhost:8000/api/telegram/link", {
-        headers: { Authorization: `Bearer ${token}` }
-      });
+      const res = await authFetch("http://localhost:8000/api/telegram/link");
       
       if (!res.ok) {
         const data = await res.json();
@@ -152,9 +135,7 @@ export default function Profile() {
         
         // Refresh status after a few seconds
         setTimeout(async () => {
-          const statusRes = await fetch("http://localhost:8000/api/telegram/status", {
-            headers: { Authorization: `Bearer ${token}` }
-          });
+          const statusRes = await authFetch("http://localhost:8000/api/telegram/status");
           if (statusRes.ok) {
             const statusData = await statusRes.json();
             setTelegram({ ...statusData, loading: false });
@@ -172,11 +153,7 @@ export default function Profile() {
     }
     
     try {
-      const token = localStorage.getItem("token");
-      const res = await fetch("http://localhost:8000/api/telegram/disconnect", {
-        method: "POST",
-        headers: { Authorization: `Bearer ${token}` }
-      });
+      const res = await authFetch("http://localhost:8000/api/telegram/disconnect", { method: "POST" });
       
       if (!res.ok) {
         throw new Error("Failed to disconnect");
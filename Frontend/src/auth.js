@@ -0,0 +1,71 @@
+// Session helpers: access tokens are short-lived, so authFetch refreshes them
+// with the stored refresh token on a 401 and retries the request once.
+const API = "http://localhost:8000";
+
+let refreshing = null;
+
+export function saveSession(data) {
+  if (data.user) localStorage.setItem("user", JSON.stringify(data.user));
+  localStorage.setItem("token", data.token);
+  if (data.refresh_token) localStorage.setItem("refresh_token", data.refresh_token);
+  localStorage.setItem("loggedIn", "true");
+}
+
+export function clearSession() {
+  localStorage.removeItem("user");
+  localStorage.removeItem("token");
+  localStorage.removeItem("refresh_token");
+  localStorage.removeItem("loggedIn");
+}
+
+// One refresh at a time: the server rotates (revokes) the refresh token on use
+function refreshTokens() {
+  if (!refreshing) {
+    refreshing = (async () => {
+      const refreshToken = localStorage.getItem("refresh_token");
+      if (!refreshToken) return false;
+      try {
+        const res = await fetch(`${API}/api/auth/refresh`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ refresh_token: refreshToken }),
+        });
+        if (!res.ok) return false;
+        saveSession(await res.json());
+        return true;
+      } catch {
+        return false;
+      }
+    })().finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+}
+
+export async function authFetch(url, options = {}) {
+  const withToken = () => ({
+    ...options,
+    headers: { ...(options.headers || {}), Authorization: `Bearer ${localStorage.getItem("token")}` },
+  });
+  let res = await fetch(url, withToken());
+  if (res.status === 401 && (await refreshTokens())) {
+    res = await fetch(url, withToken());
+  }
+  if (res.status === 401) clearSession();
+  return res;
+}
+
+export async function logout() {
+  const refreshToken = localStorage.getItem("refresh_token");
+  try {
+    await authFetch(`${API}/api/auth/logout`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    });
+  } catch {
+    // Best effort: the local session is cleared either way
+  }
+  clearSession();
+}